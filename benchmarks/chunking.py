@@ -0,0 +1,188 @@
+"""
+Compara o chunker nativo (`chunker.offsets_chunks`) com o RecursiveCharacterTextSplitter do langchain usado
+antes por `pre_processamento.chunk_document`, com os mesmos tamanho e sobreposição, em páginas geradas a partir
+de uma seed (mesmo gerador de texto de benchmarks/pipeline.py).
+
+Mede:
+    velocidade: páginas/s e MB/s para dividir todas as páginas (melhor de --repeticoes) e o pico de memória
+        alocada ao dividir uma página por vez (tracemalloc).
+    chunks: quantidade, tamanho médio e máximo (caracteres), passo médio entre o início de chunks vizinhos e
+        chunks contidos no chunk anterior (texto repetido sem conteúdo novo, deveria ser 0).
+    estabilidade: cada edição (inserção, remoção ou troca de uma frase em uma posição aleatória da página)
+        é aplicada ao texto antes da quebra em linhas, como em um PDF editado e exportado novamente. Conta os chunks
+        da nova versão com conteúdo que não existia (precisam de novos embeddings) e os que mudaram na sua chave
+        (path, página, indice_chunk), que são reescritos no banco.
+
+Formatos de página:
+    linhas: linhas de ~90 caracteres sem linhas em branco (como o PyPDFLoader extrai um PDF).
+    linhas_crlf: como 'linhas', com quebras '\r\n' e uma linha em branco entre parágrafos (TXTs do Windows).
+    paragrafos: parágrafos separados por uma linha em branco, sem quebra de linha dentro deles (TXTs).
+    paragrafos_espaco: parágrafos separados por ' \n\n', com espaço antes da quebra (comum no texto do PyPDF).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.chunking --paginas 500 --edicoes 300
+    python -m benchmarks.chunking --unidade tokens --tamanho 300 --sobreposicao 90 --saida resultados/chunking.json
+"""
+import argparse
+import json
+import os
+import random
+import textwrap
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.pipeline import gerar_texto, gerar_vocabulario
+from chunker import criar_splitter_langchain, dividir_texto
+
+FORMATOS = ('linhas', 'linhas_crlf', 'paragrafos', 'paragrafos_espaco')
+
+
+def gerar_frases(rng: random.Random, vocabulario: List[str], palavras: int) -> List[str]:
+    return gerar_texto(rng, vocabulario, palavras).replace('. ', '.\0').split('\0')
+
+
+def formatar_pagina(paragrafos: List[List[str]], formato: str) -> str:
+    textos = [" ".join(frases) for frases in paragrafos]
+    if formato == 'linhas':
+        return "\n".join(textwrap.fill(texto, width=90) for texto in textos)
+    if formato == 'linhas_crlf':
+        return "\r\n\r\n".join(textwrap.fill(texto, width=90).replace("\n", "\r\n") for texto in textos)
+    if formato == 'paragrafos_espaco':
+        return " \n\n".join(textos)
+    return "\n\n".join(textos)
+
+
+def gerar_paginas(quantidade: int, palavras_pagina: int, seed: int) -> List[List[List[str]]]:
+    """
+    Páginas como listas de parágrafos (listas de frases), para as edições serem feitas antes da formatação.
+    """
+    rng = random.Random(seed)
+    vocabulario = gerar_vocabulario(rng, 2000)
+    paginas = []
+    for _ in range(quantidade):
+        frases = gerar_frases(rng, vocabulario, palavras_pagina)
+        paragrafos, i = [], 0
+        while i < len(frases):
+            tamanho = rng.randint(3, 8)
+            paragrafos.append(frases[i:i + tamanho])
+            i += tamanho
+        paginas.append(paragrafos)
+    return paginas
+
+
+def editar(paragrafos: List[List[str]], rng: random.Random, vocabulario: List[str]) -> List[List[str]]:
+    editados = [list(frases) for frases in paragrafos]
+    frases = rng.choice(editados)
+    i = rng.randrange(len(frases))
+    operacao = rng.choice(('inserir', 'remover', 'trocar'))
+    if operacao == 'inserir' or len(frases) == 1:
+        frases.insert(i, gerar_frases(rng, vocabulario, rng.randint(8, 20))[0])
+    elif operacao == 'remover':
+        del frases[i]
+    else:
+        frases[i] = gerar_frases(rng, vocabulario, rng.randint(8, 20))[0]
+    return editados
+
+
+def medir_velocidade(dividir: Callable[[str], List[str]], textos: List[str], repeticoes: int) -> Dict[str, Any]:
+    segundos = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        chunks = [dividir(texto) for texto in textos]
+        segundos = min(segundos, time.perf_counter() - inicio)
+    # Memória medida em uma passada separada, o tracemalloc deixa as alocações bem mais lentas.
+    tracemalloc.start()
+    for texto in textos:
+        dividir(texto)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tamanhos = np.asarray([len(chunk) for chunks_pagina in chunks for chunk in chunks_pagina])
+    contidos = sum(
+        1 for chunks_pagina in chunks for anterior, chunk in zip(chunks_pagina, chunks_pagina[1:]) if chunk in anterior
+    )
+    megabytes = sum(len(texto) for texto in textos) / 1e6
+    return {
+        "segundos": segundos,
+        "paginas_por_segundo": len(textos) / segundos,
+        "mb_por_segundo": megabytes / segundos,
+        "pico_memoria_mb": pico / 1e6,
+        "chunks": int(len(tamanhos)),
+        "tamanho_medio": float(tamanhos.mean()),
+        "tamanho_maximo": int(tamanhos.max()),
+        "passo_medio": sum(len(texto) for texto in textos) / len(tamanhos),
+        "chunks_contidos_no_anterior": contidos,
+    }
+
+
+def medir_estabilidade(
+    dividir: Callable[[str], List[str]],
+    paginas: List[List[List[str]]],
+    formato: str,
+    edicoes: int,
+    seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    vocabulario = gerar_vocabulario(random.Random(seed + 1), 2000)
+    novos, reescritos, total = [], [], 0
+    for _ in range(edicoes):
+        paragrafos = rng.choice(paginas)
+        antes = dividir(formatar_pagina(paragrafos, formato))
+        depois = dividir(formatar_pagina(editar(paragrafos, rng, vocabulario), formato))
+        novos.append(len(set(depois) - set(antes)))
+        reescritos.append(sum(1 for i, chunk in enumerate(depois) if i >= len(antes) or antes[i] != chunk))
+        total += len(depois)
+    return {
+        "chunks_novos_por_edicao": float(np.mean(novos)),
+        "chunks_reescritos_por_edicao": float(np.mean(reescritos)),
+        "fracao_novos": sum(novos) / total,
+        "fracao_reescritos": sum(reescritos) / total,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chunker nativo vs RecursiveCharacterTextSplitter: velocidade e estabilidade.")
+    parser.add_argument("--paginas", type=int, default=500)
+    parser.add_argument("--palavras-pagina", type=int, default=500)
+    parser.add_argument("--edicoes", type=int, default=300, help="Edições por formato para medir a estabilidade.")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--tamanho", type=int, default=1300)
+    parser.add_argument("--sobreposicao", type=int, default=400)
+    parser.add_argument("--unidade", choices=("caracteres", "tokens"), default="caracteres")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout).")
+    args = parser.parse_args()
+
+    parametros = {"tamanho": args.tamanho, "sobreposicao": args.sobreposicao, "unidade": args.unidade}
+    splitter = criar_splitter_langchain(**parametros)
+    chunkers = {
+        "nativo": lambda texto: list(dividir_texto(texto, **parametros)),
+        "langchain": splitter.split_text,
+    }
+    paginas = gerar_paginas(args.paginas, args.palavras_pagina, args.seed)
+
+    relatorio: Dict[str, Any] = {"parametros": vars(args)}
+    for formato in FORMATOS:
+        textos = [formatar_pagina(paragrafos, formato) for paragrafos in paginas]
+        relatorio[formato] = {
+            nome: {
+                **medir_velocidade(dividir, textos, args.repeticoes),
+                **medir_estabilidade(dividir, paginas, formato, args.edicoes, args.seed),
+            }
+            for nome, dividir in chunkers.items()
+        }
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida + "\n")
+    else:
+        print(saida)
+
+
+if __name__ == "__main__":
+    main()
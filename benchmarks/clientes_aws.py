@@ -0,0 +1,96 @@
+"""
+Mede o custo por chamada de criar um cliente boto3 a cada uso (comportamento anterior de `get_resposta_modelo`)
+em comparação com o cliente compartilhado de `clientes_aws.get_cliente`.
+
+Mede:
+    criacao: tempo para obter um cliente 'bedrock-runtime' em cada modo (resolução de credenciais, carga do
+        modelo do serviço e do endpoint), sem nenhuma chamada de rede.
+    chamadas (--chamadas N > 0): latência de N embeddings do Titan em cada modo, incluindo o handshake TLS que
+        um cliente novo precisa refazer, e requisições HTTP por chamada (retentativas). Requer credenciais da AWS.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.clientes_aws --repeticoes 50
+    python -m benchmarks.clientes_aws --chamadas 20 --saida resultados/clientes_aws.json
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+import clientes_aws
+from metricas import registro
+
+
+def percentis(valores: List[float]) -> Dict[str, float]:
+    amostras = np.asarray(valores) * 1000
+    return {
+        "media_ms": float(amostras.mean()),
+        "p50_ms": float(np.percentile(amostras, 50)),
+        "p95_ms": float(np.percentile(amostras, 95)),
+    }
+
+
+def cliente_novo() -> Any:
+    import boto3
+    return boto3.client("bedrock-runtime")
+
+
+def medir_criacao(obter_cliente: Callable[[], Any], repeticoes: int) -> Dict[str, float]:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        obter_cliente()
+        tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def medir_chamadas(obter_cliente: Callable[[], Any], chamadas: int, model_id: str) -> Dict[str, float]:
+    corpo = json.dumps({"inputText": "benchmark de clientes da aws"})
+    tempos = []
+    for _ in range(chamadas):
+        inicio = time.perf_counter()
+        resposta = obter_cliente().invoke_model(modelId=model_id, body=corpo)
+        resposta["body"].read()
+        tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Custo por chamada de clientes boto3 novos vs compartilhados.")
+    parser.add_argument("--repeticoes", type=int, default=50, help="Clientes obtidos em cada modo.")
+    parser.add_argument("--chamadas", type=int, default=0, help="Chamadas reais ao Bedrock em cada modo, 0 desativa.")
+    parser.add_argument("--model-id", default="amazon.titan-embed-text-v2:0")
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout).")
+    args = parser.parse_args()
+
+    relatorio: Dict[str, Any] = {
+        "parametros": vars(args),
+        "criacao": {
+            "cliente_por_chamada": medir_criacao(cliente_novo, args.repeticoes),
+            "cliente_compartilhado": medir_criacao(clientes_aws.get_cliente, args.repeticoes),
+        },
+    }
+    if args.chamadas > 0:
+        clientes_aws.get_cliente().invoke_model(modelId=args.model_id, body=json.dumps({"inputText": "aquecimento"}))
+        registro.limpar()
+        relatorio["chamadas"] = {
+            # Cliente criado pelo registro a cada chamada, para contar as requisições HTTP nos dois modos.
+            "cliente_por_chamada": medir_chamadas(clientes_aws.criar_cliente, args.chamadas, args.model_id),
+            "cliente_compartilhado": medir_chamadas(clientes_aws.get_cliente, args.chamadas, args.model_id),
+        }
+        relatorio["requisicoes_http"] = registro.contador('aws_requisicoes_total')
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida + "\n")
+    else:
+        print(saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Verifica o tempo de importação dos pontos de entrada (interface, CLI de ingestão, fila, queries) e que nenhuma
+dependência pesada (langchain, boto3, DuckDuckGo, torch) é carregada só por importar os módulos do projeto,
+elas devem ser importadas no primeiro uso. Nenhuma conexão com o banco ou com a AWS é aberta.
+
+Cada módulo é importado em um interpretador novo (sem cache de módulos do processo), o tempo de importação é
+medido dentro do processo e o total inclui a inicialização do interpretador. Termina com código 1 se algum
+módulo exceder o orçamento ou carregar uma dependência pesada, então pode ser usado na CI:
+    python -m benchmarks.importacao --orcamento 1.0
+    python -m benchmarks.importacao --detalhar 15 # mostra as importações mais lentas (python -X importtime)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# Módulos importados pelos pontos de entrada (web_page.py, pre_processamento.py, fila_ingestao.py, etc).
+MODULOS = [
+    'metricas',
+    'embeddings',
+    'vector_store',
+    'cache_web',
+    'contexto',
+    'chunker',
+    'query_processing',
+    'query_async',
+    'pre_processamento',
+    'fila_ingestao',
+]
+# Pacotes que só podem ser carregados no primeiro uso.
+DEPENDENCIAS_PESADAS = [
+    'langchain',
+    'langchain_core',
+    'langchain_community',
+    'langchain_aws',
+    'langchain_text_splitters',
+    'boto3',
+    'botocore',
+    'duckduckgo_search',
+    'ddgs',
+    'torch',
+    'transformers',
+    'http.server',
+]
+
+CODIGO_MEDICAO = """
+import importlib, json, sys, time
+inicio = time.perf_counter()
+importlib.import_module(sys.argv[1])
+segundos = time.perf_counter() - inicio
+print(json.dumps({"segundos": segundos, "pesadas": [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))
+"""
+
+
+def medir_modulo(modulo: str, repeticoes: int) -> Dict[str, Any]:
+    medicoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        processo = subprocess.run(
+            [sys.executable, '-c', CODIGO_MEDICAO, modulo, json.dumps(DEPENDENCIAS_PESADAS)],
+            capture_output=True, text=True
+        )
+        total = time.perf_counter() - inicio
+        if processo.returncode != 0:
+            return {"erro": (processo.stderr.strip().splitlines() or ["erro desconhecido"])[-1]}
+        medicao = json.loads(processo.stdout.strip().splitlines()[-1])
+        medicao["total_processo"] = total
+        medicoes.append(medicao)
+    # Menor tempo das repetições: descarta o ruído de disco/CPU, o custo da importação é o mínimo.
+    melhor = min(medicoes, key=lambda medicao: medicao["segundos"])
+    return {
+        "importacao_segundos": melhor["segundos"],
+        "processo_segundos": min(medicao["total_processo"] for medicao in medicoes),
+        "dependencias_pesadas": melhor["pesadas"],
+    }
+
+
+def importacoes_mais_lentas(modulo: str, quantidade: int) -> List[Dict[str, Any]]:
+    """
+    Importações com maior tempo acumulado (incluindo as dependências) segundo `python -X importtime`.
+    """
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        capture_output=True, text=True, check=True
+    )
+    linhas = []
+    # Formato: "import time:  <próprio us> | <acumulado us> | <módulo>", a primeira linha é o cabeçalho.
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|', 2)
+        linhas.append({"modulo": nome.strip(), "acumulado_ms": int(acumulado) / 1000, "proprio_ms": int(proprio) / 1000})
+    return sorted(linhas, key=lambda linha: linha["acumulado_ms"], reverse=True)[:quantidade]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tempo de importação dos módulos do projeto e dependências carregadas.")
+    parser.add_argument("--orcamento", type=float, default=1.0, help="Segundos máximos de importação por módulo.")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--modulos", nargs="+", default=MODULOS)
+    parser.add_argument("--detalhar", type=int, default=0, help="Mostra as N importações mais lentas de cada módulo.")
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout).")
+    args = parser.parse_args()
+
+    relatorio: Dict[str, Any] = {"orcamento_segundos": args.orcamento, "modulos": {}}
+    falhas = []
+    for modulo in args.modulos:
+        resultado = medir_modulo(modulo, args.repeticoes)
+        relatorio["modulos"][modulo] = resultado
+        if "erro" in resultado:
+            falhas.append(f"{modulo}: {resultado['erro']}")
+            continue
+        if args.detalhar:
+            resultado["mais_lentas"] = importacoes_mais_lentas(modulo, args.detalhar)
+        if resultado["importacao_segundos"] > args.orcamento:
+            falhas.append(f"{modulo}: {resultado['importacao_segundos']:.2f}s de importação (orçamento {args.orcamento:.2f}s)")
+        if resultado["dependencias_pesadas"]:
+            falhas.append(f"{modulo}: carrega {', '.join(resultado['dependencias_pesadas'])} na importação")
+    relatorio["falhas"] = falhas
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida + "\n")
+    else:
+        print(saida)
+    for falha in falhas:
+        print(falha, file=sys.stderr)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
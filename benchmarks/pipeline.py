@@ -0,0 +1,476 @@
+"""
+Benchmark reproduzível da ingestão e do processamento de query, sem dependências externas além do banco
+(opcional): embeddings, converse do Bedrock e DuckDuckGo são substituídos por versões locais com latência
+configurável, e o corpus (PDFs e TXTs) é gerado a partir de uma seed.
+
+Mede:
+    ingestão: chunks/s de `sincronizar_diretorios` (mesmo caminho do CLI) e round trips ao banco.
+    queries: latência total e por etapa (p50/p95/p99) de `processar_query_stream`, tempo até o primeiro token
+        e round trips por query.
+    memória: pico de RSS do processo (e dos processos de parse) após cada fase.
+
+O resultado é um JSON (stdout ou --saida) para comparar versões, ex:
+    python -m benchmarks.pipeline --store local --saida resultados/local.json
+    python -m benchmarks.pipeline --store pgvector --pdfs 50 --txts 50 --queries 200
+    python -m benchmarks.pipeline --store local --dimensao 384 # provedor com outra dimensão (ex: MiniLM local)
+
+Com --store local nada é gravado no PostgreSQL (os caches de embeddings e da web também ficam desativados). Com --store pgvector
+os chunks são gravados na tabela 'docs' configurada em db_utils, com caminhos do diretório temporário, e removidos
+ao final junto com as entradas dos caches do modelo simulado.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+
+# Pseudo-palavras geradas a partir de sílabas, apenas ASCII para não depender de encoding no PDF.
+SILABAS = ["ba", "ca", "da", "fe", "ge", "li", "mo", "nu", "pa", "que", "ra", "so", "ta", "vi", "xo", "ze", "tri", "pro", "cao", "men"]
+
+
+def gerar_vocabulario(rng: random.Random, tamanho: int) -> List[str]:
+    vocabulario = set()
+    while len(vocabulario) < tamanho:
+        vocabulario.add("".join(rng.choice(SILABAS) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulario)
+
+
+def gerar_texto(rng: random.Random, vocabulario: List[str], palavras: int) -> str:
+    frases = []
+    while palavras > 0:
+        tamanho = min(palavras, rng.randint(8, 20))
+        frases.append(" ".join(rng.choice(vocabulario) for _ in range(tamanho)).capitalize() + ".")
+        palavras -= tamanho
+    return " ".join(frases)
+
+
+def escrever_pdf(caminho: str, paginas: List[str]) -> None:
+    """
+    Escreve um PDF mínimo (Helvetica, uma página por texto) sem depender de bibliotecas de geração de PDF.
+    """
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(len(paginas)))}] /Count {len(paginas)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, texto in enumerate(paginas):
+        linhas = textwrap.wrap(texto, 95)
+        conteudo = "BT /F1 9 Tf 40 800 Td 11 TL\n"
+        for linha in linhas:
+            linha = linha.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            conteudo += f"({linha}) Tj T*\n"
+        conteudo = (conteudo + "ET").encode("latin-1")
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(conteudo) + conteudo + b"\nendstream")
+
+    with open(caminho, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        posicoes = []
+        for numero, objeto in enumerate(objetos, start=1):
+            posicoes.append(f.tell())
+            f.write(b"%d 0 obj\n" % numero + objeto + b"\nendobj\n")
+        inicio_xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1))
+        for posicao in posicoes:
+            f.write(b"%010d 00000 n \n" % posicao)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref))
+
+
+def gerar_corpus(diretorio: str, pdfs: int, txts: int, paginas: int, palavras_pagina: int, seed: int) -> List[str]:
+    """
+    Gera o corpus sintético em diretorio/pdfs e diretorio/txts.
+
+    Returns:
+        List[str]: Textos de todas as páginas, usados para montar queries que existem no corpus.
+    """
+    rng = random.Random(seed)
+    vocabulario = gerar_vocabulario(rng, 5000)
+    textos = []
+    os.makedirs(os.path.join(diretorio, "pdfs"), exist_ok=True)
+    os.makedirs(os.path.join(diretorio, "txts"), exist_ok=True)
+    for i in range(pdfs):
+        paginas_pdf = [gerar_texto(rng, vocabulario, palavras_pagina) for _ in range(paginas)]
+        escrever_pdf(os.path.join(diretorio, "pdfs", f"documento_{i:04d}.pdf"), paginas_pdf)
+        textos.extend(paginas_pdf)
+    for i in range(txts):
+        texto = gerar_texto(rng, vocabulario, palavras_pagina * paginas)
+        with open(os.path.join(diretorio, "txts", f"documento_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(texto)
+        textos.append(texto)
+    return textos
+
+
+def gerar_queries(textos: List[str], quantidade: int, fracao_web: float, seed: int) -> List[str]:
+    """
+    Queries com trechos do corpus (encontram contexto nos documentos) e, na fração `fracao_web`,
+    palavras que não existem no corpus (acionam o fallback para a web).
+    """
+    rng = random.Random(seed + 1)
+    externas = gerar_vocabulario(random.Random(seed + 2), 200)
+    queries = []
+    for _ in range(quantidade):
+        if rng.random() < fracao_web:
+            queries.append(" ".join(rng.choice(externas) for _ in range(6)) + "?")
+        else:
+            # Trechos longos o bastante para passar do MINIMO_SIMILARIDADE com o embedder por hashing.
+            palavras = rng.choice(textos).split()
+            inicio = rng.randrange(max(1, len(palavras) - 40))
+            queries.append(" ".join(palavras[inicio:inicio + 40]))
+    return queries
+
+
+def criar_provedor_simulado(latencia: float, dimensao: int = 1024):
+    """
+    Substituto do Bedrock: vetores do `ProvedorHash` com `latencia` segundos por requisição, respeitando
+    max_workers requisições simultâneas como o `ProvedorBedrock`. Uma `dimensao` diferente de 1024 simula
+    provedores como o MiniLM local (384).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from embeddings import ProvedorHash
+
+    class ProvedorSimulado(ProvedorHash):
+        def __init__(self):
+            super().__init__(dimensao)
+            self.model_id = f"simulado-{self.dimensao}"
+
+        def embed_query(self, texto: str) -> List[float]:
+            time.sleep(latencia)
+            return super().embed_documentos([texto])[0].tolist()
+
+        def embed_documentos(self, textos, max_workers=8, taxa_maxima=0, estatisticas=None):
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                list(executor.map(lambda _: time.sleep(latencia), textos))
+            return super().embed_documentos(textos)
+
+    return ProvedorSimulado()
+
+
+def resposta_simulada(prompt: str) -> str:
+    # Repete o começo do primeiro contexto do prompt, então a verificação da resposta costuma aprovar.
+    for marcador in ("Conteudo:\n", "Snippet:\n"):
+        if marcador in prompt:
+            return " ".join(prompt.split(marcador, 1)[1].split()[:80])
+    return " ".join(prompt.split()[-8:])
+
+
+def instalar_simulacoes(latencia_llm: float, latencia_token: float, latencia_web: float) -> None:
+    import query_processing
+
+    def get_resposta_modelo(prompt: str) -> str:
+        time.sleep(latencia_llm)
+        return resposta_simulada(prompt)
+
+    def get_resposta_modelo_stream(prompt: str) -> Iterator[str]:
+        time.sleep(latencia_llm)
+        for palavra in resposta_simulada(prompt).split():
+            time.sleep(latencia_token)
+            yield palavra + " "
+
+    def buscar_na_web(query: str) -> List[Dict[str, str]]:
+        time.sleep(latencia_web)
+        return [
+            {"snippet": f"Resultado {i} sobre {query}", "title": f"Pagina {i}", "link": f"https://exemplo.com/{i}"}
+            for i in range(4)
+        ]
+
+    query_processing.get_resposta_modelo = get_resposta_modelo
+    query_processing.get_resposta_modelo_stream = get_resposta_modelo_stream
+    query_processing.buscar_na_web = buscar_na_web
+
+
+class _CursorContador:
+    def __init__(self, cursor, contador: Dict[str, int]):
+        self._cursor = cursor
+        self._contador = contador
+
+    def execute(self, *args, **kwargs):
+        self._contador["round_trips"] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._contador["round_trips"] += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        self._contador["round_trips"] += 1
+        return self._cursor.copy_expert(*args, **kwargs)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._cursor, nome)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class _ConexaoContadora:
+    def __init__(self, conn, contador: Dict[str, int]):
+        self._conn = conn
+        self._contador = contador
+
+    def cursor(self, *args, **kwargs):
+        return _CursorContador(self._conn.cursor(*args, **kwargs), self._contador)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._conn, nome)
+
+
+def instalar_contador_round_trips(contador: Dict[str, int]) -> None:
+    """
+    Troca `conexao` nos módulos que acessam o banco por uma versão que conta cada execute/copy enviado,
+    incluindo as consultas ao cache da web feitas pelas queries.
+    """
+    import cache_web
+    import db_utils
+    import pre_processamento
+    import vector_store
+
+    original = db_utils.conexao
+
+    @contextmanager
+    def conexao_contadora():
+        with original() as conn:
+            yield _ConexaoContadora(conn, contador)
+
+    pre_processamento.conexao = conexao_contadora
+    vector_store.conexao = conexao_contadora
+    cache_web.conexao = conexao_contadora
+
+
+def _cronometrar(nome: str, func: Callable, tempos: Dict[str, float]) -> Callable:
+    def envolvida(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            tempos[nome] = tempos.get(nome, 0.0) + time.perf_counter() - inicio
+    return envolvida
+
+
+def _cronometrar_gerador(nome: str, func: Callable, tempos: Dict[str, float]) -> Callable:
+    def envolvida(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            yield from func(*args, **kwargs)
+        finally:
+            tempos[nome] = tempos.get(nome, 0.0) + time.perf_counter() - inicio
+    return envolvida
+
+
+def percentis(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {}
+    ms = np.asarray(valores) * 1000
+    return {
+        "media_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def pico_memoria_mb() -> Dict[str, float]:
+    # ru_maxrss é em KB no Linux e em bytes no macOS.
+    escala = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "processo_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala,
+        "processos_filhos_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / escala,
+    }
+
+
+def versao_codigo() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecida"
+
+
+def medir_ingestao(diretorio: str, contador: Dict[str, int], processos: int, tamanho_lote: int) -> Dict[str, Any]:
+    import pre_processamento
+    from manifesto import carregar_manifesto
+
+    pre_processamento.DIRETORIOS_DADOS = {os.path.join(diretorio, "pdfs"): "pdf", os.path.join(diretorio, "txts"): "txt"}
+    pre_processamento.TEMPO_MINIMO_ESTAVEL = 0
+    pre_processamento.PROCESSOS_PARSE = processos
+    original = pre_processamento.processar_chunks_arquivo
+    total_chunks = 0
+
+    def processar_chunks_arquivo(*args, **kwargs):
+        nonlocal total_chunks
+        kwargs.setdefault("tamanho_lote", tamanho_lote)
+        quantidade = original(*args, **kwargs)
+        total_chunks += quantidade
+        return quantidade
+
+    pre_processamento.processar_chunks_arquivo = processar_chunks_arquivo
+    contador["round_trips"] = 0
+    inicio = time.perf_counter()
+    resumo = pre_processamento.sincronizar_diretorios(carregar_manifesto(), completo=True)
+    decorrido = time.perf_counter() - inicio
+    pre_processamento.processar_chunks_arquivo = original
+    return {
+        "arquivos": resumo["processados"],
+        "arquivos_com_erro": resumo["erros"],
+        "chunks": total_chunks,
+        "segundos": decorrido,
+        "chunks_por_segundo": total_chunks / decorrido if decorrido > 0 else None,
+        "round_trips": contador["round_trips"],
+        "memoria": pico_memoria_mb(),
+    }
+
+
+def medir_queries(queries: List[str], contador: Dict[str, int], top_k: int) -> Dict[str, Any]:
+    import query_processing
+
+    tempos_etapas: Dict[str, float] = {}
+    originais = {
+        nome: getattr(query_processing, nome)
+        for nome in ("get_query_embedding", "pesquisa_semantica", "get_resposta_modelo", "buscar_na_web", "gerar_resposta_stream")
+    }
+    query_processing.get_query_embedding = _cronometrar("embedding", originais["get_query_embedding"], tempos_etapas)
+    query_processing.pesquisa_semantica = _cronometrar("pesquisa", originais["pesquisa_semantica"], tempos_etapas)
+    query_processing.get_resposta_modelo = _cronometrar("reescrita_web", originais["get_resposta_modelo"], tempos_etapas)
+    query_processing.buscar_na_web = _cronometrar("web", originais["buscar_na_web"], tempos_etapas)
+    query_processing.gerar_resposta_stream = _cronometrar_gerador("geracao", originais["gerar_resposta_stream"], tempos_etapas)
+
+    totais, primeiros_tokens, round_trips = [], [], []
+    por_etapa: Dict[str, List[float]] = {}
+    usou_web = usou_web_e_docs = 0
+    try:
+        for query in queries:
+            tempos_etapas.clear()
+            contador["round_trips"] = 0
+            inicio = time.perf_counter()
+            for evento, valor in query_processing.processar_query_stream(query, top_k):
+                if evento == "fim":
+                    resultado = valor
+            totais.append(time.perf_counter() - inicio)
+            round_trips.append(contador["round_trips"])
+            if resultado["tempo_primeiro_token"] is not None:
+                primeiros_tokens.append(resultado["tempo_primeiro_token"])
+            usou_web += resultado["usou_web"]
+            usou_web_e_docs += resultado["usou_web_e_docs"]
+            for etapa, segundos in tempos_etapas.items():
+                por_etapa.setdefault(etapa, []).append(segundos)
+    finally:
+        for nome, func in originais.items():
+            setattr(query_processing, nome, func)
+
+    return {
+        "queries": len(queries),
+        "latencia_total": percentis(totais),
+        "tempo_primeiro_token": percentis(primeiros_tokens),
+        "etapas": {etapa: percentis(valores) for etapa, valores in sorted(por_etapa.items())},
+        "round_trips_por_query": float(np.mean(round_trips)) if round_trips else 0.0,
+        "fallback_web": usou_web,
+        "web_apos_verificacao": usou_web_e_docs,
+        "memoria": pico_memoria_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão e latência de queries com serviços simulados.")
+    parser.add_argument("--store", choices=("local", "pgvector"), default="local")
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--txts", type=int, default=20)
+    parser.add_argument("--paginas", type=int, default=10)
+    parser.add_argument("--palavras-pagina", type=int, default=450)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--fracao-web", type=float, default=0.2, help="Fração das queries sem resposta no corpus.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="Processos de parse/chunk.")
+    parser.add_argument("--tamanho-lote", type=int, default=256)
+    parser.add_argument("--latencia-embedding-ms", type=float, default=20.0)
+    parser.add_argument("--latencia-llm-ms", type=float, default=300.0, help="Latência até o primeiro token/resposta.")
+    parser.add_argument("--latencia-token-ms", type=float, default=5.0)
+    parser.add_argument("--latencia-web-ms", type=float, default=400.0)
+    parser.add_argument("--dimensao", type=int, default=1024, help="Dimensão dos embeddings simulados (pgvector: a da coluna).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: stdout).")
+    parser.add_argument("--manter-corpus", action="store_true", help="Não apaga o diretório temporário.")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="bench_rag_")
+    # Configuração lida na importação dos módulos do projeto, por isso vem antes dos imports abaixo.
+    os.environ["VECTOR_STORE"] = args.store
+    os.environ["LOCAL_STORE_PATH"] = os.path.join(diretorio, "indice_local")
+    os.environ["MANIFESTO_PATH"] = os.path.join(diretorio, "manifesto.json")
+    os.environ["CHECKPOINT_PATH"] = os.path.join(diretorio, "checkpoint.json")
+
+    import embeddings
+    import pre_processamento
+    import query_processing
+    from vector_store import get_vector_store
+
+    provedor = criar_provedor_simulado(args.latencia_embedding_ms / 1000, args.dimensao)
+    embeddings._provedor = provedor
+    instalar_simulacoes(args.latencia_llm_ms / 1000, args.latencia_token_ms / 1000, args.latencia_web_ms / 1000)
+    contador = {"round_trips": 0}
+    if args.store == "local":
+        # Sem PostgreSQL: os caches de embeddings e da web também ficam desligados.
+        pre_processamento.buscar_embeddings_cache = lambda hashes: {}
+        pre_processamento.salvar_embeddings_cache = lambda embeddings_por_hash: None
+        query_processing.buscar_cache_web = lambda query, query_embedding=None: None
+        query_processing.salvar_cache_web = lambda query, query_web, resultados, query_embedding=None: None
+    else:
+        instalar_contador_round_trips(contador)
+
+    try:
+        inicio = time.perf_counter()
+        textos = gerar_corpus(diretorio, args.pdfs, args.txts, args.paginas, args.palavras_pagina, args.seed)
+        tempo_corpus = time.perf_counter() - inicio
+        # Os prints da pipeline vão para o stderr, o stdout fica apenas com o JSON.
+        with redirect_stdout(sys.stderr):
+            ingestao = medir_ingestao(diretorio, contador, args.processos, args.tamanho_lote)
+            ingestao["segundos_gerando_corpus"] = tempo_corpus
+            queries = gerar_queries(textos, args.queries, args.fracao_web, args.seed)
+            resultado_queries = medir_queries(queries, contador, args.top_k)
+    finally:
+        if args.store == "pgvector":
+            caminhos = [os.path.join(raiz, nome) for raiz, _, nomes in os.walk(diretorio) for nome in nomes]
+            get_vector_store().remover_arquivos(caminhos)
+            with pre_processamento.conexao() as conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM embedding_cache WHERE model_id = %s", (provedor.model_id,))
+                cur.execute("DELETE FROM web_cache WHERE model_id = %s", (provedor.model_id,))
+                conn.commit()
+        if not args.manter_corpus:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    relatorio = {
+        "versao": versao_codigo(),
+        "data": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "parametros": vars(args),
+        "ingestao": ingestao,
+        "queries": resultado_queries,
+    }
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida + "\n")
+    else:
+        print(saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compara recall e latência da busca em um estágio (HNSW de precisão total) com a busca em dois
+estágios quantizada (halfvec/binário + rescoring com a precisão total) no banco configurado em db_utils.
+
+O gabarito de cada query é obtido com busca sequencial exata (índices desativados). As queries são
+embeddings de chunks já armazenados com um pouco de ruído, para não serem cópias exatas de uma linha.
+
+Uso (na raiz do repositório, com os índices de migrations/001_embedding_quantizado.sql criados):
+    python -m benchmarks.quantizacao --queries 200 --top-k 5 --fator-candidatos 10
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+from db_utils import conexao
+from vector_store import PgVectorStore
+
+Chave = Tuple[str, Any, int]
+
+
+def amostrar_queries(quantidade: int, ruido: float, seed: int) -> List[List[float]]:
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (seed / 2**31,))
+        cur.execute("SELECT embedding::text FROM docs ORDER BY random() LIMIT %s", (quantidade,))
+        vetores = [np.fromstring(linha[0][1:-1], sep=',', dtype=np.float32) for linha in cur.fetchall()]
+    rng = np.random.default_rng(seed)
+    queries = []
+    for vetor in vetores:
+        escala = ruido * np.linalg.norm(vetor) / np.sqrt(len(vetor))
+        queries.append((vetor + escala * rng.standard_normal(len(vetor)).astype(np.float32)).tolist())
+    return queries
+
+
+def vizinhos_exatos(query: List[float], top_k: int) -> Set[Chave]:
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute(
+            """
+            SELECT path_origem, num_pagina, indice_chunk
+            FROM docs
+            ORDER BY embedding <=> %s::vector
+            LIMIT %s
+            """,
+            (query, top_k)
+        )
+        return set(cur.fetchall())
+
+
+def medir(store: PgVectorStore, queries: List[List[float]], gabaritos: List[Set[Chave]], top_k: int) -> Dict[str, float]:
+    latencias = []
+    acertos = 0
+    for query, gabarito in zip(queries, gabaritos):
+        inicio = time.perf_counter()
+        resultados = store.pesquisar(query, top_k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        encontrados = {(r["path_origem"], r["num_pagina"], r["indice_chunk"]) for r in resultados}
+        acertos += len(encontrados & gabarito)
+    latencias = np.array(latencias)
+    return {
+        f"recall@{top_k}": acertos / max(1, sum(len(g) for g in gabaritos)),
+        "latencia_media_ms": float(latencias.mean()),
+        "latencia_p50_ms": float(np.percentile(latencias, 50)),
+        "latencia_p95_ms": float(np.percentile(latencias, 95)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall/latência da busca quantizada no pgvector.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fator-candidatos", type=int, default=10)
+    parser.add_argument("--ruido", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    queries = amostrar_queries(args.queries, args.ruido, args.seed)
+    gabaritos = [vizinhos_exatos(query, args.top_k) for query in queries]
+
+    relatorio = {"queries": len(queries), "top_k": args.top_k, "fator_candidatos": args.fator_candidatos, "modos": {}}
+    for modo in ("nenhuma", "halfvec", "binario"):
+        store = PgVectorStore(quantizacao=modo, fator_candidatos=args.fator_candidatos)
+        relatorio["modos"][modo] = medir(store, queries, gabaritos, args.top_k)
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == "__main__":
+    main()
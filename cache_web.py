@@ -0,0 +1,148 @@
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from psycopg2.extras import Json
+
+from db_utils import conexao
+from embeddings import get_provedor_embeddings
+from metricas import incrementar
+
+# Validade (segundos) de uma pesquisa na web em cache, 0 desativa o cache. Default: 1 dia.
+WEB_CACHE_TTL = int(os.getenv('WEB_CACHE_TTL', '86400'))
+# Máximo de pesquisas em cache, as menos acessadas recentemente são removidas.
+WEB_CACHE_MAX_ITENS = int(os.getenv('WEB_CACHE_MAX_ITENS', '10000'))
+# Similaridade mínima (coseno) entre embeddings para reaproveitar a pesquisa de uma query parecida,
+# 0 desativa e apenas a query normalizada idêntica é aceita.
+WEB_CACHE_SIMILARIDADE = float(os.getenv('WEB_CACHE_SIMILARIDADE', '0'))
+
+
+def normalizar_query(query: str) -> str:
+    """
+    Chave do cache: minúsculas, sem acentos, sem pontuação e com os espaços colapsados,
+    ex: 'O que é radiação?' e 'o que e radiacao' geram a mesma chave.
+
+    Args:
+        query (str): Query do usuário.
+    Returns:
+        str: Query normalizada.
+    """
+    texto = unicodedata.normalize('NFKD', query.casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', texto).split())
+
+
+def buscar_cache_web(query: str, query_embedding: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Procura uma pesquisa na web ainda válida para a query: primeiro pela query normalizada e, com
+    WEB_CACHE_SIMILARIDADE > 0 e o embedding informado, pela query em cache mais parecida do mesmo modelo.
+    O acesso atualiza 'ultimo_acesso', usado na remoção das entradas excedentes.
+
+    Args:
+        query (str): Query do usuário.
+        query_embedding (Optional[List[float]]): Embedding da query, para aceitar queries parecidas.
+    Returns:
+        Optional[Dict[str,Any]]: {'query_web': consulta reescrita, 'resultados': pesquisa na web} ou None.
+    """
+    if WEB_CACHE_TTL <= 0:
+        return None
+    # Erros (inclusive banco fora do ar) apenas fazem a pesquisa ser feita novamente.
+    try:
+        with conexao() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE web_cache SET ultimo_acesso = now()
+                WHERE query_normalizada = %s AND criado_em >= now() - make_interval(secs => %s)
+                RETURNING query_web, resultados
+                """,
+                (normalizar_query(query), WEB_CACHE_TTL)
+            )
+            linha = cur.fetchone()
+            resultado = 'hit'
+            if linha is None and query_embedding is not None and WEB_CACHE_SIMILARIDADE > 0:
+                cur.execute(
+                    """
+                    UPDATE web_cache SET ultimo_acesso = now()
+                    WHERE query_normalizada = (
+                        SELECT query_normalizada
+                        FROM web_cache
+                        WHERE model_id = %(model_id)s AND criado_em >= now() - make_interval(secs => %(ttl)s)
+                        ORDER BY embedding <=> %(embedding)s::vector
+                        LIMIT 1
+                    )
+                    AND 1 - (embedding <=> %(embedding)s::vector) >= %(minimo)s
+                    RETURNING query_web, resultados
+                    """,
+                    {
+                        "model_id": get_provedor_embeddings().model_id,
+                        "ttl": WEB_CACHE_TTL,
+                        "embedding": np.asarray(query_embedding, dtype=float).tolist(),
+                        "minimo": WEB_CACHE_SIMILARIDADE,
+                    }
+                )
+                linha = cur.fetchone()
+                resultado = 'similar'
+            conn.commit()
+    except Exception as e:
+        print(f"Erro ao consultar cache da web: {e}")
+        return None
+
+    if linha is None:
+        incrementar('cache_web_total', resultado='miss')
+        return None
+    incrementar('cache_web_total', resultado=resultado)
+    print(f"Pesquisa na web reaproveitada do cache ({resultado}).")
+    return {"query_web": linha[0], "resultados": linha[1]}
+
+
+def salvar_cache_web(
+    query: str,
+    query_web: str,
+    resultados: List[Dict[str, Any]],
+    query_embedding: Optional[List[float]] = None
+) -> None:
+    """
+    Armazena a consulta reescrita e os resultados da pesquisa na web, removendo em seguida as entradas
+    expiradas e as que excedem WEB_CACHE_MAX_ITENS. Pesquisas sem resultados não são armazenadas.
+
+    Args:
+        query (str): Query do usuário.
+        query_web (str): Consulta reescrita para a web.
+        resultados (List[Dict[str,Any]]): Resultados de `buscar_na_web`.
+        query_embedding (Optional[List[float]]): Embedding da query, usado na busca por queries parecidas.
+    """
+    if WEB_CACHE_TTL <= 0 or not resultados:
+        return
+    embedding = np.asarray(query_embedding, dtype=float).tolist() if query_embedding is not None else None
+    try:
+        with conexao() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO web_cache (query_normalizada, query_web, resultados, embedding, model_id)
+                VALUES (%s, %s, %s, %s::vector, %s)
+                ON CONFLICT (query_normalizada) DO UPDATE
+                SET
+                    query_web = EXCLUDED.query_web,
+                    resultados = EXCLUDED.resultados,
+                    embedding = EXCLUDED.embedding,
+                    model_id = EXCLUDED.model_id,
+                    criado_em = now(),
+                    ultimo_acesso = now()
+                """,
+                (normalizar_query(query), query_web, Json(resultados), embedding, get_provedor_embeddings().model_id)
+            )
+            cur.execute(
+                """
+                DELETE FROM web_cache
+                WHERE criado_em < now() - make_interval(secs => %s)
+                OR query_normalizada IN (
+                    SELECT query_normalizada FROM web_cache ORDER BY ultimo_acesso DESC OFFSET %s
+                )
+                """,
+                (WEB_CACHE_TTL, WEB_CACHE_MAX_ITENS)
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Erro ao salvar cache da web: {e}")
@@ -0,0 +1,103 @@
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Dimensão dos embeddings do Titan v2 (coluna VECTOR(1024) de 'docs').
+DIMENSAO_PADRAO = 1024
+
+
+class ChunkBatch:
+    """
+    Lote de chunks em formato colunar: os metadados ficam em listas (uma por coluna) e os embeddings
+    em uma única matriz float32 contígua (n_chunks, dimensao), em vez de um dicionário com uma lista de
+    1024 floats do Python por chunk (~30 KB cada). A matriz é enviada ao banco no formato binário do
+    pgvector sem criar um objeto float por valor (ver `vector_store.gerar_copy_binario`).
+
+    Iterar sobre o lote produz dicionários no formato de `dados_chunk` (o 'embedding' é uma view da linha
+    da matriz), então ele pode ser passado para as funções que esperam a lista de dicionários.
+    """
+    __slots__ = ('path_origem', 'pag', 'indice_chunk', 'conteudo', 'modtempo', 'embeddings')
+
+    def __init__(
+        self,
+        path_origem: List[str],
+        pag: List[Optional[int]],
+        indice_chunk: List[int],
+        conteudo: List[str],
+        modtempo: List[Any],
+        embeddings: Optional[np.ndarray] = None,
+        dimensao: int = DIMENSAO_PADRAO
+    ):
+        self.path_origem = path_origem
+        self.pag = pag
+        self.indice_chunk = indice_chunk
+        self.conteudo = conteudo
+        self.modtempo = modtempo
+        if embeddings is None:
+            embeddings = np.zeros((len(conteudo), dimensao), dtype=np.float32)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    @classmethod
+    def de_dicionarios(cls, dados_chunk: Sequence[Dict[str, Any]], dimensao: int = DIMENSAO_PADRAO) -> "ChunkBatch":
+        """
+        Cria o lote a partir de dicionários no formato de `dados_chunk`. Embeddings None ficam zerados
+        para serem preenchidos depois (ver `pre_processamento.preencher_embeddings`).
+
+        Args:
+            dados_chunk (Sequence[Dict[str,Any]]): Chunks processados.
+            dimensao (int): Dimensão dos embeddings, usada quando nenhum chunk possui embedding.
+        Returns:
+            ChunkBatch: Lote com os mesmos chunks, na mesma ordem.
+        """
+        if isinstance(dados_chunk, ChunkBatch):
+            return dados_chunk
+        preenchidos = [dado['embedding'] for dado in dados_chunk if dado.get('embedding') is not None]
+        if preenchidos:
+            dimensao = len(preenchidos[0])
+        lote = cls(
+            [dado['path_origem'] for dado in dados_chunk],
+            [dado['pag'] for dado in dados_chunk],
+            [dado['indice_chunk'] for dado in dados_chunk],
+            [dado['conteudo'] for dado in dados_chunk],
+            [dado['modtempo'] for dado in dados_chunk],
+            dimensao=dimensao
+        )
+        for i, dado in enumerate(dados_chunk):
+            if dado.get('embedding') is not None:
+                lote.embeddings[i] = dado['embedding']
+        return lote
+
+    def __len__(self) -> int:
+        return len(self.conteudo)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return {
+            "path_origem": self.path_origem[i],
+            "conteudo": self.conteudo[i],
+            "pag": self.pag[i],
+            "indice_chunk": self.indice_chunk[i],
+            "embedding": self.embeddings[i],
+            "modtempo": self.modtempo[i],
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def vetores_pgvector(self, dimensao: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Gera cada embedding no formato binário do pgvector (dimensão e reservado em uint16 seguidos dos
+        float4 big-endian). A conversão de endianness é feita uma vez para a matriz inteira.
+
+        Args:
+            dimensao (Optional[int]): Dimensão de saída, embeddings menores são completados com zeros.
+        Yields:
+            bytes: Valor binário do embedding de cada chunk, na ordem do lote.
+        """
+        matriz = self.embeddings.astype('>f4')
+        if dimensao and dimensao > matriz.shape[1]:
+            matriz = np.pad(matriz, ((0, 0), (0, dimensao - matriz.shape[1])))
+        cabecalho = struct.pack('>HH', matriz.shape[1], 0)
+        for linha in matriz:
+            yield cabecalho + linha.tobytes()
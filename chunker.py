@@ -0,0 +1,280 @@
+from __future__ import annotations # Anotações com Document não importam o langchain.
+
+import os
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+
+# Divisor usado por `pre_processamento.chunk_document`: 'langchain' (RecursiveCharacterTextSplitter) ou 'nativo'
+# (este módulo, opcional: mais lento e com mais chunks, mas menos embeddings refeitos após edições, ver benchmarks/chunking.py).
+CHUNKER = os.getenv('CHUNKER', 'langchain')
+# Tamanho máximo e sobreposição dos chunks, na unidade de CHUNK_UNIDADE.
+CHUNK_TAMANHO = int(os.getenv('CHUNK_TAMANHO', '1300'))
+CHUNK_SOBREPOSICAO = int(os.getenv('CHUNK_SOBREPOSICAO', '400'))
+# 'caracteres' ou 'tokens' (palavras e sinais de pontuação, aproximação dos tokens do modelo de embedding).
+CHUNK_UNIDADE = os.getenv('CHUNK_UNIDADE', 'caracteres')
+# Caracteres antes de um corte usados na assinatura (hash) que define as âncoras.
+TAMANHO_ASSINATURA = 16
+
+# Cortes possíveis, em ordem de preferência: parágrafo (quebra de linha seguida de uma linha em branco), fim de
+# frase (pontuação seguida de espaço) e quebra de linha. No texto extraído de PDFs as quebras de linha seguem o
+# layout e mudam quando o parágrafo é editado, os fins de frase não. Espaços só são usados em trechos sem nenhum deles.
+NIVEL_PARAGRAFO, NIVEL_FRASE, NIVEL_LINHA = 2, 1, 0
+_ESPACOS = ' \t\n\r\x0b\x0c\xa0'
+_PONTUACAO = '.!?;:'
+_BRANCOS_LINHA = ' \t\r'
+_CLASSE_ESPACO, _CLASSE_PONTUACAO, _CLASSE_BRANCO_LINHA = 1, 2, 4
+_CLASSES = np.zeros(256, dtype=np.uint8)
+for caracteres, classe in ((_ESPACOS, _CLASSE_ESPACO), (_PONTUACAO, _CLASSE_PONTUACAO), (_BRANCOS_LINHA, _CLASSE_BRANCO_LINHA)):
+    _CLASSES[[ord(c) for c in caracteres]] |= classe
+# Hash polinomial (FNV) dos caracteres, módulo 2^64.
+_POTENCIAS = np.array([pow(1099511628211, i, 2**64) for i in range(TAMANHO_ASSINATURA)], dtype=np.uint64)
+_ESPACO = re.compile(r'\s')
+_TOKENS = re.compile(r'\w+|[^\w\s]')
+
+
+def _cortes_possiveis(texto: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Posições onde um chunk pode terminar (antes da quebra de linha ou logo após a pontuação de fim de frase),
+    em ordem crescente, e o score de cada uma: nível do separador nos bits mais altos e o hash dos
+    TAMANHO_ASSINATURA caracteres anteriores nos demais, com todo espaço em branco tratado como ' ' (o texto
+    reorganizado em outras linhas mantém o score). O score depende apenas do texto próximo ao corte.
+    Tudo é calculado com numpy sobre os code points da página, sem um laço do Python por caractere ou separador.
+    """
+    codigos = np.frombuffer(texto.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    # Todos os separadores são Latin-1, os demais code points caem na última posição da tabela ('ÿ', sem classe).
+    classes = _CLASSES.take(codigos, mode='clip')
+    quebras = np.flatnonzero(codigos == ord('\n'))
+    frases = np.flatnonzero((classes[:-1] & _CLASSE_PONTUACAO).astype(bool) & (classes[1:] & _CLASSE_ESPACO).astype(bool)) + 1
+    # Parágrafo: entre a quebra e a seguinte só há espaços/tabs (verificado apenas para quebras próximas).
+    paragrafo = np.zeros(len(quebras), dtype=bool)
+    for i in np.flatnonzero(np.diff(quebras) <= TAMANHO_ASSINATURA).tolist():
+        paragrafo[i] = bool((classes[quebras[i] + 1:quebras[i + 1]] & _CLASSE_BRANCO_LINHA).all())
+
+    cortes = np.concatenate([quebras, frases])
+    niveis = np.concatenate([np.where(paragrafo, NIVEL_PARAGRAFO, NIVEL_LINHA), np.full(len(frases), NIVEL_FRASE)])
+    ordem = np.argsort(cortes, kind='stable')
+    cortes, niveis = cortes[ordem], niveis[ordem].astype(np.uint64)
+
+    normalizados = np.where(classes & _CLASSE_ESPACO, ord(' '), codigos).astype(np.uint64)
+    preenchido = np.concatenate([np.zeros(TAMANHO_ASSINATURA, dtype=np.uint64), normalizados])
+    assinaturas = (preenchido[cortes[:, None] + np.arange(TAMANHO_ASSINATURA)] * _POTENCIAS).sum(axis=1, dtype=np.uint64)
+    # Finalizador do splitmix64, espalha os bits para os scores não seguirem a ordem dos caracteres.
+    assinaturas ^= assinaturas >> np.uint64(31)
+    assinaturas *= np.uint64(0x9E3779B97F4A7C15)
+    assinaturas ^= assinaturas >> np.uint64(29)
+    return cortes, (niveis << np.uint64(62)) | (assinaturas >> np.uint64(2))
+
+
+def _ancoras(posicoes: np.ndarray, scores: np.ndarray, raio: int) -> np.ndarray:
+    """
+    Máscara dos cortes cujo score é o maior entre os cortes a até `raio` unidades de distância (em `posicoes`,
+    crescentes). Cada âncora depende apenas do texto ao seu redor, então uma edição só cria ou remove âncoras
+    a menos de `raio` dela, e âncoras consecutivas ficam a pelo menos `raio` unidades uma da outra. Em empates
+    (texto repetido) vence o corte mais à esquerda.
+
+    O máximo de cada vizinhança vem de uma sparse table (máximos de blocos de 2^k cortes), com um número
+    de operações do numpy que não depende da quantidade de cortes.
+    """
+    if len(scores) == 0:
+        return np.zeros(0, dtype=bool)
+    inicio = np.searchsorted(posicoes, posicoes - raio, 'left')
+    tamanho = np.searchsorted(posicoes, posicoes + raio, 'right') - inicio
+    nivel = np.log2(tamanho).astype(np.intp)
+    # Posição de cada corte na ordem (score, corte mais à esquerda primeiro), sem empates.
+    ranks = np.empty(len(scores), dtype=np.intp)
+    ranks[np.lexsort((-np.arange(len(scores)), scores))] = np.arange(len(scores))
+    tabela = [ranks]
+    while (1 << len(tabela)) <= tamanho.max():
+        anterior, passo = tabela[-1], 1 << (len(tabela) - 1)
+        tabela.append(np.concatenate([np.maximum(anterior[:-passo], anterior[passo:]), anterior[-passo:]]))
+    tabela = np.stack(tabela)
+    maximo = np.maximum(tabela[nivel, inicio], tabela[nivel, inicio + tamanho - (1 << nivel)])
+    return ranks == maximo
+
+
+def _escolher_corte(
+    texto: str,
+    cortes: List[int],
+    scores: List[int],
+    ancoras: List[int],
+    inicio_janela: int,
+    fim_janela: int,
+    fim_anterior: int
+) -> int:
+    """
+    Fim do chunk em [inicio_janela, fim_janela]: a próxima âncora, se estiver na janela. Caso contrário o trecho
+    entre o fim do chunk anterior e a próxima âncora é dividido em partes iguais e o corte é o separador
+    de maior score perto do fim da primeira parte; sem separadores, o último espaço ou um corte forçado no fim da janela.
+    Esse corte depende apenas das duas âncoras e do texto entre elas, não do início do chunk.
+    """
+    i = bisect_left(ancoras, inicio_janela)
+    proxima = ancoras[i] if i < len(ancoras) else len(texto)
+    if proxima <= fim_janela:
+        return proxima
+    partes = -(-(proxima - fim_anterior) // (fim_janela - fim_anterior))
+    alvo = fim_anterior + (proxima - fim_anterior) // partes
+    inicio_janela = max(inicio_janela, alvo - (fim_janela - alvo) // 2)
+    primeiro, ultimo = bisect_left(cortes, inicio_janela), bisect_right(cortes, fim_janela)
+    if primeiro < ultimo:
+        return cortes[max(range(primeiro, ultimo), key=scores.__getitem__)]
+    espaco = max(texto.rfind(' ', inicio_janela, fim_janela), texto.rfind('\t', inicio_janela, fim_janela))
+    return espaco if espaco > inicio_janela else fim_janela
+
+
+def _medidas(texto: str, unidade: str) -> Tuple[Callable[[np.ndarray], np.ndarray], Callable[[int, int], int], Callable[[int, int], int]]:
+    """
+    Funções que convertem a unidade dos chunks em posições do texto: posições(p) é a quantidade de unidades
+    antes de cada posição de p, avançar(p, n) o limite de um trecho com n unidades a partir de p e recuar(p, n) o início
+    de um trecho com n unidades terminando em p.
+    """
+    tamanho_texto = len(texto)
+    if unidade == 'caracteres':
+        return (
+            lambda posicoes: posicoes,
+            lambda posicao, quantidade: min(posicao + quantidade, tamanho_texto),
+            lambda posicao, quantidade: max(posicao - quantidade, 0),
+        )
+    if unidade == 'tokens':
+        inicios = [token.start() for token in _TOKENS.finditer(texto)]
+
+        def avancar(posicao: int, quantidade: int) -> int:
+            fim = bisect_left(inicios, posicao) + quantidade
+            return inicios[fim] if fim < len(inicios) else tamanho_texto
+
+        def recuar(posicao: int, quantidade: int) -> int:
+            inicio = bisect_left(inicios, posicao) - quantidade
+            return inicios[max(inicio, 0)] if inicios else 0
+
+        return lambda posicoes: np.searchsorted(inicios, posicoes), avancar, recuar
+    raise ValueError(f"Unidade {unidade} não é suportada, use 'caracteres' ou 'tokens'.")
+
+
+def _pular_espacos(texto: str, posicao: int) -> int:
+    while posicao < len(texto) and texto[posicao].isspace():
+        posicao += 1
+    return posicao
+
+
+def offsets_chunks(
+    texto: str,
+    tamanho: int = CHUNK_TAMANHO,
+    sobreposicao: int = CHUNK_SOBREPOSICAO,
+    unidade: str = CHUNK_UNIDADE
+) -> Iterator[Tuple[int, int]]:
+    """
+    Divide o texto de uma página em chunks de até `tamanho` unidades, retornando apenas as posições
+    (inicio, fim) de cada chunk no texto original, sem copiar o conteúdo.
+
+    Os cortes são âncoras definidas pelo conteúdo (ver `_ancoras`): cada chunk termina na âncora seguinte ao fim
+    do chunk anterior e começa na primeira palavra após fim anterior - `sobreposicao`. Como as âncoras não dependem
+    da posição na página, um texto inserido ou removido altera apenas os chunks próximos à edição, os demais
+    continuam com o mesmo conteúdo (e reaproveitam o cache de embeddings). As âncoras são máximos locais em um
+    raio de metade do avanço máximo de um chunk (`tamanho` - `sobreposicao`), então ficam a pelo menos meio avanço
+    uma da outra; trechos maiores que um avanço entre duas âncoras são divididos em partes iguais.
+
+    Args:
+        texto (str): Texto da página.
+        tamanho (int): Tamanho máximo de um chunk. Default: CHUNK_TAMANHO ou 1300.
+        sobreposicao (int): Tamanho aproximado do texto repetido entre chunks vizinhos. Default: CHUNK_SOBREPOSICAO ou 400.
+        unidade (str): 'caracteres' ou 'tokens'. Default: CHUNK_UNIDADE ou 'caracteres'.
+    Yields:
+        Tuple[int,int]: Posições (inicio, fim) do chunk, `texto[inicio:fim]` é o conteúdo sem espaços nas bordas.
+    Raises:
+        ValueError: Quando a unidade não é suportada ou a sobreposição não é menor que o tamanho.
+    """
+    if not 0 <= sobreposicao < tamanho:
+        raise ValueError(f"A sobreposição ({sobreposicao}) deve ser menor que o tamanho do chunk ({tamanho}).")
+    raio = max(1, (tamanho - sobreposicao) // 2)
+    posicoes, avancar, recuar = _medidas(texto, unidade)
+    cortes, scores = _cortes_possiveis(texto)
+    ancoras = cortes[_ancoras(posicoes(cortes), scores, raio)].tolist()
+    cortes, scores = cortes.tolist(), scores.tolist()
+
+    inicio = corte = _pular_espacos(texto, 0)
+    fim_minimo = avancar(inicio, raio)
+    while inicio < len(texto):
+        limite = avancar(inicio, tamanho)
+        ultimo_chunk = limite >= len(texto)
+        corte = len(texto) if ultimo_chunk else _escolher_corte(texto, cortes, scores, ancoras, fim_minimo, limite, corte)
+        fim = corte
+        while fim > inicio + 1 and texto[fim - 1].isspace():
+            fim -= 1
+        yield inicio, fim
+        if ultimo_chunk:
+            break
+        # Próximo chunk começa na primeira palavra após fim - sobreposição, posição que também depende só do conteúdo.
+        espaco = _ESPACO.search(texto, recuar(fim, sobreposicao), fim)
+        proximo = _pular_espacos(texto, espaco.start()) if espaco else fim
+        inicio = proximo if inicio < proximo < fim else _pular_espacos(texto, fim)
+        # A partir do corte e não do fim sem os espaços (ex: ' \n\n'), senão o mesmo corte seria escolhido de novo.
+        fim_minimo = max(corte, inicio) + 1
+
+
+def dividir_texto(texto: str, **parametros) -> Iterator[str]:
+    """
+    Conteúdo de cada chunk de `offsets_chunks`, fatiado apenas quando pedido.
+    """
+    for inicio, fim in offsets_chunks(texto, **parametros):
+        yield texto[inicio:fim]
+
+
+@lru_cache(maxsize=None)
+def criar_splitter_langchain(
+    tamanho: int = CHUNK_TAMANHO,
+    sobreposicao: int = CHUNK_SOBREPOSICAO,
+    unidade: str = CHUNK_UNIDADE
+) -> Any:
+    """
+    RecursiveCharacterTextSplitter com os mesmos parâmetros, criado uma única vez por configuração (CHUNKER=langchain
+    e comparação em benchmarks/chunking.py). Com unidade 'tokens' o tamanho é medido com a mesma contagem de tokens.
+    """
+    # https://python.langchain.com/docs/how_to/recursive_text_splitter/
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    if unidade not in ('caracteres', 'tokens'):
+        raise ValueError(f"Unidade {unidade} não é suportada, use 'caracteres' ou 'tokens'.")
+    return RecursiveCharacterTextSplitter(
+        chunk_size = tamanho,
+        chunk_overlap = sobreposicao,
+        length_function = len if unidade == 'caracteres' else lambda texto: len(_TOKENS.findall(texto)),
+        is_separator_regex = False,
+    )
+
+
+def dividir_documentos(documentos: Iterable[Document], chunker: str = CHUNKER, **parametros) -> Iterator[Document]:
+    """
+    Divide cada documento (página) em chunks. Com o chunker 'nativo' usa `offsets_chunks` e os metadados do
+    documento recebem as posições do chunk na página em 'start_index' e 'end_index' ('start_index' como no
+    add_start_index do langchain). Com 'langchain' usa o RecursiveCharacterTextSplitter.
+
+    Args:
+        documentos (Iterable[Document]): Páginas/arquivos carregados pelos loaders do langchain.
+        chunker (str): 'nativo' ou 'langchain'. Default: CHUNKER ou 'langchain'.
+        **parametros: Repassados para `offsets_chunks` ou `criar_splitter_langchain` (tamanho, sobreposicao, unidade).
+    Yields:
+        Document: Chunks na ordem dos documentos.
+    Raises:
+        ValueError: Quando o chunker não é suportado.
+    """
+    if chunker == 'langchain':
+        yield from criar_splitter_langchain(**parametros).split_documents(documentos)
+        return
+    if chunker != 'nativo':
+        raise ValueError(f"Chunker {chunker} não é suportado, use 'nativo' ou 'langchain'.")
+
+    from langchain.schema.document import Document
+
+    for documento in documentos:
+        texto = documento.page_content
+        for inicio, fim in offsets_chunks(texto, **parametros):
+            yield Document(
+                page_content=texto[inicio:fim],
+                metadata={**documento.metadata, 'start_index': inicio, 'end_index': fim}
+            )
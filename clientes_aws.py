@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from metricas import incrementar, observar
+
+# Conexões HTTP mantidas abertas por cliente, deve cobrir as chamadas simultâneas do processo
+# (EMBEDDING_MAX_WORKERS na ingestão, LLM_CONCORRENCIA nas queries em lote). O padrão do botocore é 10.
+AWS_MAX_CONEXOES = int(os.getenv('AWS_MAX_CONEXOES', '32'))
+# Tentativas por chamada no modo 'adaptive' do botocore, que também limita a taxa de envio ao receber throttling.
+AWS_MAX_TENTATIVAS = int(os.getenv('AWS_MAX_TENTATIVAS', '3'))
+AWS_TIMEOUT_CONEXAO = float(os.getenv('AWS_TIMEOUT_CONEXAO', '5'))
+AWS_TIMEOUT_LEITURA = float(os.getenv('AWS_TIMEOUT_LEITURA', '60'))
+
+_clientes: Dict[str, Any] = {}
+_clientes_lock = threading.Lock()
+
+
+def _registrar_metricas(cliente: Any, servico: str) -> None:
+    """
+    Conta as requisições HTTP (inclusive retentativas) e mede a duração de cada chamada da API
+    através dos eventos do botocore, nas métricas 'aws_requisicoes_total' e 'aws_chamada_segundos'.
+    """
+    def antes_da_chamada(context: Dict[str, Any], **kwargs) -> None:
+        context['inicio_metricas'] = time.perf_counter()
+
+    def depois_da_chamada(model: Any, context: Dict[str, Any], **kwargs) -> None:
+        if 'inicio_metricas' in context:
+            observar('aws_chamada_segundos', time.perf_counter() - context['inicio_metricas'], servico=servico, operacao=model.name)
+
+    def antes_do_envio(event_name: str, **kwargs) -> None:
+        incrementar('aws_requisicoes_total', servico=servico, operacao=event_name.rsplit('.', 1)[-1])
+
+    cliente.meta.events.register(f'before-call.{servico}', antes_da_chamada)
+    cliente.meta.events.register(f'after-call.{servico}', depois_da_chamada)
+    cliente.meta.events.register(f'before-send.{servico}', antes_do_envio)
+
+
+def criar_cliente(servico: str = 'bedrock-runtime') -> Any:
+    """
+    Cria um cliente boto3 com keep-alive, pool de conexões de AWS_MAX_CONEXOES e retentativas adaptativas.
+    Prefira `get_cliente`, criar um cliente resolve credenciais e endpoint novamente e não reaproveita conexões.
+
+    Args:
+        servico (str): Nome do serviço no boto3.
+    Returns:
+        Any: Cliente boto3 do serviço.
+    """
+    import boto3
+    from botocore.config import Config
+
+    inicio = time.perf_counter()
+    config = Config(
+        max_pool_connections=AWS_MAX_CONEXOES,
+        retries={'mode': 'adaptive', 'total_max_attempts': AWS_MAX_TENTATIVAS},
+        tcp_keepalive=True,
+        connect_timeout=AWS_TIMEOUT_CONEXAO,
+        read_timeout=AWS_TIMEOUT_LEITURA,
+    )
+    # Sessão própria: a sessão padrão do boto3 não é thread-safe, os clientes criados por ela são.
+    cliente = boto3.session.Session().client(servico, config=config)
+    _registrar_metricas(cliente, servico)
+    observar('aws_criacao_cliente_segundos', time.perf_counter() - inicio, servico=servico)
+    return cliente
+
+
+def get_cliente(servico: str = 'bedrock-runtime') -> Any:
+    """
+    Retorna o cliente do processo para o serviço, criando-o no primeiro uso. O mesmo cliente é compartilhado
+    entre as threads (embeddings, LLM, Streamlit), reaproveitando credenciais e conexões TLS já abertas.
+
+    Args:
+        servico (str): Nome do serviço no boto3. Default: 'bedrock-runtime'.
+    Returns:
+        Any: Cliente boto3 do serviço.
+    """
+    cliente = _clientes.get(servico)
+    if cliente is None:
+        with _clientes_lock:
+            cliente = _clientes.get(servico)
+            if cliente is None:
+                cliente = criar_cliente(servico)
+                _clientes[servico] = cliente
+    return cliente
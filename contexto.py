@@ -0,0 +1,171 @@
+import math
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from metricas import incrementar
+
+# Máximo de tokens dos contextos no prompt de resposta (documentos + web).
+CONTEXTO_MAX_TOKENS = int(os.getenv('CONTEXTO_MAX_TOKENS', '3000'))
+# Fração do orçamento reservada para os resultados da web quando eles existem.
+CONTEXTO_FRACAO_WEB = float(os.getenv('CONTEXTO_FRACAO_WEB', '0.3'))
+# Peso da relevância no MMR, 1 ignora a redundância entre os chunks.
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.7'))
+# Chunks com similaridade (coseno) acima disso com um chunk já escolhido são considerados duplicados.
+CONTEXTO_LIMIAR_DUPLICADO = float(os.getenv('CONTEXTO_LIMIAR_DUPLICADO', '0.97'))
+# Estimativa de caracteres por token, o tokenizador do Claude não está disponível localmente.
+CARACTERES_POR_TOKEN = 4
+# Tamanho do início de um chunk procurado no chunk anterior para encontrar a sobreposição.
+TAMANHO_SONDA = 32
+
+
+def contar_tokens(texto: str) -> int:
+    """
+    Estimativa do número de tokens de um texto (CARACTERES_POR_TOKEN caracteres por token).
+    """
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _texto_contexto(contexto: Dict[str, Any]) -> str:
+    if 'link' in contexto:
+        return f"{contexto.get('link', '')} {contexto.get('title', '')} {contexto.get('snippet', '')}"
+    return contexto['conteudo']
+
+
+def tamanho_sobreposicao(anterior: str, atual: str) -> int:
+    """
+    Tamanho do maior sufixo de `anterior` que também é prefixo de `atual`, ou seja, o texto repetido entre
+    dois chunks vizinhos pelo chunk_overlap do splitter. Sobreposições menores que TAMANHO_SONDA são ignoradas.
+
+    Args:
+        anterior (str): Conteúdo do chunk anterior.
+        atual (str): Conteúdo do chunk seguinte.
+    Returns:
+        int: Quantidade de caracteres repetidos no início de `atual`, 0 se não houver sobreposição.
+    """
+    sonda = atual[:TAMANHO_SONDA]
+    posicao = anterior.find(sonda)
+    while posicao != -1:
+        if atual.startswith(anterior[posicao:]):
+            return len(anterior) - posicao
+        posicao = anterior.find(sonda, posicao + 1)
+    return 0
+
+
+def mesclar_adjacentes(contextos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Junta chunks consecutivos (mesmo path_origem e página, indice_chunk seguido) em um único contexto,
+    removendo o texto repetido pela sobreposição. O contexto mesclado guarda 'indice_chunk_fim', a maior
+    similaridade e o embedding do chunk mais similar. Os blocos seguem a ordem de entrada do seu primeiro chunk.
+
+    Args:
+        contextos (List[Dict[str,Any]]): Contextos dos documentos (formato de `pesquisa_semantica`).
+    Returns:
+        List[Dict[str,Any]]: Contextos mesclados.
+    """
+    chave = lambda i: (contextos[i]['path_origem'], contextos[i]['num_pagina'] or 0, contextos[i]['indice_chunk'])
+    blocos = []
+    for i in sorted(range(len(contextos)), key=chave):
+        contexto = contextos[i]
+        anterior = blocos[-1] if blocos else None
+        if (
+            anterior is not None
+            and anterior['contexto']['path_origem'] == contexto['path_origem']
+            and anterior['contexto']['num_pagina'] == contexto['num_pagina']
+            and anterior['contexto']['indice_chunk_fim'] + 1 == contexto['indice_chunk']
+        ):
+            mesclado = anterior['contexto']
+            sobreposicao = tamanho_sobreposicao(mesclado['conteudo'], contexto['conteudo'])
+            separador = '' if sobreposicao else '\n'
+            mesclado['conteudo'] += separador + contexto['conteudo'][sobreposicao:]
+            mesclado['indice_chunk_fim'] = contexto['indice_chunk']
+            if contexto['similaridade'] > mesclado['similaridade']:
+                mesclado['similaridade'] = contexto['similaridade']
+                if 'embedding' in contexto:
+                    mesclado['embedding'] = contexto['embedding']
+            anterior['posicao'] = min(anterior['posicao'], i)
+        else:
+            blocos.append({'posicao': i, 'contexto': {**contexto, 'indice_chunk_fim': contexto['indice_chunk']}})
+    return [bloco['contexto'] for bloco in sorted(blocos, key=lambda bloco: bloco['posicao'])]
+
+
+def ordenar_mmr(
+    embeddings: np.ndarray,
+    relevancia: np.ndarray,
+    lambda_mmr: float = MMR_LAMBDA,
+    limiar_duplicado: float = CONTEXTO_LIMIAR_DUPLICADO
+) -> List[int]:
+    """
+    Ordena os candidatos por maximal marginal relevance: a cada passo escolhe o que maximiza
+    lambda * relevância - (1 - lambda) * maior similaridade com os já escolhidos. As similaridades entre
+    todos os pares vêm de um único produto matricial sobre os embeddings armazenados.
+
+    Args:
+        embeddings (np.ndarray): Matriz (n, dim) com os embeddings dos candidatos.
+        relevancia (np.ndarray): Similaridade (n,) de cada candidato com a query.
+        lambda_mmr (float): Peso da relevância.
+        limiar_duplicado (float): Candidatos com similaridade acima disso com um escolhido são descartados.
+    Returns:
+        List[int]: Índices dos candidatos mantidos, na ordem de escolha.
+    """
+    normalizados = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similaridades = normalizados @ normalizados.T
+    restantes = np.ones(len(embeddings), dtype=bool)
+    redundancia = np.zeros(len(embeddings), dtype=np.float32)
+    ordem = []
+    while restantes.any():
+        scores = np.where(restantes, lambda_mmr * relevancia - (1 - lambda_mmr) * redundancia, -np.inf)
+        escolhido = int(np.argmax(scores))
+        ordem.append(escolhido)
+        restantes[escolhido] = False
+        redundancia = np.maximum(redundancia, similaridades[escolhido])
+        restantes &= redundancia < limiar_duplicado
+    return ordem
+
+
+def montar_contexto(contextos: List[Dict[str, Any]], max_tokens: int = CONTEXTO_MAX_TOKENS) -> List[Dict[str, Any]]:
+    """
+    Seleciona os contextos que entram no prompt de resposta, dentro de `max_tokens`:
+        1. Chunks dos documentos ordenados por MMR (descartando quase duplicados), quando possuem 'embedding'.
+        2. Chunks adicionados nessa ordem enquanto o total, já com os chunks vizinhos mesclados, couber no orçamento
+           (menos CONTEXTO_FRACAO_WEB dele se houver resultados da web).
+        3. Resultados da web, na ordem da pesquisa, no orçamento restante.
+
+    Args:
+        contextos (List[Dict[str,Any]]): Contextos dos documentos e/ou da web.
+        max_tokens (int): Orçamento de tokens. Default: CONTEXTO_MAX_TOKENS ou 3000.
+    Returns:
+        List[Dict[str,Any]]: Contextos para o prompt, chunks vizinhos mesclados (ver `mesclar_adjacentes`).
+    """
+    documentos = [contexto for contexto in contextos if 'link' not in contexto]
+    web = [contexto for contexto in contextos if 'link' in contexto]
+
+    ordem = list(range(len(documentos)))
+    if documentos and all(contexto.get('embedding') is not None for contexto in documentos):
+        ordem = ordenar_mmr(
+            np.stack([np.asarray(contexto['embedding'], dtype=np.float32) for contexto in documentos]),
+            np.asarray([contexto['similaridade'] for contexto in documentos], dtype=np.float32)
+        )
+
+    orcamento_documentos = max_tokens * (1 - CONTEXTO_FRACAO_WEB) if web else max_tokens
+    escolhidos: List[Dict[str, Any]] = []
+    blocos: List[Dict[str, Any]] = []
+    for i in ordem:
+        tentativa = mesclar_adjacentes(escolhidos + [documentos[i]])
+        if sum(contar_tokens(bloco['conteudo']) for bloco in tentativa) <= orcamento_documentos:
+            escolhidos.append(documentos[i])
+            blocos = tentativa
+
+    restante = max_tokens - sum(contar_tokens(bloco['conteudo']) for bloco in blocos)
+    for resultado in web:
+        tokens = contar_tokens(_texto_contexto(resultado))
+        if tokens <= restante:
+            blocos.append(resultado)
+            restante -= tokens
+
+    tokens_originais = sum(contar_tokens(_texto_contexto(contexto)) for contexto in contextos)
+    tokens_finais = sum(contar_tokens(_texto_contexto(contexto)) for contexto in blocos)
+    incrementar('contexto_tokens_total', tokens_finais)
+    incrementar('contexto_tokens_removidos_total', tokens_originais - tokens_finais)
+    return blocos
@@ -1,5 +1,10 @@
 import psycopg2
-import os 
+from psycopg2 import pool
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
 
 DB_CONFIGS = {
     'dbname':os.getenv('DB_NAME', 'rag_db'),
@@ -9,14 +14,95 @@ DB_CONFIGS = {
     'port':'5432'
 }
 
+# Tamanho do pool de conexões compartilhado pelas threads (Streamlit, ingestão, etc).
+POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+# Conexões paradas por mais tempo que isso (segundos) são testadas com 'SELECT 1' antes do uso.
+VERIFICAR_APOS = float(os.getenv('DB_POOL_VERIFICAR_APOS', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+# O ThreadedConnectionPool lança erro quando esgotado, o semáforo faz as threads esperarem uma conexão livre.
+_semaforo = threading.BoundedSemaphore(POOL_MAX)
+_ultimo_uso = {}
+
 def get_conn():
+    """
+    Abre uma conexão avulsa (fora do pool) com o banco de dados.
+
+    Returns:
+        psycopg2.extensions.connection: Conexão aberta.
+    Raises:
+        Exception: Caso não seja possível conectar.
+    """
     try:
         conn = psycopg2.connect(**DB_CONFIGS)
     except Exception as e:
         print(f"Houve um erro ao conectar no banco de dados: {e}")
+        raise
     return conn
 
+def get_pool() -> pool.ThreadedConnectionPool:
+    """
+    Retorna o pool de conexões do processo, criando-o no primeiro uso.
+    Assim importar os módulos não abre conexões nem trava caso o banco esteja lento/fora do ar.
 
-if __name__ == '__main__':
-   print("Faz coisa.") 
+    Returns:
+        pool.ThreadedConnectionPool: Pool thread-safe de conexões.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_CONFIGS)
+    return _pool
+
+def _conexao_saudavel(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _ultimo_uso.get(id(conn), 0) < VERIFICAR_APOS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except Exception:
+        return False
 
+@contextmanager
+def conexao() -> Iterator[psycopg2.extensions.connection]:
+    """
+    Empresta uma conexão do pool durante o bloco `with`, cada requisição/thread usa a sua.
+    Conexões quebradas são descartadas e substituídas antes de serem entregues.
+    O commit é responsabilidade de quem usa, transações não finalizadas são desfeitas na devolução.
+
+    Exemplo:
+        with conexao() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    Yields:
+        psycopg2.extensions.connection: Conexão exclusiva durante o bloco.
+    """
+    pool_conexoes = get_pool()
+    _semaforo.acquire()
+    conn = None
+    try:
+        conn = pool_conexoes.getconn()
+        if not _conexao_saudavel(conn):
+            pool_conexoes.putconn(conn, close=True)
+            conn = pool_conexoes.getconn()
+        yield conn
+    except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            _ultimo_uso[id(conn)] = time.monotonic()
+            pool_conexoes.putconn(conn, close=bool(conn.closed))
+        _semaforo.release()
+
+
+if __name__ == '__main__':
+   print("Faz coisa.")
@@ -0,0 +1,363 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+# Provedor de embeddings usado na ingestão e nas queries: 'bedrock' (Titan v2, padrão), 'local'
+# (modelo do Hugging Face executado na CPU com torch) ou 'hash' (determinístico, para testes offline).
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'bedrock')
+# Modelo do provedor local, multilíngue para lidar com os documentos em português.
+EMBEDDING_LOCAL_MODELO = os.getenv('EMBEDDING_LOCAL_MODELO', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+# Textos por forward do modelo local.
+EMBEDDING_LOCAL_LOTE = int(os.getenv('EMBEDDING_LOCAL_LOTE', '32'))
+EMBEDDING_HASH_DIMENSAO = int(os.getenv('EMBEDDING_HASH_DIMENSAO', '1024'))
+
+# Quantidade de requisições simultâneas ao Bedrock durante a ingestão.
+MAX_WORKERS = int(os.getenv('EMBEDDING_MAX_WORKERS', '8'))
+# Limite de requisições por segundo, 0 deixa o limitador descobrir a taxa sozinho.
+TAXA_MAXIMA = float(os.getenv('EMBEDDING_TAXA_MAXIMA', '0'))
+# Tentativas por chunk antes de desistir quando a API pede para diminuir o ritmo.
+MAX_TENTATIVAS = int(os.getenv('EMBEDDING_MAX_TENTATIVAS', '6'))
+BACKOFF_BASE = 0.5 # segundos
+BACKOFF_MAXIMO = 20.0 # segundos
+
+# Trechos das mensagens de erro do Bedrock que indicam limite de taxa/indisponibilidade temporária.
+ERROS_DE_LIMITE = (
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'Rate exceeded',
+)
+
+
+class LimitadorAdaptativo:
+    """
+    Limitador de taxa compartilhado entre as threads do pool.
+
+    Segue a ideia de AIMD (aumento aditivo, redução multiplicativa): cada sucesso aumenta um pouco
+    a taxa permitida e cada erro de limite da API corta a taxa pela metade. Sem taxa inicial o limitador
+    não restringe nada até o primeiro erro de limite, quando passa a usar metade da taxa observada.
+    """
+
+    def __init__(self, taxa_inicial: Optional[float] = None, taxa_minima: float = 1.0):
+        self.taxa = taxa_inicial if taxa_inicial else None
+        self.taxa_minima = taxa_minima
+        self._lock = threading.Lock()
+        self._proximo_slot = time.monotonic()
+        self._inicio = time.monotonic()
+        self._requisicoes = 0
+
+    def aguardar(self) -> None:
+        """
+        Bloqueia a thread até que exista um slot livre dentro da taxa atual.
+        """
+        with self._lock:
+            self._requisicoes += 1
+            if self.taxa is None:
+                return
+            agora = time.monotonic()
+            espera = self._proximo_slot - agora
+            self._proximo_slot = max(agora, self._proximo_slot) + 1.0 / self.taxa
+        if espera > 0:
+            time.sleep(espera)
+
+    def sucesso(self) -> None:
+        with self._lock:
+            if self.taxa is not None:
+                self.taxa += 0.1
+
+    def limitado(self) -> None:
+        with self._lock:
+            if self.taxa is None:
+                decorrido = max(time.monotonic() - self._inicio, 1e-3)
+                self.taxa = self._requisicoes / decorrido
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+
+
+def hash_conteudo(texto: str, model_id: str = EMBEDDING_MODEL_ID) -> str:
+    """
+    Gera a chave do cache de embeddings: sha256 do id do modelo junto com o texto do chunk.
+    Incluir o modelo evita reaproveitar vetores de um modelo diferente.
+
+    Args:
+        texto (str): Conteúdo do chunk.
+        model_id (str): Modelo de embedding utilizado.
+    Returns:
+        str: Hash hexadecimal.
+    """
+    return hashlib.sha256(f"{model_id}\0{texto}".encode("utf-8")).hexdigest()
+
+
+def _eh_erro_de_limite(erro: Exception) -> bool:
+    mensagem = f"{type(erro).__name__} {erro}"
+    return any(trecho in mensagem for trecho in ERROS_DE_LIMITE)
+
+
+class ProvedorEmbeddings(ABC):
+    """
+    Interface dos provedores de embeddings. `model_id` identifica o modelo nas chaves do cache e nas linhas
+    do vector store, assim vetores de modelos diferentes nunca são comparados entre si.
+    """
+    model_id: str
+
+    @property
+    @abstractmethod
+    def dimensao(self) -> int:
+        """
+        Dimensão dos vetores gerados.
+        """
+
+    @abstractmethod
+    def embed_documentos(
+        self,
+        textos: List[str],
+        max_workers: int = MAX_WORKERS,
+        taxa_maxima: float = TAXA_MAXIMA,
+        estatisticas: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """
+        Gera os embeddings dos textos, na mesma ordem, como uma matriz float32 (n, dimensao).
+        """
+
+    def embed_query(self, texto: str) -> List[float]:
+        """
+        Gera o embedding de um único texto (query do usuário ou resposta do modelo).
+        """
+        return self.embed_documentos([texto], max_workers=1)[0].tolist()
+
+
+class ProvedorBedrock(ProvedorEmbeddings):
+    """
+    Amazon Titan v2 via Bedrock. O Titan não possui endpoint de lote, então o ganho vem de manter até
+    `max_workers` requisições em voo. Erros de limite da API são tratados com backoff exponencial com
+    jitter e redução da taxa compartilhada entre as threads.
+    """
+
+    def __init__(self, model_id: str = EMBEDDING_MODEL_ID, dimensao: int = 1024):
+        self.model_id = model_id
+        self._dimensao = dimensao
+        self._cliente = None
+
+    @property
+    def dimensao(self) -> int:
+        return self._dimensao
+
+    def _embeddings(self):
+        if self._cliente is None:
+            from langchain_aws import BedrockEmbeddings
+            from clientes_aws import get_cliente
+            self._cliente = BedrockEmbeddings(model_id=self.model_id, client=get_cliente('bedrock-runtime'))
+        return self._cliente
+
+    def embed_query(self, texto: str) -> List[float]:
+        return self._embeddings().embed_query(texto)
+
+    def embed_documentos(
+        self,
+        textos: List[str],
+        max_workers: int = MAX_WORKERS,
+        taxa_maxima: float = TAXA_MAXIMA,
+        estatisticas: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        embedding = self._embeddings()
+        limitador = LimitadorAdaptativo(taxa_maxima)
+        tentativas_extras = 0
+        lock_contador = threading.Lock()
+
+        def _embed(texto: str) -> List[float]:
+            nonlocal tentativas_extras
+            for tentativa in range(MAX_TENTATIVAS):
+                limitador.aguardar()
+                try:
+                    vetor = embedding.embed_query(texto)
+                    limitador.sucesso()
+                    return vetor
+                except Exception as e:
+                    if not _eh_erro_de_limite(e) or tentativa == MAX_TENTATIVAS - 1:
+                        raise
+                    limitador.limitado()
+                    with lock_contador:
+                        tentativas_extras += 1
+                    time.sleep(random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** tentativa)))
+
+        matriz = np.empty((len(textos), self.dimensao), dtype=np.float32)
+        # map preserva a ordem de entrada, então o i-ésimo embedding pertence ao i-ésimo chunk.
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for i, vetor in enumerate(executor.map(_embed, textos)):
+                matriz[i] = vetor
+        if estatisticas is not None:
+            estatisticas["tentativas_extras"] = tentativas_extras
+        return matriz
+
+
+class ProvedorLocal(ProvedorEmbeddings):
+    """
+    Modelo do Hugging Face (transformers + torch) executado no próprio processo, sem custo por chamada
+    nem ida à rede. Os textos são ordenados por tamanho e processados em lotes de `tamanho_lote`
+    (menos padding por lote), o embedding é a média dos tokens normalizada, como no sentence-transformers.
+    O modelo só é carregado no primeiro uso.
+    """
+
+    def __init__(self, modelo: str = EMBEDDING_LOCAL_MODELO, tamanho_lote: int = EMBEDDING_LOCAL_LOTE, max_tokens: int = 512):
+        self.model_id = modelo
+        self.tamanho_lote = tamanho_lote
+        self.max_tokens = max_tokens
+        self._tokenizer = None
+        self._modelo = None
+        self._lock = threading.Lock()
+
+    def _carregar(self):
+        with self._lock:
+            if self._modelo is None:
+                try:
+                    from transformers import AutoModel, AutoTokenizer
+                except ImportError as e:
+                    raise ImportError("EMBEDDING_PROVIDER=local requer o pacote 'transformers'.") from e
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+                self._modelo = AutoModel.from_pretrained(self.model_id).eval()
+        return self._tokenizer, self._modelo
+
+    @property
+    def dimensao(self) -> int:
+        return self._carregar()[1].config.hidden_size
+
+    def embed_documentos(
+        self,
+        textos: List[str],
+        max_workers: int = MAX_WORKERS,
+        taxa_maxima: float = TAXA_MAXIMA,
+        estatisticas: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        import torch
+
+        tokenizer, modelo = self._carregar()
+        matriz = np.empty((len(textos), self.dimensao), dtype=np.float32)
+        ordem = np.argsort([len(texto) for texto in textos], kind='stable')
+        with torch.inference_mode():
+            for inicio in range(0, len(textos), self.tamanho_lote):
+                indices = ordem[inicio:inicio + self.tamanho_lote]
+                entrada = tokenizer(
+                    [textos[i] for i in indices],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_tokens,
+                    return_tensors='pt'
+                )
+                tokens = modelo(**entrada).last_hidden_state
+                mascara = entrada['attention_mask'].unsqueeze(-1).to(tokens.dtype)
+                media = (tokens * mascara).sum(dim=1) / mascara.sum(dim=1).clamp(min=1e-9)
+                matriz[indices] = torch.nn.functional.normalize(media, dim=1).numpy()
+        return matriz
+
+
+class ProvedorHash(ProvedorEmbeddings):
+    """
+    Embedder determinístico por feature hashing: cada palavra soma +-1 em uma posição escolhida pelo seu
+    hash. Não entende semântica, mas textos com as mesmas palavras ficam próximos, o que basta para testes
+    e benchmarks offline sem credenciais da AWS nem download de modelos.
+    """
+
+    def __init__(self, dimensao: int = EMBEDDING_HASH_DIMENSAO):
+        self._dimensao = dimensao
+        self.model_id = f"hash-{dimensao}"
+
+    @property
+    def dimensao(self) -> int:
+        return self._dimensao
+
+    def embed_documentos(
+        self,
+        textos: List[str],
+        max_workers: int = MAX_WORKERS,
+        taxa_maxima: float = TAXA_MAXIMA,
+        estatisticas: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dimensao), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            for palavra in re.findall(r'\w+', texto.lower()):
+                # blake2b e não hash(): o hash do Python muda a cada processo.
+                valor = int.from_bytes(hashlib.blake2b(palavra.encode('utf-8'), digest_size=8).digest(), 'little')
+                matriz[i, valor % self.dimensao] += 1.0 if valor >> 63 else -1.0
+        matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
+        return matriz
+
+
+_provedor = None
+_provedor_lock = threading.Lock()
+
+def get_provedor_embeddings() -> ProvedorEmbeddings:
+    """
+    Retorna o provedor configurado em EMBEDDING_PROVIDER, criando-o no primeiro uso.
+
+    Returns:
+        ProvedorEmbeddings: ProvedorBedrock ('bedrock'), ProvedorLocal ('local') ou ProvedorHash ('hash').
+    Raises:
+        ValueError: Quando EMBEDDING_PROVIDER não é um provedor conhecido.
+    """
+    global _provedor
+    if _provedor is None:
+        with _provedor_lock:
+            if _provedor is None:
+                if EMBEDDING_PROVIDER == 'bedrock':
+                    _provedor = ProvedorBedrock()
+                elif EMBEDDING_PROVIDER == 'local':
+                    _provedor = ProvedorLocal()
+                elif EMBEDDING_PROVIDER == 'hash':
+                    _provedor = ProvedorHash()
+                else:
+                    raise ValueError(f"Provedor de embeddings {EMBEDDING_PROVIDER} não é suportado.")
+    return _provedor
+
+
+def gerar_embeddings(
+    textos: List[str],
+    max_workers: int = MAX_WORKERS,
+    taxa_maxima: float = TAXA_MAXIMA,
+    estatisticas: Optional[Dict[str, Any]] = None,
+    provedor: Optional[ProvedorEmbeddings] = None
+) -> np.ndarray:
+    """
+    Gera os embeddings de uma lista de textos com o provedor configurado (ver `get_provedor_embeddings`).
+
+    Args:
+        textos (List[str]): Textos a serem transformados em embeddings.
+        max_workers (int): Máximo de requisições simultâneas (Bedrock). Default: EMBEDDING_MAX_WORKERS ou 8.
+        taxa_maxima (float): Limite inicial de requisições por segundo, 0 para adaptativo (Bedrock).
+        estatisticas (Optional[Dict[str,Any]]): Dicionário para armazenar as métricas da execução
+            (chunks, segundos, chunks_por_segundo, tentativas_extras).
+        provedor (Optional[ProvedorEmbeddings]): Provedor a ser usado no lugar do configurado.
+    Returns:
+        np.ndarray: Matriz float32 (n, dimensao) com os embeddings na mesma ordem dos textos de entrada.
+    Raises:
+        Exception: Erros do provedor (no Bedrock, erros que não são de limite ou de limite após MAX_TENTATIVAS).
+    """
+    provedor = provedor or get_provedor_embeddings()
+    if not textos:
+        return np.zeros((0, provedor.dimensao), dtype=np.float32)
+
+    metricas = {}
+    inicio = time.perf_counter()
+    matriz = provedor.embed_documentos(textos, max_workers, taxa_maxima, metricas)
+    decorrido = time.perf_counter() - inicio
+
+    tentativas_extras = metricas.get("tentativas_extras", 0)
+    chunks_por_segundo = len(textos) / decorrido if decorrido > 0 else float('inf')
+    print(f"{len(textos)} embeddings gerados em {decorrido:.2f}s ({chunks_por_segundo:.1f} chunks/s, {tentativas_extras} retentativas).")
+    if estatisticas is not None:
+        estatisticas.update({
+            "chunks": len(textos),
+            "segundos": decorrido,
+            "chunks_por_segundo": chunks_por_segundo,
+            "tentativas_extras": tentativas_extras,
+        })
+    return matriz
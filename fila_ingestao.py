@@ -0,0 +1,299 @@
+import argparse
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from db_utils import conexao
+from embeddings import get_provedor_embeddings
+from manifesto import atualizar_manifesto, hash_arquivo, registrar_arquivo
+from metricas import incrementar
+from pre_processamento import processar_item_unico
+
+# Threads de ingestão iniciadas pela interface, 0 para processar a fila apenas com `python fila_ingestao.py`.
+INGESTAO_WORKERS = int(os.getenv('INGESTAO_WORKERS', '1'))
+# Tentativas automáticas de um job antes de ficar com status 'erro' (reprocessável pela interface).
+INGESTAO_JOBS_TENTATIVAS = int(os.getenv('INGESTAO_JOBS_TENTATIVAS', '3'))
+# Intervalo (segundos) entre consultas à fila quando não há jobs pendentes.
+INGESTAO_JOBS_INTERVALO = float(os.getenv('INGESTAO_JOBS_INTERVALO', '2'))
+# Jobs 'processando' sem atualização por mais tempo que isso (segundos) são considerados abandonados
+# (worker encerrado no meio do arquivo) e voltam para a fila.
+INGESTAO_JOBS_TIMEOUT = float(os.getenv('INGESTAO_JOBS_TIMEOUT', '600'))
+
+COLUNAS_JOB = ('id', 'path_origem', 'tipo', 'hash_arquivo', 'status', 'tentativas', 'chunks_processados', 'erro', 'criado_em', 'atualizado_em')
+
+
+def enfileirar(caminho_arquivo: str, tipo: str) -> int:
+    """
+    Adiciona um arquivo à fila de ingestão. O mesmo arquivo (caminho e conteúdo) já pendente ou em processamento
+    não gera um novo job, o id existente é retornado (ex: reruns do Streamlit). Jobs concluídos não são
+    reaproveitados: os chunks podem ter sido removidos desde então, e reprocessar um arquivo sem mudanças só
+    confirma as linhas existentes (embeddings vêm do cache e o upsert não reescreve chunks iguais).
+
+    Args:
+        caminho_arquivo (str): Caminho do arquivo salvo.
+        tipo (str): Tipo do arquivo (pdf ou txt).
+    Returns:
+        int: Id do job.
+    Raises:
+        ValueError: Quando não é um dos tipos de arquivos aceitos.
+    """
+    if tipo not in ('pdf', 'txt'):
+        raise ValueError(f"Tipo de arquivo {tipo} não é suportado.")
+    hash_conteudo = hash_arquivo(caminho_arquivo)
+    with conexao() as conn, conn.cursor() as cur:
+        # O índice único parcial (ver init.sql) impede dois jobs ativos para o mesmo arquivo, inclusive entre processos.
+        # Se o job ativo terminar entre o INSERT e o SELECT, o INSERT é tentado novamente.
+        linha = None
+        while linha is None:
+            cur.execute(
+                """
+                INSERT INTO ingestao_jobs (path_origem, tipo, hash_arquivo)
+                VALUES (%(path)s, %(tipo)s, %(hash)s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+                """,
+                {"path": caminho_arquivo, "tipo": tipo, "hash": hash_conteudo}
+            )
+            linha = cur.fetchone()
+            if linha is not None:
+                incrementar('jobs_ingestao_total', status='enfileirado')
+                break
+            cur.execute(
+                """
+                SELECT id FROM ingestao_jobs
+                WHERE hash_arquivo = %s AND path_origem = %s AND status IN ('pendente', 'processando')
+                ORDER BY id DESC
+                LIMIT 1
+                """,
+                (hash_conteudo, caminho_arquivo)
+            )
+            linha = cur.fetchone()
+            if linha is not None:
+                print(f"{caminho_arquivo} já está na fila (job {linha[0]}).")
+        conn.commit()
+    return linha[0]
+
+
+def consultar_jobs(ids: Optional[List[int]] = None, limite: int = 50) -> List[Dict[str, Any]]:
+    """
+    Estado dos jobs informados (ou dos mais recentes), para a interface acompanhar o progresso.
+
+    Args:
+        ids (Optional[List[int]]): Ids dos jobs, None para os `limite` mais recentes.
+        limite (int): Máximo de jobs retornados.
+    Returns:
+        List[Dict[str,Any]]: Jobs do mais recente para o mais antigo, com as colunas de COLUNAS_JOB.
+    """
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {', '.join(COLUNAS_JOB)}
+            FROM ingestao_jobs
+            WHERE %(ids)s::int[] IS NULL OR id = ANY(%(ids)s::int[])
+            ORDER BY id DESC
+            LIMIT %(limite)s
+            """,
+            {"ids": ids, "limite": limite}
+        )
+        return [dict(zip(COLUNAS_JOB, linha)) for linha in cur.fetchall()]
+
+
+def reprocessar_job(id_job: int) -> bool:
+    """
+    Coloca novamente na fila um job com erro, zerando as tentativas. O checkpoint da ingestão faz
+    o arquivo continuar a partir do último lote gravado.
+
+    Args:
+        id_job (int): Id do job.
+    Returns:
+        bool: True se o job estava com erro e voltou para a fila.
+    """
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE ingestao_jobs
+            SET status = 'pendente', tentativas = 0, erro = NULL, disponivel_em = now(), atualizado_em = now()
+            WHERE id = %s AND status = 'erro'
+            """,
+            (id_job,)
+        )
+        conn.commit()
+        return cur.rowcount == 1
+
+
+def recuperar_jobs_abandonados(timeout: float = INGESTAO_JOBS_TIMEOUT) -> int:
+    """
+    Devolve para a fila os jobs 'processando' sem atualização há mais de `timeout` segundos.
+
+    Returns:
+        int: Quantidade de jobs recuperados.
+    """
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE ingestao_jobs
+            SET status = 'pendente', atualizado_em = now()
+            WHERE status = 'processando' AND atualizado_em < now() - make_interval(secs => %s)
+            """,
+            (timeout,)
+        )
+        conn.commit()
+        if cur.rowcount:
+            print(f"{cur.rowcount} job(s) abandonado(s) voltaram para a fila.")
+        return cur.rowcount
+
+
+def _reservar_job() -> Optional[Dict[str, Any]]:
+    """
+    Marca o job pendente mais antigo como 'processando'. SKIP LOCKED permite vários workers
+    (threads ou processos) consumindo a mesma fila sem pegar o mesmo job.
+    """
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE ingestao_jobs
+            SET status = 'processando', tentativas = tentativas + 1, atualizado_em = now()
+            WHERE id = (
+                SELECT id FROM ingestao_jobs
+                WHERE status = 'pendente' AND disponivel_em <= now()
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, path_origem, tipo, hash_arquivo, tentativas
+            """
+        )
+        linha = cur.fetchone()
+        conn.commit()
+    if linha is None:
+        return None
+    return dict(zip(('id', 'path_origem', 'tipo', 'hash_arquivo', 'tentativas'), linha))
+
+
+def _atualizar_job(id_job: int, **campos: Any) -> None:
+    atribuicoes = ', '.join(f"{coluna} = %({coluna})s" for coluna in campos)
+    with conexao() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"UPDATE ingestao_jobs SET {atribuicoes}, atualizado_em = now() WHERE id = %(id_job)s",
+            {**campos, "id_job": id_job}
+        )
+        conn.commit()
+
+
+def _registrar_no_manifesto(job: Dict[str, Any]) -> None:
+    """
+    Registra o arquivo do job no manifesto da ingestão. Os uploads ficam em data/pdfs e data/txts, os mesmos
+    diretórios sincronizados por `pre_processamento.py` (e --watch), que sem a entrada processariam o arquivo
+    novamente. Um arquivo alterado depois de enfileirado não é registrado, a sincronização processa a nova versão.
+    """
+    caminho = job['path_origem']
+    stat = os.stat(caminho)
+    if hash_arquivo(caminho) != job['hash_arquivo']:
+        return
+    entrada: Dict[str, Dict[str, object]] = {}
+    registrar_arquivo(entrada, caminho, stat, job['hash_arquivo'], get_provedor_embeddings().model_id)
+    atualizar_manifesto(caminho, entrada[caminho])
+
+
+def processar_job(job: Dict[str, Any]) -> None:
+    """
+    Executa a ingestão de um job reservado, registrando o progresso a cada lote. Em caso de erro o job
+    volta para a fila com espera exponencial, até INGESTAO_JOBS_TENTATIVAS tentativas.
+    """
+    print(f"Job {job['id']}: processando {job['path_origem']} (tentativa {job['tentativas']}).")
+    try:
+        total = processar_item_unico(
+            job['path_origem'],
+            job['tipo'],
+            hash_conteudo_arquivo=job['hash_arquivo'],
+            progresso=lambda chunks: _atualizar_job(job['id'], chunks_processados=chunks)
+        )
+    except Exception as e:
+        esgotado = job['tentativas'] >= INGESTAO_JOBS_TENTATIVAS
+        print(f"Job {job['id']}: erro ao processar {job['path_origem']}: {e}")
+        incrementar('jobs_ingestao_total', status='erro' if esgotado else 'retentativa')
+        with conexao() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE ingestao_jobs
+                SET status = %s, erro = %s, disponivel_em = now() + make_interval(secs => %s), atualizado_em = now()
+                WHERE id = %s
+                """,
+                ('erro' if esgotado else 'pendente', str(e), 5 * 2 ** job['tentativas'], job['id'])
+            )
+            conn.commit()
+        return
+    try:
+        _registrar_no_manifesto(job)
+    except OSError as e:
+        # Ex: arquivo apagado logo após a ingestão, a sincronização remove os chunks.
+        print(f"Job {job['id']}: não foi possível registrar {job['path_origem']} no manifesto: {e}")
+    _atualizar_job(job['id'], status='concluido', chunks_processados=total, erro=None)
+    incrementar('jobs_ingestao_total', status='concluido')
+    print(f"Job {job['id']}: {total} chunks processados.")
+
+
+def executar_worker(parar: threading.Event, intervalo: float = INGESTAO_JOBS_INTERVALO) -> None:
+    """
+    Consome a fila até `parar` ser sinalizado. Erros de conexão com o banco apenas adiam a próxima consulta.
+    """
+    # Feito aqui e não em `iniciar_workers` para não atrasar (ou travar, com o banco fora do ar) a inicialização.
+    try:
+        recuperar_jobs_abandonados()
+    except Exception as e:
+        print(f"Erro ao recuperar jobs abandonados: {e}")
+    while not parar.is_set():
+        try:
+            job = _reservar_job()
+        except Exception as e:
+            print(f"Erro ao consultar a fila de ingestão: {e}")
+            job = None
+        if job is None:
+            parar.wait(intervalo)
+            continue
+        try:
+            processar_job(job)
+        except Exception as e:
+            # Ex: banco fora do ar ao registrar o resultado, o job é recuperado por `recuperar_jobs_abandonados`.
+            print(f"Erro ao atualizar o job {job['id']}: {e}")
+
+
+_workers: List[threading.Thread] = []
+_parar_workers = threading.Event()
+_workers_lock = threading.Lock()
+
+def iniciar_workers(quantidade: int = INGESTAO_WORKERS) -> int:
+    """
+    Inicia as threads de ingestão do processo (daemon), apenas na primeira chamada: reruns do Streamlit
+    reutilizam as mesmas threads. Jobs abandonados por um processo anterior voltam para a fila (ver `executar_worker`).
+
+    Args:
+        quantidade (int): Quantidade de threads, 0 não inicia nenhuma.
+    Returns:
+        int: Quantidade de threads em execução.
+    """
+    with _workers_lock:
+        if quantidade > 0 and not _workers:
+            for i in range(quantidade):
+                worker = threading.Thread(target=executar_worker, args=(_parar_workers,), name=f"ingestao-{i}", daemon=True)
+                worker.start()
+                _workers.append(worker)
+        return len(_workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processa a fila de ingestão em um processo separado da interface.")
+    parser.add_argument('--workers', type=int, default=max(1, INGESTAO_WORKERS), help="Threads de ingestão.")
+    args = parser.parse_args()
+
+    iniciar_workers(args.workers)
+    print(f"{args.workers} worker(s) aguardando jobs, Ctrl+C para encerrar.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        _parar_workers.set()
+        print("Encerrando após os jobs em andamento.")
+        for worker in _workers:
+            worker.join()
@@ -6,11 +6,76 @@ CREATE TABLE IF NOT EXISTS docs (
   num_pagina INTEGER NULL,
   indice_chunk INTEGER,
   conteudo TEXT,
-  embedding VECTOR(1024), -- Bedrock embedding v2 possui 1024 dimensoes.
-  modtempo TIMESTAMPTZ
+  embedding VECTOR(1024), -- Bedrock embedding v2 possui 1024 dimensoes, modelos menores são completados com zeros.
+  modtempo TIMESTAMPTZ,
+  model_id TEXT NOT NULL DEFAULT 'amazon.titan-embed-text-v2:0', -- Modelo que gerou o embedding, as buscas filtram por ele.
+  dimensao INTEGER NOT NULL DEFAULT 1024 -- Dimensão real do embedding antes de completar a coluna.
 );
 
+-- NULLS NOT DISTINCT (PostgreSQL 15+): chunks de txt não possuem página, sem isso o ON CONFLICT
+-- nunca seria acionado para eles e cada novo upload duplicaria as linhas.
 ALTER TABLE docs ADD CONSTRAINT unique_chunk 
-UNIQUE (path_origem, num_pagina, indice_chunk);
+UNIQUE NULLS NOT DISTINCT (path_origem, num_pagina, indice_chunk);
 
 CREATE INDEX IF NOT EXISTS docs_embeddings_id ON docs USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS docs_model_id_id ON docs (model_id);
+
+-- Texto completo para a busca híbrida (MODO_BUSCA=hibrida), mantido automaticamente a partir do conteúdo.
+ALTER TABLE docs ADD COLUMN IF NOT EXISTS conteudo_tsv TSVECTOR
+GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(conteudo, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS docs_conteudo_tsv_id ON docs USING gin (conteudo_tsv);
+
+-- Cache de embeddings endereçado por conteúdo: sha256(model_id + texto do chunk).
+-- Evita gerar novamente embeddings de chunks que não mudaram entre uploads.
+-- Sem dimensão fixa (não há índice vetorial no cache), cada modelo guarda seus vetores no tamanho original.
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  hash_conteudo TEXT NOT NULL,
+  model_id TEXT NOT NULL,
+  embedding VECTOR,
+  criado_em TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (hash_conteudo, model_id)
+);
+
+-- Cache das pesquisas na web (fallback): consulta reescrita pela LLM e resultados do DuckDuckGo,
+-- por query normalizada (ver cache_web.py). Expira após WEB_CACHE_TTL e mantém no máximo
+-- WEB_CACHE_MAX_ITENS entradas, removendo as acessadas há mais tempo.
+CREATE TABLE IF NOT EXISTS web_cache (
+  query_normalizada TEXT PRIMARY KEY,
+  query_web TEXT NOT NULL,
+  resultados JSONB NOT NULL,
+  embedding VECTOR, -- Embedding da query, para reaproveitar pesquisas de queries parecidas.
+  model_id TEXT,
+  criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  ultimo_acesso TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS web_cache_ultimo_acesso_id ON web_cache (ultimo_acesso);
+
+-- Fila de ingestão da interface (ver fila_ingestao.py): um job por arquivo enviado, consumido pelos workers
+-- com FOR UPDATE SKIP LOCKED. O índice único parcial impede dois jobs ativos para o mesmo arquivo (caminho e conteúdo).
+CREATE TABLE IF NOT EXISTS ingestao_jobs (
+  id SERIAL PRIMARY KEY,
+  path_origem TEXT NOT NULL,
+  tipo TEXT NOT NULL,
+  hash_arquivo TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pendente', -- pendente, processando, concluido ou erro.
+  tentativas INTEGER NOT NULL DEFAULT 0,
+  chunks_processados INTEGER NOT NULL DEFAULT 0,
+  erro TEXT,
+  disponivel_em TIMESTAMPTZ NOT NULL DEFAULT now(), -- Espera antes de uma nova tentativa.
+  criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ingestao_jobs_arquivo_ativo_id ON ingestao_jobs (hash_arquivo, path_origem)
+WHERE status IN ('pendente', 'processando');
+CREATE INDEX IF NOT EXISTS ingestao_jobs_pendentes_id ON ingestao_jobs (id) WHERE status = 'pendente';
+
+-- Bancos criados antes do cache de embeddings: ver migrations/000_embedding_cache.sql (antes da 003).
+-- Índices quantizados opcionais (halfvec/binário) para bases grandes: ver migrations/001_embedding_quantizado.sql.
+-- Bancos criados antes das colunas model_id/dimensao: ver migrations/003_modelo_embedding.sql.
+-- Bancos criados antes do cache da web: ver migrations/004_cache_web.sql.
+-- Bancos criados antes da fila de ingestão: ver migrations/005_fila_ingestao.sql.
+-- Bancos criados com a constraint unique_chunk sem NULLS NOT DISTINCT (txts duplicados): ver migrations/006_chunk_unico_txt.sql.
+-- Bancos com a fila de ingestão deduplicada apenas pelo hash: ver migrations/007_fila_por_arquivo.sql.
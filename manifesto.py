@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Manifesto da ingestão: para cada arquivo já processado guarda tamanho, mtime e hash do conteúdo.
+MANIFESTO_PATH = os.getenv('MANIFESTO_PATH', 'data/manifesto_ingestao.json')
+# Checkpoint da ingestão em lotes: chunks já gravados de arquivos ainda não concluídos (mesmo formato de arquivo,
+# carregado/salvo com carregar_manifesto/salvar_manifesto).
+CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', 'data/checkpoint_ingestao.json')
+
+Manifesto = Dict[str, Dict[str, object]]
+
+# Serializa as leituras/escritas de `atualizar_manifesto` entre as threads do processo (ex: workers da fila).
+_lock_manifesto = threading.Lock()
+
+
+def hash_arquivo(caminho: str, tamanho_bloco: int = 1 << 20) -> str:
+    """
+    Calcula o sha256 do arquivo lendo em blocos, sem carregá-lo inteiro na memória.
+
+    Args:
+        caminho (str): Caminho do arquivo.
+        tamanho_bloco (int): Bytes lidos por vez.
+    Returns:
+        str: Hash hexadecimal.
+    """
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def carregar_manifesto(caminho: str = MANIFESTO_PATH) -> Manifesto:
+    """
+    Carrega o manifesto salvo, retornando um manifesto vazio se ele ainda não existe.
+    """
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(manifesto: Manifesto, caminho: str = MANIFESTO_PATH) -> None:
+    """
+    Salva o manifesto de forma atômica (arquivo temporário + rename), uma queda no meio da escrita
+    não corrompe o manifesto anterior.
+    """
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    # Temporário por processo/thread, escritas simultâneas não gravam no mesmo arquivo.
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def atualizar_manifesto(chave: str, valor: Optional[Dict[str, object]], caminho: str = MANIFESTO_PATH) -> None:
+    """
+    Atualiza (ou remove, com valor None) uma única entrada, relendo o arquivo antes de salvar para não
+    descartar entradas gravadas por outras threads desde a última leitura.
+
+    Args:
+        chave (str): Caminho do arquivo de dados.
+        valor (Optional[Dict[str,object]]): Nova entrada, None remove a entrada.
+        caminho (str): Arquivo do manifesto/checkpoint.
+    """
+    with _lock_manifesto:
+        manifesto = carregar_manifesto(caminho)
+        if valor is None:
+            if manifesto.pop(chave, None) is None:
+                return
+        else:
+            manifesto[chave] = valor
+        salvar_manifesto(manifesto, caminho)
+
+
+def escanear_diretorio(diretorio: str, tipo_arquivo: str) -> Dict[str, os.stat_result]:
+    """
+    Lista recursivamente os arquivos do tipo informado, no mesmo formato de caminho usado como
+    'path_origem' pelos loaders (ex: data/pdfs/arquivo.pdf).
+
+    Args:
+        diretorio (str): Diretório a ser escaneado.
+        tipo_arquivo (str): Extensão dos arquivos (pdf ou txt).
+    Returns:
+        Dict[str, os.stat_result]: Caminho -> stat do arquivo.
+    """
+    arquivos = {}
+    if not os.path.isdir(diretorio):
+        return arquivos
+    for raiz, _, nomes in os.walk(diretorio):
+        for nome in nomes:
+            if nome.lower().endswith(f'.{tipo_arquivo}'):
+                caminho = os.path.join(raiz, nome)
+                arquivos[caminho] = os.stat(caminho)
+    return arquivos
+
+
+def calcular_diferencas(
+    manifesto: Manifesto,
+    arquivos: Dict[str, os.stat_result],
+    model_id: Optional[str] = None
+) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """
+    Compara os arquivos atuais com o manifesto. O hash só é calculado quando tamanho ou mtime mudaram,
+    então uma execução sem mudanças apenas faz stat dos arquivos.
+
+    Args:
+        manifesto (Manifesto): Manifesto da última execução.
+        arquivos (Dict[str, os.stat_result]): Resultado de `escanear_diretorio`.
+        model_id (Optional[str]): Modelo de embedding atual, arquivos registrados com outro modelo são
+            considerados alterados (entradas sem modelo, de versões anteriores, são aceitas).
+    Returns:
+        Tuple[List[str], List[str], Dict[str,str]]: Arquivos novos/alterados, arquivos removidos
+            e os hashes calculados (caminho -> hash) para atualizar o manifesto.
+    """
+    alterados = []
+    hashes = {}
+    for caminho, stat in sorted(arquivos.items()):
+        entrada = manifesto.get(caminho)
+        if entrada and model_id and entrada.get('model_id', model_id) != model_id:
+            entrada = None
+        if entrada and entrada['tamanho'] == stat.st_size and entrada['mtime'] == stat.st_mtime:
+            continue
+        hashes[caminho] = hash_arquivo(caminho)
+        # mtime mudou mas o conteúdo não (ex: touch, cópia), basta atualizar o manifesto.
+        if entrada and entrada['hash'] == hashes[caminho]:
+            entrada['mtime'] = stat.st_mtime
+            continue
+        alterados.append(caminho)
+    removidos = sorted(set(manifesto) - set(arquivos))
+    return alterados, removidos, hashes
+
+
+def registrar_arquivo(
+    manifesto: Manifesto,
+    caminho: str,
+    stat: os.stat_result,
+    hash_conteudo: str,
+    model_id: Optional[str] = None
+) -> None:
+    """
+    Registra no manifesto um arquivo processado com sucesso.
+    """
+    manifesto[caminho] = {
+        'tamanho': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': hash_conteudo,
+        'model_id': model_id,
+    }
@@ -0,0 +1,248 @@
+from __future__ import annotations # Anotação com ThreadingHTTPServer não importa o http.server.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Prefixo dos nomes exportados no formato do Prometheus.
+PREFIXO_METRICAS = 'rag'
+# Limites (segundos) dos buckets dos histogramas de duração.
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Porta do endpoint /metrics, 0 desativa (ver `iniciar_servidor_metricas`).
+METRICAS_PORTA = int(os.getenv('METRICAS_PORTA', '0'))
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _rotulos(rotulos: Dict[str, Any]) -> Rotulos:
+    return tuple(sorted((chave, str(valor)) for chave, valor in rotulos.items()))
+
+
+class Histograma:
+    """
+    Histograma cumulativo no modelo do Prometheus: contagem por bucket, soma e total de observações.
+    """
+    __slots__ = ('limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites: Tuple[float, ...] = BUCKETS_PADRAO):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1) # Último bucket é o +Inf.
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def percentil(self, p: float) -> Optional[float]:
+        """
+        Estimativa do percentil pelo limite superior do bucket (mesma aproximação do histogram_quantile).
+        """
+        if self.total == 0:
+            return None
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for limite, contagem in zip(self.limites + (float('inf'),), self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return limite
+        return float('inf')
+
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas do processo, compartilhados entre threads (pool de embeddings, Streamlit).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[Rotulos, float]] = {}
+        self._histogramas: Dict[str, Dict[Rotulos, Histograma]] = {}
+
+    def incrementar(self, nome: str, valor: float = 1, **rotulos: Any) -> None:
+        chave = _rotulos(rotulos)
+        with self._lock:
+            serie = self._contadores.setdefault(nome, {})
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def observar(self, nome: str, valor: float, **rotulos: Any) -> None:
+        chave = _rotulos(rotulos)
+        with self._lock:
+            serie = self._histogramas.setdefault(nome, {})
+            if chave not in serie:
+                serie[chave] = Histograma()
+            serie[chave].observar(valor)
+
+    def contador(self, nome: str, **rotulos: Any) -> float:
+        """
+        Valor de um contador, somando todas as séries que possuem os rótulos informados.
+        """
+        filtro = set(_rotulos(rotulos))
+        with self._lock:
+            return sum(valor for chave, valor in self._contadores.get(nome, {}).items() if filtro <= set(chave))
+
+    def exportar_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "contadores": {
+                    nome: [{"rotulos": dict(chave), "valor": valor} for chave, valor in serie.items()]
+                    for nome, serie in self._contadores.items()
+                },
+                "histogramas": {
+                    nome: [
+                        {
+                            "rotulos": dict(chave),
+                            "total": h.total,
+                            "soma": h.soma,
+                            "p50": h.percentil(50),
+                            "p95": h.percentil(95),
+                            "p99": h.percentil(99),
+                        }
+                        for chave, h in serie.items()
+                    ]
+                    for nome, serie in self._histogramas.items()
+                },
+            }
+
+    def exportar_prometheus(self) -> str:
+        linhas = []
+
+        def formatar(rotulos: Rotulos) -> str:
+            if not rotulos:
+                return ''
+            valores = ','.join(f'{chave}="{valor}"' for chave, valor in rotulos)
+            return '{' + valores + '}'
+
+        with self._lock:
+            for nome, serie in sorted(self._contadores.items()):
+                nome_completo = f'{PREFIXO_METRICAS}_{nome}'
+                linhas.append(f'# TYPE {nome_completo} counter')
+                for chave, valor in sorted(serie.items()):
+                    linhas.append(f'{nome_completo}{formatar(chave)} {valor}')
+            for nome, serie in sorted(self._histogramas.items()):
+                nome_completo = f'{PREFIXO_METRICAS}_{nome}'
+                linhas.append(f'# TYPE {nome_completo} histogram')
+                for chave, h in sorted(serie.items()):
+                    acumulado = 0
+                    for limite, contagem in zip(h.limites + (float('inf'),), h.contagens):
+                        acumulado += contagem
+                        le = '+Inf' if limite == float('inf') else repr(limite)
+                        linhas.append(f'{nome_completo}_bucket{formatar(chave + (("le", le),))} {acumulado}')
+                    linhas.append(f'{nome_completo}_sum{formatar(chave)} {h.soma}')
+                    linhas.append(f'{nome_completo}_count{formatar(chave)} {h.total}')
+        return '\n'.join(linhas) + '\n'
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+
+registro = RegistroMetricas()
+
+
+class Rastro:
+    """
+    Etapas de uma única execução (ex: uma query), para exibir a divisão do tempo (ver `span`).
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas: List[Dict[str, Any]] = []
+
+    def resumo(self) -> Dict[str, float]:
+        """
+        Segundos totais por etapa, na ordem em que cada etapa apareceu pela primeira vez.
+        """
+        totais: Dict[str, float] = {}
+        for etapa in self.etapas:
+            totais[etapa['etapa']] = totais.get(etapa['etapa'], 0.0) + etapa['duracao']
+        return totais
+
+
+@contextmanager
+def span(etapa: str, pipeline: str = 'query', rastro: Optional[Rastro] = None) -> Iterator[None]:
+    """
+    Mede a duração de uma etapa: registra no histograma 'etapa_duracao_segundos' (rótulos pipeline/etapa),
+    conta erros em 'etapa_erros_total' e, se informado, adiciona a etapa ao rastro da execução.
+
+    Args:
+        etapa (str): Nome da etapa (ex: embedding, pesquisa, geracao).
+        pipeline (str): 'query' ou 'ingestao'.
+        rastro (Optional[Rastro]): Rastro da execução atual.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception: # GeneratorExit (stream abandonado) não é erro da etapa.
+        registro.incrementar('etapa_erros_total', pipeline=pipeline, etapa=etapa)
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        registro.observar('etapa_duracao_segundos', duracao, pipeline=pipeline, etapa=etapa)
+        if rastro is not None:
+            rastro.etapas.append({'etapa': etapa, 'inicio': inicio - rastro.inicio, 'duracao': duracao})
+
+
+def incrementar(nome: str, valor: float = 1, **rotulos: Any) -> None:
+    registro.incrementar(nome, valor, **rotulos)
+
+
+def observar(nome: str, valor: float, **rotulos: Any) -> None:
+    registro.observar(nome, valor, **rotulos)
+
+
+def exportar_prometheus() -> str:
+    return registro.exportar_prometheus()
+
+
+def exportar_json() -> Dict[str, Any]:
+    return registro.exportar_json()
+
+
+_servidor = None
+_servidor_lock = threading.Lock()
+
+def iniciar_servidor_metricas(porta: int = METRICAS_PORTA) -> Optional[ThreadingHTTPServer]:
+    """
+    Expõe as métricas em http://0.0.0.0:porta/metrics (formato do Prometheus) e /metrics.json,
+    em uma thread daemon. Chamadas repetidas (ex: reruns do Streamlit) reutilizam o mesmo servidor.
+
+    Args:
+        porta (int): Porta do servidor, 0 não inicia nada.
+    Returns:
+        Optional[ThreadingHTTPServer]: Servidor iniciado, ou None se desativado.
+    """
+    global _servidor
+    if not porta:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    with _servidor_lock:
+        if _servidor is None:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path == '/metrics':
+                        corpo, tipo = exportar_prometheus().encode(), 'text/plain; version=0.0.4'
+                    elif self.path == '/metrics.json':
+                        corpo, tipo = json.dumps(exportar_json()).encode(), 'application/json'
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', tipo)
+                    self.send_header('Content-Length', str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+
+                def log_message(self, *args):
+                    pass
+
+            _servidor = ThreadingHTTPServer(('0.0.0.0', porta), Handler)
+            threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+    return _servidor
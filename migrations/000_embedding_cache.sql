@@ -0,0 +1,12 @@
+-- Cache de embeddings endereçado por conteúdo (ver pre_processamento.preencher_embeddings).
+-- Aplicar em um banco existente antes das demais migrations (003 altera esta tabela) com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/000_embedding_cache.sql
+-- Bancos novos já recebem a tabela pelo init.sql.
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  hash_conteudo TEXT NOT NULL,
+  model_id TEXT NOT NULL,
+  embedding VECTOR,
+  criado_em TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (hash_conteudo, model_id)
+);
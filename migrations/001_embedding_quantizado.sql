@@ -0,0 +1,18 @@
+-- Índices quantizados para a geração de candidatos (PGVECTOR_QUANTIZACAO=halfvec ou binario).
+-- Requer pgvector 0.7+. Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/001_embedding_quantizado.sql
+--
+-- Os índices são de expressão sobre a coluna 'embedding', então nenhuma coluna extra precisa ser
+-- mantida pela ingestão e o vetor de precisão total continua disponível para o rescoring.
+
+-- halfvec: float16, metade da memória do índice de precisão total.
+CREATE INDEX IF NOT EXISTS docs_embeddings_half_id
+ON docs USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops);
+
+-- Binário: 1 bit por dimensão (32x menor), depende do rescoring para manter o recall.
+CREATE INDEX IF NOT EXISTS docs_embeddings_bin_id
+ON docs USING hnsw ((binary_quantize(embedding)::bit(1024)) bit_hamming_ops);
+
+-- Após validar o recall com `python -m benchmarks.quantizacao`, o índice de precisão total
+-- pode ser removido para liberar memória (o modo 'nenhuma' passa a fazer busca sequencial):
+-- DROP INDEX IF EXISTS docs_embeddings_id;
@@ -0,0 +1,9 @@
+-- Busca híbrida (MODO_BUSCA=hibrida): coluna tsvector mantida pelo próprio PostgreSQL e índice GIN.
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/002_busca_hibrida.sql
+-- Bancos novos já recebem a coluna e o índice pelo init.sql.
+
+ALTER TABLE docs ADD COLUMN IF NOT EXISTS conteudo_tsv TSVECTOR
+GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(conteudo, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS docs_conteudo_tsv_id ON docs USING gin (conteudo_tsv);
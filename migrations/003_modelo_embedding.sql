@@ -0,0 +1,17 @@
+-- Modelo e dimensão do embedding por linha (EMBEDDING_PROVIDER), as buscas consideram apenas o modelo configurado.
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/003_modelo_embedding.sql
+-- Bancos novos já recebem as colunas pelo init.sql. As linhas existentes foram geradas pelo Titan v2,
+-- que é o valor padrão das novas colunas.
+
+ALTER TABLE docs ADD COLUMN IF NOT EXISTS model_id TEXT NOT NULL DEFAULT 'amazon.titan-embed-text-v2:0';
+ALTER TABLE docs ADD COLUMN IF NOT EXISTS dimensao INTEGER NOT NULL DEFAULT 1024;
+CREATE INDEX IF NOT EXISTS docs_model_id_id ON docs (model_id);
+
+-- O cache passa a aceitar vetores de qualquer dimensão (ex: 384 do provedor local).
+ALTER TABLE embedding_cache ALTER COLUMN embedding TYPE VECTOR;
+
+-- Com mais de um modelo na mesma tabela, o filtro por model_id é aplicado depois do HNSW e pode
+-- retornar menos que top_k linhas. Um índice parcial por modelo mantém a busca eficiente, ex:
+-- CREATE INDEX docs_embeddings_titan_id ON docs USING hnsw (embedding vector_cosine_ops)
+-- WHERE model_id = 'amazon.titan-embed-text-v2:0';
@@ -0,0 +1,16 @@
+-- Cache das pesquisas na web usadas no fallback (ver cache_web.py).
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/004_cache_web.sql
+-- Bancos novos já recebem a tabela pelo init.sql.
+
+CREATE TABLE IF NOT EXISTS web_cache (
+  query_normalizada TEXT PRIMARY KEY,
+  query_web TEXT NOT NULL,
+  resultados JSONB NOT NULL,
+  embedding VECTOR,
+  model_id TEXT,
+  criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  ultimo_acesso TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS web_cache_ultimo_acesso_id ON web_cache (ultimo_acesso);
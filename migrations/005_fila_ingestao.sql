@@ -0,0 +1,22 @@
+-- Fila de ingestão usada pela interface (ver fila_ingestao.py).
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/005_fila_ingestao.sql
+-- Bancos novos já recebem a tabela pelo init.sql.
+
+CREATE TABLE IF NOT EXISTS ingestao_jobs (
+  id SERIAL PRIMARY KEY,
+  path_origem TEXT NOT NULL,
+  tipo TEXT NOT NULL,
+  hash_arquivo TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pendente',
+  tentativas INTEGER NOT NULL DEFAULT 0,
+  chunks_processados INTEGER NOT NULL DEFAULT 0,
+  erro TEXT,
+  disponivel_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ingestao_jobs_ativos_id ON ingestao_jobs (hash_arquivo)
+WHERE status IN ('pendente', 'processando');
+CREATE INDEX IF NOT EXISTS ingestao_jobs_pendentes_id ON ingestao_jobs (id) WHERE status = 'pendente';
@@ -0,0 +1,25 @@
+-- Chave única dos chunks com NULLS NOT DISTINCT (PostgreSQL 15+): chunks de txt não possuem página, com a
+-- constraint original o ON CONFLICT nunca era acionado para eles e cada nova ingestão duplicava as linhas.
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/006_chunk_unico_txt.sql
+-- Bancos novos já recebem a constraint pelo init.sql.
+
+BEGIN;
+
+-- Mantém apenas a linha mais recente (maior id) de cada chunk, as anteriores são de ingestões antigas.
+-- PARTITION BY agrupa valores NULL, como a nova constraint.
+DELETE FROM docs
+WHERE id IN (
+  SELECT id
+  FROM (
+    SELECT id, row_number() OVER (PARTITION BY path_origem, num_pagina, indice_chunk ORDER BY id DESC) AS ordem
+    FROM docs
+  ) linhas
+  WHERE ordem > 1
+);
+
+ALTER TABLE docs DROP CONSTRAINT IF EXISTS unique_chunk;
+ALTER TABLE docs ADD CONSTRAINT unique_chunk
+UNIQUE NULLS NOT DISTINCT (path_origem, num_pagina, indice_chunk);
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Fila de ingestão deduplicada por arquivo (caminho e conteúdo) e apenas entre jobs ativos: o mesmo conteúdo
+-- salvo em outro caminho, ou enviado de novo depois de concluído, gera um novo job (ver fila_ingestao.enfileirar).
+-- Aplicar em um banco existente com:
+--   docker compose exec -T db psql -U postgres -d rag_db < migrations/007_fila_por_arquivo.sql
+-- Bancos novos já recebem o índice pelo init.sql.
+
+DROP INDEX IF EXISTS ingestao_jobs_ativos_id;
+CREATE UNIQUE INDEX IF NOT EXISTS ingestao_jobs_arquivo_ativo_id ON ingestao_jobs (hash_arquivo, path_origem)
+WHERE status IN ('pendente', 'processando');
@@ -1,21 +1,47 @@
-from typing import Optional, Dict, Any, List
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader 
+from __future__ import annotations # Anotações com Document não importam o langchain.
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema.document import Document # Type annotation
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Callable, Iterable, Iterator, Tuple, Union
 import os 
-import psycopg2 
-from langchain_aws import BedrockEmbeddings
-
-from db_utils import get_conn 
+import time
+import argparse
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+import numpy as np
+from psycopg2.extras import execute_values
+
+from chunk_batch import ChunkBatch
+from chunker import dividir_documentos
+from db_utils import conexao
+from vector_store import get_vector_store
+from embeddings import gerar_embeddings, get_provedor_embeddings, hash_conteudo, MAX_WORKERS
+from metricas import span, incrementar
+from manifesto import (
+    CHECKPOINT_PATH,
+    hash_arquivo,
+    carregar_manifesto,
+    atualizar_manifesto,
+    escanear_diretorio,
+    calcular_diferencas,
+    registrar_arquivo,
+)
+
+# Loaders e splitter do langchain são importados no primeiro uso, importar o módulo (CLI, interface,
+# fila de ingestão) não carrega o langchain.
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
 
 PDFS_PATH = 'data/pdfs'
 TXTS_PATH = 'data/txts'
+# Diretórios monitorados pelo main e o tipo de arquivo de cada um.
+DIRETORIOS_DADOS = {PDFS_PATH: 'pdf', TXTS_PATH: 'txt'}
+# Processos usados para carregar e dividir os arquivos em chunks (etapa que usa CPU, principalmente o PyPDFLoader).
+PROCESSOS_PARSE = int(os.getenv('INGESTAO_PROCESSOS', str(os.cpu_count() or 1)))
+# Chunks por lote de embeddings/escrita no banco, limita a memória usada pela ingestão de arquivos grandes.
+TAMANHO_LOTE_INGESTAO = int(os.getenv('INGESTAO_TAMANHO_LOTE', '256'))
+# Arquivos modificados há menos tempo que isso (segundos) podem ainda estar sendo copiados, ficam para a próxima varredura.
+TEMPO_MINIMO_ESTAVEL = 2.0
 
 
-conn = get_conn()
-cur = conn.cursor()
-
 def carregar_documentos(diretorio: str, loader_cls: Any, tipo_arquivo: str) -> list[Document]:
     """
     Carrega os documentos presentes do diretório /data/pdfs ou /data/txts por exemplo.
@@ -30,6 +56,8 @@ def carregar_documentos(diretorio: str, loader_cls: Any, tipo_arquivo: str) -> l
     # TODO: Criar utils para checagem da existencia de DATA_PATH
     # e conteudos
     #
+    from langchain_community.document_loaders import DirectoryLoader
+
     loader = DirectoryLoader(
             diretorio, 
             glob=f"**/*.{tipo_arquivo}",
@@ -39,7 +67,9 @@ def carregar_documentos(diretorio: str, loader_cls: Any, tipo_arquivo: str) -> l
 
 def chunk_document(documentos: list[Document]) -> list[Document]:
     """
-    Utiliza RecursiveCharacterTextSplitter para criar chunks de cada documento presente na lista input.
+    Divide cada documento presente na lista input em chunks com o chunker configurado em CHUNKER
+    ('langchain' para o RecursiveCharacterTextSplitter, ou 'nativo', ver `chunker.offsets_chunks`),
+    com CHUNK_TAMANHO/CHUNK_SOBREPOSICAO (padrão 1300/400 caracteres).
 
     Args:
         documentos (list[Document]): Lista com objetos do tipo Document.
@@ -47,17 +77,9 @@ def chunk_document(documentos: list[Document]) -> list[Document]:
     Returns:
         list[Document]: Lista com objetos do tipo Document com respectivos chunks.
     """
-    # https://python.langchain.com/docs/how_to/recursive_text_splitter/
-
-    splitter_texto = RecursiveCharacterTextSplitter(
-        chunk_size = 1300,
-        chunk_overlap = 400,
-        length_function = len,
-        is_separator_regex = False,
-    )
-    return splitter_texto.split_documents(documentos)
+    return list(dividir_documentos(documentos))
 
-def armazenar_db(chunks_tratados: List[Dict[str,Any]]) -> None:
+def armazenar_db(chunks_tratados: Union[ChunkBatch, List[Dict[str,Any]]], usar_copy: bool = True, remover_orfaos: bool = True) -> None:
     """
     Função de extrema importância, uma vez que deve detectar mudanças nos pdfs/textos e tratá-las.
     Exemplos: O pdf é o mesmo, mas houve uma mudança em uma seção dele;
@@ -66,64 +88,77 @@ def armazenar_db(chunks_tratados: List[Dict[str,Any]]) -> None:
     O statement SQL abaixo utiliza mecanismos do PostgreSQL para verificar estes casos, a fim de 
     lidar com o maior número possível de casos.
     
-    A medida pensada foi de excluir primeiro e depois inserir/atualizar, primeiro se exclui da tabela (check_db_orfaos) o conteudo que
+    A medida pensada foi de excluir primeiro e depois inserir/atualizar, primeiro se exclui da tabela (remover_orfaos) o conteudo que
     foi excluido do texto/pdf depois se realiza um checking de atualizações no conteúdo ou novos conteúdos.
 
-    # TODO: implementar forma de criar os embeddings apenas quando necessário, assim 
-    # as funções processar_chunks_* não precisarão de processar os embeddings.
+    Os embeddings de conteúdos já vistos vêm do cache (ver `preencher_embeddings`), então
+    re-enviar um arquivo só gera embeddings para os chunks que realmente mudaram.
 
-    Args:
-        chunks_tratados: Lista com dicionários representando cada chunk e suas informações.
-    """
+    No modo em lote (padrão) todos os chunks são enviados com um único COPY binário para uma tabela
+    temporária e então mesclados na tabela 'docs' com um único INSERT ... SELECT, ou seja, um número
+    constante de round trips independente da quantidade de chunks. A remoção de órfãos roda na mesma
+    transação, comparando 'docs' com a tabela temporária em um único DELETE.
 
-    try:
-        for chunk in chunks_tratados:
+    Com VECTOR_STORE=local os chunks vão para o índice local (ver `vector_store.LocalVectorStore`)
+    seguindo o mesmo critério de atualização.
 
-            cur.execute(
-                """ 
-                INSERT INTO docs (path_origem,num_pagina,indice_chunk,conteudo,embedding,modtempo)
-                VALUES (%s,%s,%s,%s,%s,%s)
-            
-                ON CONFLICT (path_origem, num_pagina, indice_chunk) DO UPDATE
-                SET 
-                    conteudo = EXCLUDED.conteudo, -- EXCLUDED é uma tabela com os valores que iriam entrar mas que foram barrados.
-                    embedding = EXCLUDED.embedding, 
-                    modtempo = EXCLUDED.modtempo 
-                WHERE
-                    docs.conteudo IS DISTINCT FROM EXCLUDED.conteudo AND 
-                    docs.embedding IS DISTINCT FROM EXCLUDED.embedding AND 
-                    docs.modtempo IS DISTINCT FROM EXCLUDED.modtempo
-                """,
-                (
-                    chunk['path_origem'],
-                    chunk['pag'],
-                    chunk['indice_chunk'],
-                    chunk['conteudo'],
-                    chunk['embedding'],
-                    chunk['modtempo']
-                )
-            )
-        conn.commit()
-    except Exception as e: 
-        conn.rollback()
-        print(f"Erro ao armazenar chunks no banco: {e}")
-        raise
+    Args:
+        chunks_tratados: `ChunkBatch` ou lista com dicionários representando cada chunk e suas informações.
+        usar_copy (bool): Se True usa COPY + upsert em lote, se False insere chunk a chunk (apenas pgvector).
+        remover_orfaos (bool): Se True remove, antes do upsert, os chunks dos mesmos arquivos que não existem mais.
+    """
+    # O SQL específico de cada backend fica em vector_store (PgVectorStore / LocalVectorStore).
+    with span('armazenar_db', pipeline='ingestao'):
+        get_vector_store().armazenar(chunks_tratados, usar_copy=usar_copy, remover_orfaos=remover_orfaos)
+
+def processar_chunks_pdf(
+    chunks: List[Document],
+    dados_chunk: List[Dict[str,Any]],
+    max_workers: int = MAX_WORKERS,
+    estatisticas: Optional[Dict[str,Any]] = None
+):
+    """
+    Utiliza a lista de documentos com chunks de pdfs para transformá-los em uma lista de dicionários
+    com informações específicas de cada documento(caminho de origem, conteudo, pag, etc.)
 
+    Args:
+        chunks (List[Document]): Lista de documentos com chunks.
+        dados_chunk (List[Dict[str,Any]]: Lista para armazenar os dados processados.
+        max_workers (int): Máximo de requisições simultâneas de embedding.
+        estatisticas (Optional[Dict[str,Any]]): Acumula os hits/misses do cache de embeddings.
+    """
+    novos_dados = list(iterar_dados_pdf(chunks))
+    preencher_embeddings(novos_dados, max_workers, estatisticas)
+    dados_chunk.extend(novos_dados)
 
-def processar_chunks_pdf(chunks: List[Document], dados_chunk: List[Dict[str,Any]]):
+def processar_chunks_txt(chunks, dados_chunk, max_workers: int = MAX_WORKERS, estatisticas: Optional[Dict[str,Any]] = None):
     """
-    Utiliza a lista de documentos com chunks de pdfs para transformá-los em uma lista de dicionários
+    Utiliza a lista de documentos com chunks de txts para transformá-los em uma lista de dicionários
     com informações específicas de cada documento(caminho de origem, conteudo, pag, etc.)
 
     Args:
         chunks (List[Document]): Lista de documentos com chunks.
         dados_chunk (List[Dict[str,Any]]: Lista para armazenar os dados processados.
+        max_workers (int): Máximo de requisições simultâneas de embedding.
+        estatisticas (Optional[Dict[str,Any]]): Acumula os hits/misses do cache de embeddings.
+    """
+
+    novos_dados = list(iterar_dados_txt(chunks))
+    preencher_embeddings(novos_dados, max_workers, estatisticas)
+    dados_chunk.extend(novos_dados)
+
+def iterar_dados_pdf(chunks: Iterable[Document]) -> Iterator[Dict[str,Any]]:
+    """
+    Gera o dicionário de cada chunk de pdf (sem embedding), numerando os chunks por página.
+    Aceita um gerador, então pode ser usado sem carregar todos os chunks do arquivo (ver `processar_chunks_arquivo`).
+
+    Args:
+        chunks (Iterable[Document]): Chunks na ordem do documento.
+    Yields:
+        Dict[str,Any]: Dados do chunk com 'embedding' None.
     """
     ultima_pagina = None
     indice_chunk_atual = 0
-    embedding = BedrockEmbeddings(
-        model_id="amazon.titan-embed-text-v2:0"
-    )
     for chunk in chunks:
         conteudo = chunk.page_content
         metadados = chunk.metadata
@@ -134,151 +169,494 @@ def processar_chunks_pdf(chunks: List[Document], dados_chunk: List[Dict[str,Any]
             indice_chunk_atual = 0 # Reseta o indice para pagina nova.
             ultima_pagina = pagina_atual
         
-        conteudo_embedding = embedding.embed_query(conteudo)
-        dados_chunk.append({
+        yield {
             "path_origem": metadados['source'],
             "conteudo": conteudo,
             "pag": pagina_atual,
             "indice_chunk": indice_chunk_atual,
-            "embedding": conteudo_embedding,
+            "embedding": None, # Preenchido em lote por preencher_embeddings.
             "modtempo": metadados.get('moddate') # Abreviacao para ultima modificacao/modificacao tempo. get para retornar None se nao existe.
-        })
+        }
 
-def processar_chunks_txt(chunks, dados_chunk):
+def iterar_dados_txt(chunks: Iterable[Document]) -> Iterator[Dict[str,Any]]:
     """
-    Utiliza a lista de documentos com chunks de txts para transformá-los em uma lista de dicionários
-    com informações específicas de cada documento(caminho de origem, conteudo, pag, etc.)
+    Gera o dicionário de cada chunk de txt (sem embedding), numerando os chunks sequencialmente.
 
     Args:
-        chunks (List[Document]): Lista de documentos com chunks.
-        dados_chunk (List[Dict[str,Any]]: Lista para armazenar os dados processados.
+        chunks (Iterable[Document]): Chunks na ordem do documento.
+    Yields:
+        Dict[str,Any]: Dados do chunk com 'embedding' None.
     """
-
-    indice_chunk_atual = 0
-    embedding = BedrockEmbeddings(
-        model_id="amazon.titan-embed-text-v2:0"
-    ) 
-    for chunk in chunks:
-        conteudo = chunk.page_content
-        metadados = chunk.metadata
-        conteudo_embedding = embedding.embed_query(conteudo)
-
-        dados_chunk.append({
-            "path_origem": metadados['source'],
-            "conteudo": conteudo,
+    for indice_chunk_atual, chunk in enumerate(chunks):
+        yield {
+            "path_origem": chunk.metadata['source'],
+            "conteudo": chunk.page_content,
             "pag": None,
             "indice_chunk": indice_chunk_atual,
-            "embedding": conteudo_embedding,
+            "embedding": None, # Preenchido em lote por preencher_embeddings.
             "modtempo": None
-        })
-        indice_chunk_atual += 1
+        }
+
+def preencher_embeddings(
+    dados_chunk: Union[ChunkBatch, List[Dict[str,Any]]],
+    max_workers: int = MAX_WORKERS,
+    estatisticas: Optional[Dict[str,Any]] = None
+) -> None:
+    """
+    Associa um embedding a cada chunk, consultando primeiro o cache de embeddings (tabela embedding_cache)
+    e gerando apenas os que faltam com o provedor configurado (`embeddings.gerar_embeddings`).
+    Assim, re-enviar um documento pouco alterado custa apenas os embeddings dos trechos modificados.
+
+    Args:
+        dados_chunk (Union[ChunkBatch, List[Dict[str,Any]]]): Chunks processados. Em um `ChunkBatch` os
+            embeddings são escritos nas linhas da matriz, em uma lista no campo 'embedding' de cada dicionário.
+        max_workers (int): Máximo de requisições simultâneas de embedding.
+        estatisticas (Optional[Dict[str,Any]]): Dicionário para armazenar 'cache_hits' e 'cache_misses'.
+    """
+    lote = isinstance(dados_chunk, ChunkBatch)
+    conteudos = dados_chunk.conteudo if lote else [dado['conteudo'] for dado in dados_chunk]
+    model_id = get_provedor_embeddings().model_id
+    hashes = [hash_conteudo(conteudo, model_id) for conteudo in conteudos]
+    encontrados = buscar_embeddings_cache(list(set(hashes)))
+
+    # Textos repetidos dentro do mesmo lote geram apenas uma chamada.
+    faltantes = {}
+    for h, conteudo in zip(hashes, conteudos):
+        if h not in encontrados and h not in faltantes:
+            faltantes[h] = conteudo
+
+    if faltantes:
+        incrementar('chamadas_externas_total', len(faltantes), servico='embedding')
+        vetores = gerar_embeddings(list(faltantes.values()), max_workers=max_workers)
+        novos = dict(zip(faltantes.keys(), vetores))
+        salvar_embeddings_cache(novos)
+        encontrados.update(novos)
+
+    if lote:
+        for i, h in enumerate(hashes):
+            dados_chunk.embeddings[i] = encontrados[h]
+    else:
+        for h, dado in zip(hashes, dados_chunk):
+            dado['embedding'] = encontrados[h]
+
+    hits = sum(1 for h in hashes if h not in faltantes)
+    misses = len(hashes) - hits
+    incrementar('cache_embeddings_total', hits, resultado='hit')
+    incrementar('cache_embeddings_total', misses, resultado='miss')
+    print(f"Cache de embeddings: {hits} hits, {misses} misses ({len(faltantes)} embeddings gerados por {model_id}).")
+    if estatisticas is not None:
+        estatisticas['cache_hits'] = estatisticas.get('cache_hits', 0) + hits
+        estatisticas['cache_misses'] = estatisticas.get('cache_misses', 0) + misses
+
+def buscar_embeddings_cache(hashes: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Busca no cache os embeddings já calculados para os hashes informados.
+
+    Args:
+        hashes (List[str]): Hashes do conteúdo dos chunks (ver `embeddings.hash_conteudo`).
+    Returns:
+        Dict[str, np.ndarray]: Mapeamento hash -> embedding (float32) apenas para os hashes encontrados.
+    """
+    if not hashes:
+        return {}
+    # Erros (inclusive banco fora do ar, ex: VECTOR_STORE=local sem Postgres) não interrompem a ingestão.
+    try:
+        with conexao() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT hash_conteudo, embedding::text
+                FROM embedding_cache
+                WHERE model_id = %s AND hash_conteudo = ANY(%s)
+                """,
+                (get_provedor_embeddings().model_id, hashes)
+            )
+            # Texto '[x,y,...]' do pgvector convertido direto para float32, sem criar uma lista de floats do Python.
+            return {linha[0]: np.fromstring(linha[1][1:-1], sep=',', dtype=np.float32) for linha in cur.fetchall()}
+    except Exception as e:
+        print(f"Erro ao consultar cache de embeddings, todos serao gerados: {e}")
+        return {}
+
+def salvar_embeddings_cache(embeddings_por_hash: Dict[str, np.ndarray]) -> None:
+    """
+    Armazena no cache os embeddings recém gerados. Erros aqui não interrompem a ingestão,
+    no pior caso os embeddings serão gerados novamente no próximo upload.
 
-def check_db_orfaos(dados_chunk: List[Dict[str, Any]]) -> None:
+    Args:
+        embeddings_por_hash (Dict[str, np.ndarray]): Mapeamento hash -> embedding.
+    """
+    if not embeddings_por_hash:
+        return
+    model_id = get_provedor_embeddings().model_id
+    try:
+        with conexao() as conn, conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO embedding_cache (hash_conteudo, model_id, embedding)
+                VALUES %s
+                ON CONFLICT (hash_conteudo, model_id) DO NOTHING
+                """,
+                [(h, model_id, np.asarray(vetor, dtype=float).tolist()) for h, vetor in embeddings_por_hash.items()]
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Erro ao salvar cache de embeddings: {e}")
+
+def check_db_orfaos(dados_chunk: List[Dict[str, Any]]) -> int:
     """
     Remove registros órfãos do banco de dados que não estão presentes nos chunks fornecidos, caso existam,
-    restritos ao arquivo específico sendo processado.
+    restritos aos arquivos presentes nos chunks (podem ser vários, ex: pdfs e txts juntos no main).
 
     Compara os tuples (path_origem, num_pagina, indice_chunk) dos chunks com os registros
-    na tabela 'docs' para o mesmo path_origem e deleta aqueles que não existem mais nos chunks.
+    armazenados dos mesmos path_origem e deleta aqueles que não existem mais nos chunks.
+    No pgvector as chaves são enviadas como arrays (unnest), então a comparação é feita em um único DELETE.
+    `armazenar_db` já faz essa remoção na mesma transação do upsert, esta função é para uso isolado.
 
     Args:
         dados_chunk: Lista de dicionários contendo os chunks processados, cada um com
                      'path_origem', 'pag', 'indice_chunk',etc.
+    Returns:
+        int: Quantidade de registros removidos.
     """
     if not dados_chunk:
         print("Nenhum chunk fornecido, nada a verificar.")
-        return
+        return 0
+    return get_vector_store().remover_orfaos(dados_chunk)
 
-    # Obter o path_origem do arquivo sendo processado (assume-se que todos os chunks são do mesmo arquivo)
-    path_origem = dados_chunk[0]['path_origem']
+def _criar_loader(caminho_arquivo: str, tipo: str):
+    if tipo == 'pdf':
+        from langchain_community.document_loaders import PyPDFLoader
+        return PyPDFLoader(caminho_arquivo)
+    elif tipo == 'txt':
+        from langchain_community.document_loaders import TextLoader
+        return TextLoader(caminho_arquivo)
+    raise ValueError(f"Arquivo de tipo {tipo} não é suportado.")
+
+def carregar_e_chunkar(caminho_arquivo: str, tipo: str) -> List[Document]:
+    """
+    Carrega um arquivo com o loader correspondente ao tipo e o divide em chunks.
+    Função de nível de módulo para poder ser executada em outro processo (ver `sincronizar_diretorios`).
 
-    # Criar conjunto de tuples únicos para comparação (sem path_origem, pois será filtrado na query)
-    chunk_tuples = [
-        (chunk['pag'], chunk['indice_chunk'])
-        for chunk in dados_chunk
-    ]
+    Args:
+        caminho_arquivo (str): Caminho do arquivo a ser processado.
+        tipo (str): Tipo do arquivo (pdf ou txt).
+    Returns:
+        List[Document]: Chunks do arquivo, na ordem do documento.
+    Raises:
+        ValueError: Quando não é um dos tipos de arquivos aceitos. 
+    """
+    return list(iterar_chunks(caminho_arquivo, tipo))
 
-    # Query para encontrar registros órfãos apenas para o path_origem específico
-    query_select = """
-        SELECT id
-        FROM docs
-        WHERE path_origem = %s
-        AND (COALESCE(num_pagina, -1), indice_chunk) NOT IN %s
+def _carregar_e_chunkar_ou_erro(caminho_arquivo: str, tipo: str) -> Union[List[Document], Exception]:
+    """
+    Como `carregar_e_chunkar`, mas retorna a exceção em vez de propagá-la: um arquivo com erro no processo
+    de parse não interrompe os resultados dos demais (ver `mapear_em_ordem`).
     """
-    
     try:
-        # Executar query com path_origem e tuples formatados
-        cur.execute(query_select, (path_origem, tuple(chunk_tuples)))
-        orphaned_ids = [row[0] for row in cur.fetchall()]
-
-        # Se houver registros órfãos, deletá-los
-        if orphaned_ids:
-            query_delete = """
-                DELETE FROM docs
-                WHERE id IN %s
-            """
-            cur.execute(query_delete, (tuple(orphaned_ids),))
-            conn.commit()
-            print(f"Deletados {len(orphaned_ids)} registros órfãos para {path_origem}.")
-        else:
-            print(f"Nenhum registro órfão encontrado para {path_origem}.")
-
+        return carregar_e_chunkar(caminho_arquivo, tipo)
     except Exception as e:
-        conn.rollback()
-        print(f"Erro ao remover registros órfãos para {path_origem}: {e}")
-        raise
+        return e
 
-    
+def iterar_chunks(caminho_arquivo: str, tipo: str) -> Iterator[Document]:
+    """
+    Versão preguiçosa de `carregar_e_chunkar`: carrega uma página por vez (lazy_load) e já a divide em chunks,
+    então apenas a página atual fica na memória. O resultado é o mesmo, já que o chunker divide cada
+    página de forma independente.
+
+    Args:
+        caminho_arquivo (str): Caminho do arquivo a ser processado.
+        tipo (str): Tipo do arquivo (pdf ou txt).
+    Yields:
+        Document: Chunks do arquivo, na ordem do documento.
+    Raises:
+        ValueError: Quando não é um dos tipos de arquivos aceitos. 
+    """
+    loader = _criar_loader(caminho_arquivo, tipo)
+    for pagina in loader.lazy_load():
+        yield from chunk_document([pagina])
+
+def _lotes(itens: Iterable[Any], tamanho: int) -> Iterator[List[Any]]:
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def processar_chunks_arquivo(
+    caminho_arquivo: str,
+    tipo: str,
+    chunks: Iterable[Document],
+    max_workers: int = MAX_WORKERS,
+    estatisticas: Optional[Dict[str,Any]] = None,
+    hash_conteudo_arquivo: Optional[str] = None,
+    tamanho_lote: int = TAMANHO_LOTE_INGESTAO,
+    progresso: Optional[Callable[[int], None]] = None
+) -> int:
+    """
+    Gera os embeddings dos chunks de um arquivo e os armazena em lotes de `tamanho_lote`: cada lote é
+    gravado (sem remover órfãos) antes do próximo ser gerado, então a memória usada pelos embeddings
+    depende do tamanho do lote e não do tamanho do arquivo. Ao final os órfãos do arquivo são removidos
+    comparando apenas as chaves (path_origem, pag, indice_chunk) de todos os chunks.
+
+    Após cada lote o checkpoint (CHECKPOINT_PATH) guarda quantos chunks do arquivo já foram gravados, junto
+    com o hash do arquivo e o modelo de embedding. Se o processo cair, a próxima execução pula esses chunks (eles
+    ainda são lidos para manter a numeração, mas não geram embeddings nem escritas) desde que o arquivo e o
+    modelo não tenham mudado.
 
-def processar_item_unico(caminho_arquivo: str, tipo: str):
+    Args:
+        caminho_arquivo (str): Caminho do arquivo de origem dos chunks.
+        tipo (str): Tipo do arquivo (pdf ou txt).
+        chunks (Iterable[Document]): Chunks do arquivo (lista de `carregar_e_chunkar` ou gerador de `iterar_chunks`).
+        max_workers (int): Máximo de requisições simultâneas de embedding.
+        estatisticas (Optional[Dict[str,Any]]): Acumula os hits/misses do cache de embeddings.
+        hash_conteudo_arquivo (Optional[str]): Hash do arquivo (ver `manifesto.hash_arquivo`), calculado se não informado.
+        tamanho_lote (int): Quantidade de chunks por lote de embeddings/escrita.
+        progresso (Optional[Callable[[int],None]]): Chamada após cada lote com a quantidade de chunks já gravados.
+    Returns:
+        int: Quantidade de chunks do arquivo.
+    """
+    if hash_conteudo_arquivo is None:
+        hash_conteudo_arquivo = hash_arquivo(caminho_arquivo)
+    model_id = get_provedor_embeddings().model_id
+    entrada = carregar_manifesto(CHECKPOINT_PATH).get(caminho_arquivo)
+    mesmo_arquivo = entrada and entrada['hash'] == hash_conteudo_arquivo and entrada.get('model_id') == model_id
+    ja_gravados = entrada['chunks_gravados'] if mesmo_arquivo else 0
+    if ja_gravados:
+        print(f"Retomando {caminho_arquivo} a partir do chunk {ja_gravados}.")
+
+    dados = iterar_dados_pdf(chunks) if tipo == 'pdf' else iterar_dados_txt(chunks)
+    chaves = []
+    lotes = _lotes(dados, tamanho_lote)
+    while True:
+        # Com `iterar_chunks` a leitura do arquivo acontece aqui, conforme cada lote é pedido.
+        with span('carregar_chunkar', pipeline='ingestao'):
+            lote = next(lotes, None)
+        if lote is None:
+            break
+        for dado in lote:
+            chaves.append({"path_origem": dado['path_origem'], "pag": dado['pag'], "indice_chunk": dado['indice_chunk']})
+        pendentes = lote[max(0, ja_gravados - (len(chaves) - len(lote))):]
+        if not pendentes:
+            continue
+        # A matriz do lote tem a dimensão do provedor configurado (ex: 384 com o MiniLM local), não a do Titan.
+        lote_colunar = ChunkBatch.de_dicionarios(pendentes, dimensao=get_provedor_embeddings().dimensao)
+        with span('embeddings', pipeline='ingestao'):
+            preencher_embeddings(lote_colunar, max_workers, estatisticas)
+        armazenar_db(lote_colunar, remover_orfaos=False)
+        incrementar('chunks_ingeridos_total', len(lote_colunar))
+        atualizar_manifesto(
+            caminho_arquivo,
+            {'hash': hash_conteudo_arquivo, 'model_id': model_id, 'chunks_gravados': len(chaves)},
+            CHECKPOINT_PATH
+        )
+        if progresso is not None:
+            progresso(len(chaves))
+
+    with span('remover_orfaos', pipeline='ingestao'):
+        if chaves:
+            check_db_orfaos(chaves)
+        else:
+            # Arquivo ficou vazio, não há chunks para comparar então todas as linhas dele são órfãs.
+            get_vector_store().remover_arquivos([caminho_arquivo])
+    atualizar_manifesto(caminho_arquivo, None, CHECKPOINT_PATH)
+    return len(chaves)
+
+def processar_item_unico(
+    caminho_arquivo: str,
+    tipo: str,
+    max_workers: int = MAX_WORKERS,
+    estatisticas: Optional[Dict[str,Any]] = None,
+    hash_conteudo_arquivo: Optional[str] = None,
+    progresso: Optional[Callable[[int], None]] = None
+):
     """
     Função para processar um item único, seja pdf ou txt, feita para ser utilizada iterativamente(como no website).
+    O arquivo é lido página a página e gravado em lotes (ver `processar_chunks_arquivo`).
 
     Args:
         caminho_arquivo (str): Caminho do arquivo a ser processado.
         tipo (str): Tipo do arquivo (pdf ou txt).
+        max_workers (int): Máximo de requisições simultâneas de embedding.
+        estatisticas (Optional[Dict[str,Any]]): Acumula os hits/misses do cache de embeddings.
+        hash_conteudo_arquivo (Optional[str]): Hash do arquivo, calculado se não informado.
+        progresso (Optional[Callable[[int],None]]): Chamada após cada lote com a quantidade de chunks já gravados.
     Raises:
         ValueError: Quando não é um dos tipos de arquivos aceitos. 
     """
+    chunks = iterar_chunks(caminho_arquivo, tipo)
+    with span('arquivo', pipeline='ingestao'):
+        return processar_chunks_arquivo(
+            caminho_arquivo,
+            tipo,
+            chunks,
+            max_workers,
+            estatisticas,
+            hash_conteudo_arquivo=hash_conteudo_arquivo,
+            progresso=progresso
+        )
+
+def mapear_em_ordem(executor: Executor, func: Callable, argumentos: Iterable[Tuple], janela: int) -> Iterator[Any]:
+    """
+    Como `executor.map`, produz os resultados na ordem de submissão, mas mantém no máximo `janela`
+    tarefas pendentes. Assim os resultados são consumidos conforme ficam prontos sem acumular na memória
+    os chunks de todos os arquivos quando a etapa seguinte (embeddings) é mais lenta.
 
-    dados_chunk = []
-    if tipo == 'pdf':
-        loader = PyPDFLoader(caminho_arquivo)
-        docs = loader.load()
-        chunks = chunk_document(docs)
-        processar_chunks_pdf(chunks, dados_chunk)
-    elif tipo == 'txt':
-        loader = TextLoader(caminho_arquivo)
-        docs = loader.load()
-        chunks = chunk_document(docs)
-        processar_chunks_txt(chunks,dados_chunk)
+    Args:
+        executor (Executor): Pool onde as tarefas são executadas.
+        func (Callable): Função a ser executada.
+        argumentos (Iterable[Tuple]): Argumentos de cada chamada.
+        janela (int): Máximo de tarefas submetidas e ainda não consumidas.
+    Yields:
+        Any: Resultados na ordem dos argumentos.
+    """
+    pendentes = deque()
+    for args in argumentos:
+        pendentes.append(executor.submit(func, *args))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+def sincronizar_diretorios(manifesto: Dict[str, Any], completo: bool = False) -> Dict[str, int]:
+    """
+    Sincroniza os diretórios de dados com o vector store usando o manifesto de ingestão:
+    apenas arquivos novos ou alterados (tamanho/mtime e hash do conteúdo) são processados e
+    os chunks de arquivos que não existem mais são removidos. Trocar o provedor de embeddings faz todos os
+    arquivos serem processados novamente com o novo modelo. O manifesto é salvo após cada arquivo,
+    então uma interrupção não faz os arquivos já concluídos serem processados novamente.
+
+    Args:
+        manifesto (Dict[str,Any]): Manifesto carregado com `manifesto.carregar_manifesto`, atualizado in-place.
+        completo (bool): Se True ignora o manifesto e processa todos os arquivos.
+    Returns:
+        Dict[str,int]: Quantidade de arquivos 'processados', 'removidos', 'inalterados', com 'erros' (registrados
+            no log e tentados novamente na próxima sincronização) e 'aguardando' (modificados há menos de
+            TEMPO_MINIMO_ESTAVEL segundos, podem ainda estar sendo copiados).
+    """
+    arquivos = {}
+    tipos = {}
+    for diretorio, tipo in DIRETORIOS_DADOS.items():
+        for caminho, stat in escanear_diretorio(diretorio, tipo).items():
+            arquivos[caminho] = stat
+            tipos[caminho] = tipo
+
+    agora = time.time()
+    estaveis = {caminho: stat for caminho, stat in arquivos.items() if agora - stat.st_mtime >= TEMPO_MINIMO_ESTAVEL}
+    model_id = get_provedor_embeddings().model_id
+    alterados, _, hashes = calcular_diferencas({} if completo else manifesto, estaveis, model_id)
+    removidos = sorted(caminho for caminho in manifesto if caminho not in arquivos)
+
+    if removidos:
+        get_vector_store().remover_arquivos(removidos)
+        for caminho in removidos:
+            manifesto.pop(caminho, None)
+            atualizar_manifesto(caminho, None)
+
+    estatisticas = {}
+    falhas = []
+
+    def finalizar(caminho: str, tipo: str, chunks: Union[Iterable[Document], Exception]) -> None:
+        # Um PDF corrompido, throttling do Bedrock ou queda do banco afeta apenas o arquivo: ele fica fora do
+        # manifesto e é tentado novamente na próxima sincronização.
+        try:
+            if isinstance(chunks, Exception):
+                raise chunks
+            _finalizar_arquivo(manifesto, caminho, tipo, chunks, estaveis[caminho], hashes[caminho], model_id, estatisticas)
+        except Exception as e:
+            print(f"Erro ao processar {caminho}, ignorado nesta sincronização: {e}")
+            falhas.append(caminho)
+
+    argumentos = [(caminho, tipos[caminho]) for caminho in alterados]
+    processos = min(PROCESSOS_PARSE, len(argumentos))
+    if processos > 1:
+        # Parse/chunk dos próximos arquivos acontece em paralelo enquanto o arquivo atual gera embeddings.
+        # A ordem dos resultados é a ordem de `alterados`, então o indice_chunk de cada arquivo é sempre o mesmo.
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = mapear_em_ordem(executor, _carregar_e_chunkar_ou_erro, argumentos, 2 * processos)
+            for (caminho, tipo), chunks in zip(argumentos, resultados):
+                finalizar(caminho, tipo, chunks)
     else:
-        raise ValueError(f"Arquivo de tipo {tipo} não é suportado.")
-    check_db_orfaos(dados_chunk)
-    armazenar_db(dados_chunk)
-    return len(dados_chunk)
-
-def main():
-    pdfs = carregar_documentos(PDFS_PATH, PyPDFLoader, "pdf")
-    txts = carregar_documentos(TXTS_PATH, TextLoader, "txt")
-    chunks_txts = chunk_document(txts)
-    chunks_pdfs = chunk_document(pdfs)
-
-    dados_chunk = [] # Lista que armazenará o dict com informações processadas.
-    
-    processar_chunks_pdf(chunks_pdfs,dados_chunk)
-    processar_chunks_txt(chunks_txts, dados_chunk)
-    check_db_orfaos(dados_chunk)
-    # Agora é possível armazenar as informações na db.
-    armazenar_db(dados_chunk)
-    
+        for caminho, tipo in argumentos:
+            finalizar(caminho, tipo, iterar_chunks(caminho, tipo))
+    for caminho in hashes.keys() - set(alterados):
+        atualizar_manifesto(caminho, manifesto[caminho]) # Apenas o mtime atualizado.
+
+    if alterados:
+        print(f"Total do cache de embeddings: {estatisticas.get('cache_hits', 0)} hits, {estatisticas.get('cache_misses', 0)} misses.")
+    instaveis = sorted(set(arquivos) - set(estaveis))
+    if instaveis:
+        print(f"Aguardando a próxima sincronização (modificados há menos de {TEMPO_MINIMO_ESTAVEL}s): {', '.join(instaveis)}")
+    resumo = {
+        'processados': len(alterados) - len(falhas),
+        'removidos': len(removidos),
+        'inalterados': len(estaveis) - len(alterados),
+        'erros': len(falhas),
+        'aguardando': len(instaveis),
+    }
+    print(
+        f"Sincronização: {resumo['processados']} processado(s), {resumo['removidos']} removido(s), "
+        f"{resumo['inalterados']} inalterado(s), {resumo['erros']} com erro, {resumo['aguardando']} aguardando."
+    )
+    return resumo
+
+def _finalizar_arquivo(
+    manifesto: Dict[str, Any],
+    caminho: str,
+    tipo: str,
+    chunks: Iterable[Document],
+    stat: os.stat_result,
+    hash_conteudo_arquivo: str,
+    model_id: str,
+    estatisticas: Dict[str, Any]
+) -> None:
+    print(f"Processando {caminho}...")
+    with span('arquivo', pipeline='ingestao'):
+        total = processar_chunks_arquivo(caminho, tipo, chunks, estatisticas=estatisticas, hash_conteudo_arquivo=hash_conteudo_arquivo)
+    print(f"{caminho}: {total} chunks.")
+    registrar_arquivo(manifesto, caminho, stat, hash_conteudo_arquivo, model_id)
+    # Apenas a entrada do arquivo: entradas gravadas por outro processo (ex: a fila de ingestão) são mantidas.
+    atualizar_manifesto(caminho, manifesto[caminho])
+
+def main(completo: bool = False, watch: bool = False, intervalo: float = 5.0):
+    """
+    Ingestão dos diretórios de dados (data/pdfs e data/txts).
 
+    Args:
+        completo (bool): Se True reprocessa todos os arquivos, ignorando o manifesto.
+        watch (bool): Se True continua monitorando os diretórios e processa arquivos novos/alterados/removidos.
+        intervalo (float): Segundos entre as varreduras no modo watch.
+    """
+    manifesto = carregar_manifesto()
+    sincronizar_diretorios(manifesto, completo)
+    if watch:
+        print(f"Monitorando {', '.join(DIRETORIOS_DADOS)} a cada {intervalo}s (Ctrl+C para sair)...")
+        try:
+            while True:
+                time.sleep(intervalo)
+                try:
+                    # Relido a cada varredura para considerar os arquivos registrados pela fila de ingestão.
+                    manifesto = carregar_manifesto()
+                    sincronizar_diretorios(manifesto)
+                except Exception as e:
+                    # Ex: banco fora do ar ao remover arquivos apagados, a próxima varredura tenta novamente.
+                    print(f"Erro na sincronização, tentando novamente em {intervalo}s: {e}")
+        except KeyboardInterrupt:
+            print("Monitoramento encerrado.")
 
             
     
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingestão incremental de data/pdfs e data/txts.")
+    parser.add_argument('--completo', action='store_true', help="Reprocessa todos os arquivos, ignorando o manifesto.")
+    parser.add_argument('--watch', action='store_true', help="Continua monitorando os diretórios por mudanças.")
+    parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos entre varreduras no modo --watch.")
+    args = parser.parse_args()
+
     print("Começando...")
-    main()
+    main(args.completo, args.watch, args.intervalo)
     print("Concluido!")
 
     #cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema ='public'")
@@ -0,0 +1,192 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metricas import span
+from cache_web import buscar_cache_web, salvar_cache_web
+from query_processing import (
+    get_query_embedding,
+    pesquisa_semantica,
+    gerar_resposta,
+    otimizar_prompt_web,
+    get_resposta_modelo,
+    buscar_na_web,
+    similaridade_maxima,
+)
+
+# Tempo máximo (segundos) de cada etapa da pipeline. Etapas opcionais (reescrita e web) que estouram o
+# tempo são ignoradas, as obrigatórias propagam asyncio.TimeoutError.
+TIMEOUTS_ETAPAS = {
+    "embedding": 10.0,
+    "pesquisa": 10.0,
+    "cache_web": 2.0,
+    "reescrita": 15.0,
+    "web": 15.0,
+    "geracao": 60.0,
+    "verificacao": 10.0,
+}
+
+# A reescrita e a pesquisa na web começam junto com a geração da resposta, antes da verificação, quando o melhor
+# contexto encontrado tem similaridade abaixo deste valor: contextos fracos quase sempre precisam da web.
+LIMIAR_ESPECULATIVO = float(os.getenv('LIMIAR_ESPECULATIVO', '0.5'))
+
+
+async def _executar_etapa(nome: str, timeouts: Dict[str, float], func: Callable, *args) -> Any:
+    """
+    Executa uma função bloqueante (boto3, psycopg2, DuckDuckGo) em uma thread, respeitando o timeout da etapa.
+    Ao cancelar/estourar o tempo a corrotina é liberada imediatamente, mas a thread termina sua chamada em segundo plano.
+    """
+    with span(nome):
+        return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout=timeouts[nome])
+
+
+async def _consultar_cache_web(query: str, timeouts: Dict[str, float]) -> Optional[Dict[str, Any]]:
+    """
+    Pesquisa da web em cache para a query (apenas pela query normalizada, o embedding ainda não existe quando
+    a etapa é iniciada). Consulta apenas o banco, então sempre roda junto com o embedding e a busca.
+    """
+    try:
+        return await _executar_etapa("cache_web", timeouts, buscar_cache_web, query)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def _reescrever_query(
+    query: str,
+    tarefa_cache: "asyncio.Task[Optional[Dict[str, Any]]]",
+    timeouts: Dict[str, float]
+) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+    """
+    Retorna a query reescrita para a web e, se a pesquisa já estiver no cache, os resultados dela.
+    """
+    em_cache = await tarefa_cache
+    if em_cache is not None:
+        return em_cache["query_web"], em_cache["resultados"]
+    try:
+        return await _executar_etapa("reescrita", timeouts, get_resposta_modelo, otimizar_prompt_web(query)), None
+    except asyncio.TimeoutError:
+        print("Reescrita da query para web excedeu o tempo, usando a query original.")
+        return query, None
+
+
+async def _buscar_web(
+    query: str,
+    tarefa_reescrita: "asyncio.Task[Tuple[str, Optional[List[Dict[str, Any]]]]]",
+    timeouts: Dict[str, float]
+) -> List[Dict[str, Any]]:
+    query_web, em_cache = await tarefa_reescrita
+    if em_cache is not None:
+        return em_cache
+    try:
+        resultados = await _executar_etapa("web", timeouts, buscar_na_web, query_web)
+    except asyncio.TimeoutError:
+        print("Pesquisa na web excedeu o tempo, seguindo sem contextos da web.")
+        return []
+    await asyncio.to_thread(salvar_cache_web, query, query_web, resultados)
+    return resultados
+
+
+async def processar_query_async(
+    query: str,
+    top_k: int = 5,
+    min_similaridade_res: float = 0.6,
+    timeouts: Optional[Dict[str, float]] = None,
+    especulativo: bool = False
+):
+    """
+    Variante assíncrona de `processar_query` com timeout por etapa, que sobrepõe etapas independentes para a
+    latência ficar limitada pelo ramo mais lento e não pela soma de todos:
+        - a consulta ao cache da web (apenas o banco) roda junto com o embedding e a busca;
+        - quando o melhor contexto tem similaridade abaixo de LIMIAR_ESPECULATIVO (ou não há contexto), a
+          reescrita e a pesquisa na web rodam junto com a geração e a verificação da resposta;
+        - no modo especulativo a reescrita começa junto com o embedding e a busca, e a pesquisa na web junto com
+          a geração para qualquer contexto. Cancelar uma tarefa não interrompe a chamada bloqueante já iniciada na
+          thread (a reescrita na LLM e a pesquisa no DuckDuckGo são pagas mesmo sem uso), por isso o modo vem desligado.
+    Tarefas que não forem usadas são canceladas, assim como todas as etapas pendentes ao cancelar esta corrotina.
+
+    Args:
+        query (str): query do usuário.
+        top_k (int): máximo de valores a retornar da busca por similaridade semantica.
+        min_similaridade_res (float): Minimo de similaridade aceita da resposta do modelo.
+        timeouts (Optional[Dict[str,float]]): Sobrescreve valores de TIMEOUTS_ETAPAS.
+        especulativo (bool): Se True inicia a reescrita junto com a busca e a pesquisa na web junto com a
+            geração, mesmo para contextos com similaridade alta. Default: False.
+    Returns:
+        resposta (str): Resposta do modelo.
+        contextos (List[Dict[str,Any]]): Lista de dicionários com todos os contextos utilizados para a resposta.
+        usou_web (bool): Se usou a web a priori ou não.
+        usou_web_e_docs (bool): se precisou usar a web após gerar a primeira resposta.
+    Raises:
+        asyncio.TimeoutError: Quando uma etapa obrigatória (embedding, pesquisa, geração, verificação) excede o tempo.
+    """
+    timeouts = {**TIMEOUTS_ETAPAS, **(timeouts or {})}
+    tarefa_cache = None
+    tarefa_reescrita = None
+    tarefa_web = None
+
+    def iniciar_cache() -> "asyncio.Task[Optional[Dict[str,Any]]]":
+        nonlocal tarefa_cache
+        if tarefa_cache is None:
+            tarefa_cache = asyncio.create_task(_consultar_cache_web(query, timeouts))
+        return tarefa_cache
+
+    def iniciar_reescrita() -> "asyncio.Task[Tuple[str, Optional[List[Dict[str,Any]]]]]":
+        nonlocal tarefa_reescrita
+        if tarefa_reescrita is None:
+            tarefa_reescrita = asyncio.create_task(_reescrever_query(query, iniciar_cache(), timeouts))
+        return tarefa_reescrita
+
+    def iniciar_web() -> "asyncio.Task[List[Dict[str,Any]]]":
+        nonlocal tarefa_web
+        if tarefa_web is None:
+            tarefa_web = asyncio.create_task(_buscar_web(query, iniciar_reescrita(), timeouts))
+        return tarefa_web
+
+    try:
+        iniciar_cache()
+        if especulativo:
+            iniciar_reescrita()
+
+        query_embedding = await _executar_etapa("embedding", timeouts, get_query_embedding, query)
+        contextos = await _executar_etapa("pesquisa", timeouts, pesquisa_semantica, query_embedding, top_k, True, query)
+        usou_web = False
+        usou_web_e_docs = False
+
+        if not contextos:
+            print("Nao foi encontrado um contexto no(s) texto(s), pesquisando na web...")
+            usou_web = True
+            contextos = await iniciar_web()
+            resposta = await _executar_etapa("geracao", timeouts, gerar_resposta, query, contextos, usou_web)
+        else:
+            if especulativo or max(contexto['similaridade'] for contexto in contextos) < LIMIAR_ESPECULATIVO:
+                iniciar_web()
+            resposta = await _executar_etapa("geracao", timeouts, gerar_resposta, query, contextos, usou_web)
+
+            resposta_np = np.asarray(
+                await _executar_etapa("verificacao", timeouts, get_query_embedding, resposta),
+                dtype=np.float32
+            )
+            contextos_np = np.stack([contexto['embedding'] for contexto in contextos])
+            if similaridade_maxima(contextos_np, resposta_np) < min_similaridade_res:
+                contextos += await iniciar_web()
+                usou_web_e_docs = True
+                resposta = await _executar_etapa("geracao", timeouts, gerar_resposta, query, contextos, usou_web)
+    finally:
+        tarefas = [tarefa for tarefa in (tarefa_web, tarefa_reescrita, tarefa_cache) if tarefa is not None]
+        for tarefa in tarefas:
+            if not tarefa.done():
+                tarefa.cancel()
+        # Recupera o resultado (ou exceção) das tarefas não usadas, nenhuma fica com exceção não lida.
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    print(resposta)
+    return resposta, contextos, usou_web, usou_web_e_docs
+
+
+def processar_query_paralelo(query: str, top_k: int = 5, min_similaridade_res: float = 0.6, **kwargs):
+    """
+    Atalho síncrono para `processar_query_async`, para ser chamado fora de um event loop (ex: Streamlit, CLI).
+    """
+    return asyncio.run(processar_query_async(query, top_k, min_similaridade_res, **kwargs))
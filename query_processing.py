@@ -1,107 +1,165 @@
-from typing import List, Dict, Any, Tuple
+from __future__ import annotations # Anotações com PromptTemplate não importam o langchain.
+
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Iterator, Optional
+
+import time
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
 
-import psycopg2
 import os
-from langchain_aws import BedrockEmbeddings, BedrockLLM 
-from langchain.prompts import PromptTemplate 
-import boto3 
 import numpy as np 
 
-from db_utils import get_conn
+from vector_store import get_vector_store
+from embeddings import get_provedor_embeddings, gerar_embeddings
+from metricas import Rastro, span, incrementar, observar
+from cache_web import buscar_cache_web, salvar_cache_web
+from clientes_aws import get_cliente
+from contexto import montar_contexto
 
-from langchain_core.callbacks import AsyncCallbackHandler
-from langchain_community.tools import DuckDuckGoSearchResults
+# langchain e DuckDuckGo são importados no primeiro uso, importar o módulo não os carrega.
+if TYPE_CHECKING:
+    from langchain.prompts import PromptTemplate
 
 #
 
 # Valor minimo aceito de similaridade para considerar o contexto bom. 
 MINIMO_SIMILARIDADE = 0.30
+# 'vetorial' (apenas embeddings) ou 'hibrida' (texto completo + embeddings com reciprocal rank fusion).
+MODO_BUSCA = os.getenv('MODO_BUSCA', 'vetorial')
 
-conn = get_conn()
-cur = conn.cursor()
+LLM_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+CONFIG_INFERENCIA = {"maxTokens": 512, "temperature": 0.5, "topP": 0.9}
+# Máximo de chamadas simultâneas à LLM/web em `processar_queries`.
+LLM_CONCORRENCIA = int(os.getenv('LLM_CONCORRENCIA', '8'))
 
 
 def get_query_embedding(query: str) -> List[float]:
     """
-    Gera embeddings da string input.
+    Gera embeddings da string input com o provedor configurado em EMBEDDING_PROVIDER
+    (o mesmo usado na ingestão, ver `embeddings.get_provedor_embeddings`).
 
     Args:
         query (str): String a se obter embeddings.
     Returns:
         List[float]: Lista com os embeddings.
     """
-
-    embedding = BedrockEmbeddings(
-        model_id="amazon.titan-embed-text-v2:0"
-    )
-    return embedding.embed_query(query)
-
-def pesquisa_semantica(query_embedding: List[float], top_k: int = 3) -> List[Dict[str,Any]]:
+    incrementar('chamadas_externas_total', servico='embedding')
+    return get_provedor_embeddings().embed_query(query)
+
+def pesquisa_semantica(
+    query_embedding: List[float],
+    top_k: int = 3,
+    retornar_embeddings: bool = False,
+    query_texto: Optional[str] = None
+) -> List[Dict[str,Any]]:
     """
-    Utiliza a extensão 'pgvector' do banco de dados para comparar o embedding input com os 
-    embedings do banco de dados através do cálculo de similaridade por coseno (<=>).
+    Utiliza o vector store configurado (por padrão a extensão 'pgvector' do banco de dados) para comparar o embedding input com os 
+    embedings armazenados através do cálculo de similaridade por coseno (<=> no pgvector).
+
+    Com MODO_BUSCA='hibrida' e `query_texto` informado, a busca também considera o texto completo ('tsvector')
+    e combina os dois rankings no próprio banco, em um único round trip. Nesse modo a similaridade mínima
+    é aplicada no SQL e resultados encontrados pelo texto são mantidos mesmo com similaridade vetorial baixa,
+    o que evita fallbacks para a web em queries com muitas palavras-chave.
 
     Args:
         query_embedding (List[float]): Lista com os embeddings de entrada para serem comparados com o banco de dados.
         top_k (int): Quantidade de itens a retornar (caso existam). Default: 3.
+        retornar_embeddings (bool): Se True, cada resultado inclui 'embedding' com o vetor armazenado
+            como np.ndarray float32, evitando gerar novamente o embedding do contexto.
+        query_texto (Optional[str]): Texto original da query, usado pela busca híbrida.
     Returns:
         List[Dict[str, Any]]: Lista com os resultados, vazia se não for achado nada.
     Raises:
         Exception: Caso ocorra um erro durante a query é rotornado uma lista vazia.
     """
+    try:
+        store = get_vector_store()
+        if MODO_BUSCA == 'hibrida' and query_texto:
+            return store.pesquisar_hibrida(query_embedding, query_texto, top_k, MINIMO_SIMILARIDADE, retornar_embeddings)
+        resultados = store.pesquisar(query_embedding, top_k, retornar_embeddings)
+        return [resultado for resultado in resultados if resultado["similaridade"] >= MINIMO_SIMILARIDADE]
+    except Exception as e:
+        print(f"Erro durante pesquisa semantica: {e}")
+        return []
+
+def pesquisa_semantica_lote(
+    query_embeddings: List[List[float]],
+    top_k: int = 3,
+    retornar_embeddings: bool = False,
+    queries_texto: Optional[List[str]] = None
+) -> List[List[Dict[str,Any]]]:
+    """
+    Versão em lote de `pesquisa_semantica`: no pgvector todas as queries são resolvidas em um único
+    statement (ver `PgVectorStore.pesquisar_lote`). Na busca híbrida cada query ainda faz sua própria consulta.
 
-    pgvector_query = """
-        SELECT 
-            path_origem,
-            num_pagina,
-            indice_chunk,
-            conteudo,
-            1 - (embedding <=> %s::vector) as similaridade 
-        FROM docs
-        ORDER BY embedding <=> %s::vector
-        LIMIT %s
+    Args:
+        query_embeddings (List[List[float]]): Embeddings das queries.
+        top_k (int): Quantidade de itens a retornar por query (caso existam). Default: 3.
+        retornar_embeddings (bool): Se True, cada resultado inclui 'embedding' (ver `pesquisa_semantica`).
+        queries_texto (Optional[List[str]]): Textos originais das queries, usados pela busca híbrida.
+    Returns:
+        List[List[Dict[str, Any]]]: Resultados de cada query, na ordem de entrada.
+    Raises:
+        Exception: Caso ocorra um erro durante a query é retornada uma lista vazia para cada query.
     """
+    if MODO_BUSCA == 'hibrida' and queries_texto:
+        return [
+            pesquisa_semantica(query_embedding, top_k, retornar_embeddings, query_texto)
+            for query_embedding, query_texto in zip(query_embeddings, queries_texto)
+        ]
     try:
-        cur.execute(pgvector_query,(query_embedding,query_embedding, top_k))
-        resultados = cur.fetchall()
-
-        lista_resultados = [
-            {
-                "path_origem": linha[0],
-                "num_pagina": linha[1],
-                "indice_chunk": linha[2],
-                "conteudo": linha[3],
-                "similaridade": linha[4]
-            }
-            for linha in resultados
-            if linha[4] >= MINIMO_SIMILARIDADE
+        resultados = get_vector_store().pesquisar_lote(query_embeddings, top_k, retornar_embeddings)
+        return [
+            [resultado for resultado in lista if resultado["similaridade"] >= MINIMO_SIMILARIDADE]
+            for lista in resultados
         ]
-        return lista_resultados
     except Exception as e:
-        print(f"Erro durante pesquisa semantica: {e}")
-        return []
+        print(f"Erro durante pesquisa semantica em lote: {e}")
+        return [[] for _ in query_embeddings]
 
+def similaridade_maxima(contextos_np: np.ndarray, resposta_np: np.ndarray) -> float:
+    """
+    Calcula a maior similaridade de coseno entre a resposta e os contextos.
 
-def gerar_resposta(query:str, contextos: List[Dict[str,Any]], usou_web:bool = False):
+    Args:
+        contextos_np (np.ndarray): Matriz (n_contextos, dim) com os embeddings dos contextos.
+        resposta_np (np.ndarray): Vetor (dim,) com o embedding da resposta.
+    Returns:
+        float: Similaridade de coseno máxima.
     """
-    Utiliza a query em conjunto com os contextos para gerar uma resposta do modelo através do Prompt gerado.
-    Não gera a resposta em sí, a função 'get_resposta_modelo' que interage com a API para obter a resposta da LLM.
+    # Calcular similaridade de coseno manualmente ao inves de criar tabela temporaria
+    # e usar a capacidade do pgvector para isso. 
+    produto = contextos_np @ resposta_np
+    magnitude_cont = np.linalg.norm(contextos_np,axis=1) #axis e 1 para realizar o calculo de cada vetor ao inves da matriz
+    magnitude_res = np.linalg.norm(resposta_np)
+    return float(np.max(produto / (magnitude_cont*magnitude_res)))
+
+
+def montar_prompt_resposta(query: str, contextos: List[Dict[str,Any]]) -> str:
+    """
+    Monta o prompt de resposta com a query do usuário e os contextos (documentos e/ou web).
+    Os contextos passam por `contexto.montar_contexto`: chunks vizinhos são mesclados sem o texto repetido
+    pela sobreposição, quase duplicados são descartados e o total respeita CONTEXTO_MAX_TOKENS.
 
     Args:
         query (str): string a ser usada como query do usuário.
         contextos (List[Dict[str,Any]]): lista com os contextos a serem apresentados para a LLM. 
-        usou_web (bool): booleana para definir se foi usado web ou não para obter os contextos. 
     Returns:
-        resposta (str): resposta da LLM.
+        str: Prompt a ser passado para a LLM.
     """
     info_contextos = ""
-    for contexto in contextos:
+    for contexto in montar_contexto(contextos):
         if 'link' not in contexto.keys(): # link so existe se pesquisou na web 
-            info_contextos += f"\nOrigem: {contexto['path_origem']}, pag: {contexto['num_pagina'] or 'Sem pagina'}, chunk: {contexto['indice_chunk']}\nConteudo:\n{contexto['conteudo']}" 
+            chunks = contexto['indice_chunk']
+            if contexto['indice_chunk_fim'] != contexto['indice_chunk']:
+                chunks = f"{contexto['indice_chunk']}-{contexto['indice_chunk_fim']}"
+            info_contextos += f"\nOrigem: {contexto['path_origem']}, pag: {contexto['num_pagina'] or 'Sem pagina'}, chunk: {chunks}\nConteudo:\n{contexto['conteudo']}" 
 
         else: 
             info_contextos += f"\nLink: {contexto['link']}, titulo: {contexto['title']} \nSnippet:\n{contexto['snippet']}" 
             
+    from langchain.prompts import PromptTemplate
 
     template_prompt = PromptTemplate(
         input_variables = ['query','contexto'],
@@ -120,11 +178,39 @@ def gerar_resposta(query:str, contextos: List[Dict[str,Any]], usou_web:bool = Fa
         """
     )
 
-    prompt = template_prompt.format(query=query,contexto=info_contextos) 
+    return template_prompt.format(query=query,contexto=info_contextos) 
+
+def gerar_resposta(query:str, contextos: List[Dict[str,Any]], usou_web:bool = False):
+    """
+    Utiliza a query em conjunto com os contextos para gerar uma resposta do modelo através do Prompt gerado.
+    Não gera a resposta em sí, a função 'get_resposta_modelo' que interage com a API para obter a resposta da LLM.
+
+    Args:
+        query (str): string a ser usada como query do usuário.
+        contextos (List[Dict[str,Any]]): lista com os contextos a serem apresentados para a LLM. 
+        usou_web (bool): booleana para definir se foi usado web ou não para obter os contextos. 
+    Returns:
+        resposta (str): resposta da LLM.
+    """
+    prompt = montar_prompt_resposta(query, contextos)
     resposta = get_resposta_modelo(prompt)
 
     return resposta 
 
+def gerar_resposta_stream(query:str, contextos: List[Dict[str,Any]], usou_web:bool = False) -> Iterator[str]:
+    """
+    Versão em streaming de `gerar_resposta`, produz os trechos da resposta conforme chegam da API.
+
+    Args:
+        query (str): string a ser usada como query do usuário.
+        contextos (List[Dict[str,Any]]): lista com os contextos a serem apresentados para a LLM. 
+        usou_web (bool): booleana para definir se foi usado web ou não para obter os contextos. 
+    Yields:
+        str: Trechos da resposta da LLM.
+    """
+    prompt = montar_prompt_resposta(query, contextos)
+    yield from get_resposta_modelo_stream(prompt)
+
 def otimizar_prompt_web(user_query: str) -> PromptTemplate:
     """
     Função feita para os fall backs para web, com o intuito de criar um prompt 
@@ -135,6 +221,8 @@ def otimizar_prompt_web(user_query: str) -> PromptTemplate:
     Returns:
         PromptTemplate: Prompt a ser passado para a LLM.
     """
+    from langchain.prompts import PromptTemplate
+
     template_prompt = PromptTemplate(
         input_variables = ['query','contexto'],
         template= """
@@ -169,8 +257,8 @@ def get_resposta_modelo(prompt: PromptTemplate):
         Exception: Caso ocorra um erro durante a chamada da API é printado uma mensagem de erro
         e retorna uma string vazia.
     """
-    client = boto3.client("bedrock-runtime")
-    model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+    incrementar('chamadas_externas_total', servico='llm')
+    client = get_cliente("bedrock-runtime")
     conversa = [
         {
             "role": "user",
@@ -180,9 +268,9 @@ def get_resposta_modelo(prompt: PromptTemplate):
 
     try:
         response = client.converse(
-            modelId=model_id,
+            modelId=LLM_MODEL_ID,
             messages=conversa,
-            inferenceConfig={"maxTokens": 512, "temperature": 0.5, "topP": 0.9},
+            inferenceConfig=CONFIG_INFERENCIA,
         )
         response_text = response["output"]["message"]["content"][0]["text"]
         return response_text 
@@ -190,6 +278,40 @@ def get_resposta_modelo(prompt: PromptTemplate):
         print(f"Um erro aconteceu durante criacao da resposta: {e}")
         return ""
 
+def get_resposta_modelo_stream(prompt: str) -> Iterator[str]:
+    """
+    Versão em streaming de `get_resposta_modelo`, utiliza a API converse_stream do Bedrock
+    para produzir os trechos de texto assim que o modelo os gera.
+
+    Args:
+        prompt (str): prompt a ser passado para a LLM.
+    Yields:
+        str: Trechos de texto da resposta.
+    Raises:
+        Exception: Caso ocorra um erro durante a chamada da API é printado uma mensagem de erro
+        e o stream é encerrado.
+    """
+    incrementar('chamadas_externas_total', servico='llm')
+    client = get_cliente("bedrock-runtime")
+    conversa = [
+        {
+            "role": "user",
+            "content": [{"text": prompt}],
+        }
+    ]
+
+    try:
+        response = client.converse_stream(
+            modelId=LLM_MODEL_ID,
+            messages=conversa,
+            inferenceConfig=CONFIG_INFERENCIA,
+        )
+        for evento in response["stream"]:
+            if "contentBlockDelta" in evento:
+                yield evento["contentBlockDelta"]["delta"].get("text", "")
+    except Exception as e:
+        print(f"Um erro aconteceu durante criacao da resposta: {e}")
+
 
         
 def buscar_na_web(query:str):
@@ -208,61 +330,299 @@ def buscar_na_web(query:str):
     Returns:
         List[Dict[str,str]]: Retorna uma lista de dicionários com as informações da pesquisa(snippet, link, etc)  
     """
+    incrementar('chamadas_externas_total', servico='web')
+    from langchain_community.tools import DuckDuckGoSearchResults
+
     search = DuckDuckGoSearchResults(output_format="list")
     return search.invoke(query)
 
 
-def processar_query(query:str, top_k: int = 5, min_similaridade_res=0.6):
+def pesquisar_web(
+    query: str,
+    query_embedding: Optional[List[float]] = None,
+    rastro: Optional[Rastro] = None
+) -> List[Dict[str,Any]]:
     """
-    Função principal que junta todas as funcionalidades, desde a obtenção de embeddings até gerar as respostas e fallbacks.
+    Fallback para a web: reescreve a query com a LLM e pesquisa no DuckDuckGo. Pesquisas de queries
+    repetidas (ou parecidas, ver `cache_web`) vêm do cache sem nenhuma chamada externa.
+
+    Args:
+        query (str): query do usuário.
+        query_embedding (Optional[List[float]]): Embedding da query, para reaproveitar pesquisas de queries parecidas.
+        rastro (Optional[Rastro]): Rastro da query para os spans das etapas.
+    Returns:
+        List[Dict[str,str]]: Resultados da pesquisa (ver `buscar_na_web`).
+    """
+    with span("cache_web", rastro=rastro):
+        em_cache = buscar_cache_web(query, query_embedding)
+    if em_cache is not None:
+        return em_cache["resultados"]
+    with span("reescrita_web", rastro=rastro):
+        query_web = get_resposta_modelo(otimizar_prompt_web(query))
+    with span("web", rastro=rastro):
+        resultados = buscar_na_web(query_web)
+    salvar_cache_web(query, query_web, resultados, query_embedding)
+    return resultados
+
+
+def processar_query_stream(query:str, top_k: int = 5, min_similaridade_res=0.6) -> Iterator[Tuple[str, Any]]:
+    """
+    Versão em streaming de `processar_query`, a resposta é produzida conforme chega da LLM, reduzindo
+    o tempo até o primeiro token. A verificação da resposta com os contextos é feita sobre o texto acumulado
+    após o fim do stream.
+
+    Eventos produzidos (tuplas (tipo, valor)):
+        ("token", str): Trecho da resposta.
+        ("reiniciar", None): A resposta anterior foi considerada insuficiente e uma nova, com contextos da web, começará.
+        ("fim", Dict[str,Any]): Resultado final com 'resposta', 'contextos', 'usou_web', 'usou_web_e_docs'
+            'tempo_primeiro_token' (segundos desde o início da query) e 'etapas' (segundos gastos em cada etapa,
+            também registrados nos histogramas de `metricas`).
+
     Args:
         query (str): query do usuário.
         top_k (int): máximo de valores a retornar da busca por similaridade semantica.
         min_similaridade_res (float): Minimo de similaridade aceita da resposta do modelo.
-    Returns:
-        resposta (str): Resposta do modelo.
-        contextos (List[Dict[str,Any]]): Lista de dicionários com todos os contextos utilizados para a resposta.
-        usou_web (bool): Se usou a web a priori ou não.
-        usou_web_e_docs (bool): se precisou usar a web após gerar a primeira resposta.
+    Yields:
+        Tuple[str, Any]: Eventos descritos acima.
     """
-    query_embedding = get_query_embedding(query)
-    contextos = pesquisa_semantica(query_embedding,top_k) 
+    inicio = time.perf_counter()
+    tempo_primeiro_token = None
+    rastro = Rastro()
+    incrementar('queries_total')
+
+    with span("embedding", rastro=rastro):
+        query_embedding = get_query_embedding(query)
+    with span("pesquisa", rastro=rastro):
+        contextos = pesquisa_semantica(query_embedding,top_k,retornar_embeddings=True,query_texto=query) 
     usou_web = False
     usou_web_e_docs = False
     if not contextos:
         print("Nao foi encontrado um contexto no(s) texto(s), pesquisando na web...")
+        incrementar('fallback_web_total', motivo='sem_contexto')
         usou_web = True
-        query_web = get_resposta_modelo(otimizar_prompt_web(query))
-        contextos = buscar_na_web(query_web)
+        contextos = pesquisar_web(query, query_embedding, rastro)
 
-    resposta = gerar_resposta(query,contextos,usou_web)
+    resposta = ""
+    with span("geracao", rastro=rastro):
+        for trecho in gerar_resposta_stream(query,contextos,usou_web):
+            if tempo_primeiro_token is None:
+                tempo_primeiro_token = time.perf_counter() - inicio
+            resposta += trecho
+            yield "token", trecho
 
     # Comparar a respota com os contextos existentes.
     # Caso ja tenha pesquisado na internet, nao fara nada.
     # porem, caso tenha contexto apenas dos docs e eles sejam considerados nao suficientes
     # adicionara contextos da web.
     if not usou_web:
-        contextos_embeddings = [get_query_embedding(contexto['conteudo']) for contexto in contextos]
-        resposta_embeddings = get_query_embedding(resposta)
-        # Calcular similaridade de coseno manualmente ao inves de criar tabela temporaria
-        # e usar a capacidade do pgvector para isso. 
-        contextos_np = np.array(contextos_embeddings)
-        resposta_np = np.array(resposta_embeddings)
-        produto = np.dot(contextos_np,resposta_np)
-
-        magnitude_cont = np.linalg.norm(contextos_np,axis=1) #axis e 1 para realizar o calculo de cada vetor ao inves da matriz
-        magnitude_res = np.linalg.norm(resposta_np)
-
-        similaridade = np.max(produto / (magnitude_cont*magnitude_res))
+        # Os embeddings dos contextos vêm do próprio pgvector, só a resposta precisa de uma chamada ao Bedrock.
+        with span("verificacao", rastro=rastro):
+            contextos_np = np.stack([contexto['embedding'] for contexto in contextos])
+            resposta_np = np.asarray(get_query_embedding(resposta), dtype=np.float32)
+            similaridade = similaridade_maxima(contextos_np, resposta_np)
         if similaridade < min_similaridade_res:
-            query_para_web_otimizada = get_resposta_modelo(otimizar_prompt_web(query))
-            contextos += buscar_na_web(query_para_web_otimizada)
+            incrementar('fallback_web_total', motivo='verificacao')
+            contextos += pesquisar_web(query, query_embedding, rastro)
             usou_web_e_docs = True
-            resposta = gerar_resposta(query,contextos,usou_web)
-    print(resposta)
-    return resposta, contextos, usou_web, usou_web_e_docs 
+            yield "reiniciar", None
+            resposta = ""
+            with span("geracao_web", rastro=rastro):
+                for trecho in gerar_resposta_stream(query,contextos,usou_web):
+                    resposta += trecho
+                    yield "token", trecho
+
+    if tempo_primeiro_token is not None:
+        print(f"Tempo ate o primeiro token: {tempo_primeiro_token:.2f}s")
+    total = time.perf_counter() - inicio
+    observar('query_duracao_segundos', total, usou_web=usou_web or usou_web_e_docs)
+    yield "fim", {
+        "resposta": resposta,
+        "contextos": contextos,
+        "usou_web": usou_web,
+        "usou_web_e_docs": usou_web_e_docs,
+        "tempo_primeiro_token": tempo_primeiro_token,
+        "etapas": {**rastro.resumo(), "total": total},
+    }
+
+def processar_query(query:str, top_k: int = 5, min_similaridade_res=0.6):
+    """
+    Função principal que junta todas as funcionalidades, desde a obtenção de embeddings até gerar as respostas e fallbacks.
+    Consome `processar_query_stream` e retorna apenas o resultado final.
+
+    Args:
+        query (str): query do usuário.
+        top_k (int): máximo de valores a retornar da busca por similaridade semantica.
+        min_similaridade_res (float): Minimo de similaridade aceita da resposta do modelo.
+    Returns:
+        resposta (str): Resposta do modelo.
+        contextos (List[Dict[str,Any]]): Lista de dicionários com todos os contextos utilizados para a resposta.
+        usou_web (bool): Se usou a web a priori ou não.
+        usou_web_e_docs (bool): se precisou usar a web após gerar a primeira resposta.
+    """
+    for evento, valor in processar_query_stream(query, top_k, min_similaridade_res):
+        if evento == "fim":
+            resultado = valor
+    print(resultado["resposta"])
+    return resultado["resposta"], resultado["contextos"], resultado["usou_web"], resultado["usou_web_e_docs"] 
     
+def _responder_com_web(
+    query: str,
+    contextos: List[Dict[str,Any]],
+    query_embedding: Optional[List[float]] = None
+) -> Tuple[str, List[Dict[str,Any]]]:
+    """
+    Pesquisa na web (ver `pesquisar_web`) e gera a resposta com os contextos da web adicionados aos existentes.
+    """
+    contextos = contextos + pesquisar_web(query, query_embedding)
+    return gerar_resposta(query, contextos, True), contextos
+
+def processar_queries(
+    queries: List[str],
+    top_k: int = 5,
+    min_similaridade_res: float = 0.6,
+    max_concorrencia: int = LLM_CONCORRENCIA
+) -> List[Dict[str,Any]]:
+    """
+    Versão em lote de `processar_query`, para avaliar muitas perguntas de uma vez (ex: arquivos de avaliação).
+    O fluxo de cada query é o mesmo, mas as etapas são executadas para o lote inteiro:
+        1. Embeddings de todas as queries em paralelo (`gerar_embeddings`).
+        2. Busca de todas as queries em um único round trip (`pesquisa_semantica_lote`).
+        3. Respostas (e web, para queries sem contexto) com até `max_concorrencia` chamadas simultâneas.
+        4. Embeddings de todas as respostas de uma vez para a verificação.
+        5. Fallback para a web das respostas consideradas insuficientes, também concorrente.
+
+    Args:
+        queries (List[str]): queries do usuário.
+        top_k (int): máximo de valores a retornar da busca por similaridade semantica.
+        min_similaridade_res (float): Minimo de similaridade aceita da resposta do modelo.
+        max_concorrencia (int): Máximo de chamadas simultâneas à LLM/web. Default: LLM_CONCORRENCIA ou 8.
+    Returns:
+        List[Dict[str,Any]]: Resultado de cada query, na ordem de entrada, com 'query', 'resposta', 'contextos',
+            'usou_web' e 'usou_web_e_docs' (mesmos valores de `processar_query`) e 'erro' (None, ou a etapa e a
+            mensagem do erro que impediu a resposta ou o complemento com a web; as demais queries continuam).
+    """
+    if not queries:
+        return []
+    incrementar('queries_total', len(queries))
+
+    with span("embedding", pipeline='lote'):
+        incrementar('chamadas_externas_total', len(queries), servico='embedding')
+        query_embeddings = gerar_embeddings(queries)
+    with span("pesquisa", pipeline='lote'):
+        contextos_lote = pesquisa_semantica_lote(query_embeddings, top_k, retornar_embeddings=True, queries_texto=queries)
+
+    resultados = [
+        {
+            "query": query, "resposta": "", "contextos": contextos, "usou_web": not contextos,
+            "usou_web_e_docs": False, "erro": None
+        }
+        for query, contextos in zip(queries, contextos_lote)
+    ]
+    incrementar('fallback_web_total', sum(resultado["usou_web"] for resultado in resultados), motivo='sem_contexto')
+
+    # Erros de uma query (ex: limite de requisições do DuckDuckGo, throttling do Bedrock) ficam no campo 'erro'
+    # do seu resultado, sem interromper o lote.
+    def _registrar_erro(resultado: Dict[str,Any], etapa: str, erro: Exception) -> None:
+        resultado["erro"] = f"{etapa}: {erro}"
+        incrementar('etapa_erros_total', pipeline='lote', etapa=etapa)
+
+    def _primeira_resposta(resultado: Dict[str,Any], query_embedding: np.ndarray) -> None:
+        try:
+            if resultado["usou_web"]:
+                resultado["resposta"], resultado["contextos"] = _responder_com_web(resultado["query"], [], query_embedding)
+            else:
+                resultado["resposta"] = gerar_resposta(resultado["query"], resultado["contextos"])
+        except Exception as e:
+            _registrar_erro(resultado, 'geracao', e)
+
+    def _fallback_web(resultado: Dict[str,Any], query_embedding: np.ndarray) -> None:
+        try:
+            resultado["resposta"], resultado["contextos"] = _responder_com_web(
+                resultado["query"], resultado["contextos"], query_embedding
+            )
+        except Exception as e:
+            # A resposta apenas com os documentos é mantida.
+            _registrar_erro(resultado, 'geracao_web', e)
+            return
+        resultado["usou_web_e_docs"] = True
+
+    def _embeddings_respostas(indices: List[int]) -> Dict[int, np.ndarray]:
+        # Em lote e, se o lote falhar, uma resposta por vez para perder apenas as que falharem.
+        try:
+            return dict(zip(indices, gerar_embeddings([resultados[i]["resposta"] for i in indices])))
+        except Exception as e:
+            print(f"Erro nos embeddings das respostas em lote, gerando individualmente: {e}")
+        embeddings_respostas = {}
+        for i in indices:
+            try:
+                embeddings_respostas[i] = gerar_embeddings([resultados[i]["resposta"]])[0]
+            except Exception as e:
+                _registrar_erro(resultados[i], 'verificacao', e)
+        return embeddings_respostas
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concorrencia)) as executor:
+        with span("geracao", pipeline='lote'):
+            list(executor.map(_primeira_resposta, resultados, query_embeddings))
+
+        # Verificação das respostas que usaram apenas os documentos, com os embeddings gerados em lote.
+        com_docs = [i for i, resultado in enumerate(resultados) if not resultado["usou_web"] and resultado["erro"] is None]
+        # Respostas vazias não precisam de embedding, são insuficientes.
+        insuficientes = [i for i in com_docs if not resultados[i]["resposta"].strip()]
+        a_verificar = [i for i in com_docs if resultados[i]["resposta"].strip()]
+        if a_verificar:
+            with span("verificacao", pipeline='lote'):
+                incrementar('chamadas_externas_total', len(a_verificar), servico='embedding')
+                for i, resposta_np in _embeddings_respostas(a_verificar).items():
+                    contextos_np = np.stack([contexto['embedding'] for contexto in resultados[i]["contextos"]])
+                    if similaridade_maxima(contextos_np, resposta_np) < min_similaridade_res:
+                        insuficientes.append(i)
+        insuficientes.sort()
+        incrementar('fallback_web_total', len(insuficientes), motivo='verificacao')
+
+        with span("geracao_web", pipeline='lote'):
+            list(executor.map(
+                _fallback_web,
+                [resultados[i] for i in insuficientes],
+                [query_embeddings[i] for i in insuficientes]
+            ))
+
+    erros = sum(resultado["erro"] is not None for resultado in resultados)
+    print(f"{len(queries)} queries processadas, {len(insuficientes)} complementadas com a web, {erros} com erro.")
+    return resultados
+
+
 if __name__ == "__main__":
-    print("Realiza teste.")
-    #resposta, _, _, _ = processar_query("O que é um processo fonatorio?")
-    #print(resposta)
+    parser = argparse.ArgumentParser(description="Responde em lote as perguntas de um arquivo (uma por linha, ou JSONL com o campo 'query').")
+    parser.add_argument('entrada', help="Arquivo com as perguntas.")
+    parser.add_argument('--saida', default=None, help="Arquivo JSONL com as respostas, padrão é a saída padrão.")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--concorrencia', type=int, default=LLM_CONCORRENCIA, help="Chamadas simultâneas à LLM/web.")
+    args = parser.parse_args()
+
+    with open(args.entrada, encoding='utf-8') as f:
+        linhas = [linha.strip() for linha in f if linha.strip()]
+    if args.entrada.endswith('.jsonl'):
+        linhas = [json.loads(linha)['query'] for linha in linhas]
+
+    inicio = time.perf_counter()
+    resultados = processar_queries(linhas, args.top_k, max_concorrencia=args.concorrencia)
+    print(f"Tempo total: {time.perf_counter() - inicio:.2f}s")
+
+    saida = [
+        {
+            "query": resultado["query"],
+            "resposta": resultado["resposta"],
+            "usou_web": resultado["usou_web"],
+            "usou_web_e_docs": resultado["usou_web_e_docs"],
+            "erro": resultado["erro"],
+            "fontes": [contexto.get('link') or contexto.get('path_origem') for contexto in resultado["contextos"]],
+        }
+        for resultado in resultados
+    ]
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            for item in saida:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    else:
+        for item in saida:
+            print(json.dumps(item, ensure_ascii=False))
@@ -0,0 +1,1126 @@
+import io
+import json
+import os
+import struct
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: sem trava entre processos, apenas um processo pode escrever no índice local.
+    fcntl = None
+
+from chunk_batch import ChunkBatch
+from db_utils import conexao
+from embeddings import get_provedor_embeddings
+from metricas import span
+
+# Backend utilizado por pesquisa_semantica/armazenar_db: 'pgvector' (padrão) ou 'local'.
+VECTOR_STORE = os.getenv('VECTOR_STORE', 'pgvector')
+LOCAL_STORE_PATH = os.getenv('LOCAL_STORE_PATH', 'data/indice_local')
+# float16 reduz o arquivo pela metade, os scores continuam sendo calculados em float32.
+LOCAL_STORE_DTYPE = os.getenv('LOCAL_STORE_DTYPE', 'float32')
+# Quantidade de listas do IVF consultadas por query, mais listas = mais recall e mais latência.
+LOCAL_STORE_NPROBE = int(os.getenv('LOCAL_STORE_NPROBE', '8'))
+# Fração de linhas removidas (tombstones) a partir da qual o índice local é compactado ao ser aberto, 0 desativa.
+LOCAL_STORE_COMPACTAR = float(os.getenv('LOCAL_STORE_COMPACTAR', '0.3'))
+# Geração de candidatos no pgvector: 'nenhuma' (índice HNSW de precisão total, um estágio),
+# 'halfvec' (float16) ou 'binario' (1 bit por dimensão). Os modos quantizados exigem os índices de
+# migrations/001_embedding_quantizado.sql e reordenam os candidatos com os vetores de precisão total.
+PGVECTOR_QUANTIZACAO = os.getenv('PGVECTOR_QUANTIZACAO', 'nenhuma')
+# Candidatos buscados no índice quantizado por resultado final (top_k * fator), limitados a HNSW_EF_SEARCH_MAXIMO.
+PGVECTOR_FATOR_CANDIDATOS = int(os.getenv('PGVECTOR_FATOR_CANDIDATOS', '10'))
+# Maior valor aceito pelo pgvector para hnsw.ef_search, o HNSW não retorna mais candidatos que isso.
+HNSW_EF_SEARCH_MAXIMO = 1000
+# Constante k do reciprocal rank fusion: score = soma de 1 / (k + posição) em cada lista.
+RRF_K = int(os.getenv('RRF_K', '60'))
+# Dimensão da coluna 'embedding' de 'docs'. Modelos menores (ex: provedor local) são completados com zeros,
+# o que não altera a similaridade de coseno, a dimensão real fica na coluna 'dimensao'.
+DIMENSAO_COLUNA = 1024
+# Linhas multiplicadas por bloco na busca exata, limita a memória temporária da conversão float16->float32.
+TAMANHO_BLOCO = 65536
+# Queries comparadas com cada bloco da matriz em `LocalVectorStore.pesquisar_lote`.
+QUERIES_POR_BLOCO = 64
+
+
+class VectorStore(ABC):
+    """
+    Interface dos backends de armazenamento/pesquisa de embeddings.
+
+    Os chunks seguem o formato de `dados_chunk` do pré-processamento (path_origem, pag, indice_chunk,
+    conteudo, embedding, modtempo), em lista de dicionários ou `ChunkBatch`, e os resultados de pesquisa
+    o formato de `pesquisa_semantica`.
+    """
+
+    @abstractmethod
+    def pesquisar(self, query_embedding: List[float], top_k: int, retornar_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """
+        Retorna os top_k chunks mais similares (coseno) ao embedding, do mais para o menos similar.
+        O filtro de similaridade mínima é responsabilidade de quem chama.
+        """
+
+    def pesquisar_lote(
+        self,
+        query_embeddings: Sequence[List[float]],
+        top_k: int,
+        retornar_embeddings: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        `pesquisar` para várias queries, retorna uma lista de resultados por query, na ordem de entrada.
+        Backends que conseguem resolver todas as queries de uma vez sobrescrevem este método.
+        """
+        return [self.pesquisar(query_embedding, top_k, retornar_embeddings) for query_embedding in query_embeddings]
+
+    def pesquisar_hibrida(
+        self,
+        query_embedding: List[float],
+        query_texto: str,
+        top_k: int,
+        minimo_similaridade: float,
+        retornar_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca híbrida (texto completo + vetorial). O filtro de similaridade mínima é aplicado aqui,
+        já que resultados do texto completo podem ter similaridade vetorial baixa e ainda serem relevantes.
+        Backends sem índice textual fazem apenas a busca vetorial.
+        """
+        resultados = self.pesquisar(query_embedding, top_k, retornar_embeddings)
+        return [resultado for resultado in resultados if resultado["similaridade"] >= minimo_similaridade]
+
+    @abstractmethod
+    def armazenar(self, chunks: List[Dict[str, Any]], usar_copy: bool = True, remover_orfaos: bool = True) -> None:
+        """
+        Insere/atualiza os chunks, opcionalmente removendo antes os órfãos dos mesmos arquivos.
+        """
+
+    @abstractmethod
+    def remover_orfaos(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Remove os chunks armazenados dos arquivos presentes em `chunks` cuja chave não está em `chunks`.
+        """
+
+    @abstractmethod
+    def remover_arquivos(self, paths: List[str]) -> int:
+        """
+        Remove todos os chunks dos arquivos informados (ex: arquivos apagados do diretório de dados).
+        """
+
+
+# Colunas comparadas para decidir se um chunk já armazenado mudou e precisa ser reescrito, o mesmo critério
+# nos dois backends (SQL_CONFLITO_DOCS e LocalVectorStore.armazenar). O model_id muda na reingestão com outro
+# modelo de embedding, uma mudança apenas no modtempo não reescreve o chunk.
+COLUNAS_CHUNK_ALTERADO = ('conteudo', 'embedding', 'model_id')
+
+# Cláusula compartilhada entre a inserção linha a linha e a inserção em lote (COPY),
+# atualiza o chunk existente apenas se ele mudou.
+SQL_CONFLITO_DOCS = """
+    ON CONFLICT (path_origem, num_pagina, indice_chunk) DO UPDATE
+    SET
+        conteudo = EXCLUDED.conteudo, -- EXCLUDED é uma tabela com os valores que iriam entrar mas que foram barrados.
+        embedding = EXCLUDED.embedding,
+        modtempo = EXCLUDED.modtempo,
+        model_id = EXCLUDED.model_id,
+        dimensao = EXCLUDED.dimensao
+    WHERE
+        """ + " OR\n        ".join(f"docs.{coluna} IS DISTINCT FROM EXCLUDED.{coluna}" for coluna in COLUNAS_CHUNK_ALTERADO) + "\n"
+
+
+def chunk_alterado(atual: Dict[str, Any], novo: Dict[str, Any]) -> bool:
+    """
+    Critério de SQL_CONFLITO_DOCS em Python: True se alguma coluna de COLUNAS_CHUNK_ALTERADO difere
+    (IS DISTINCT FROM, dois valores None são iguais).
+    """
+    for coluna in COLUNAS_CHUNK_ALTERADO:
+        valor_atual, valor_novo = atual.get(coluna), novo.get(coluna)
+        if isinstance(valor_atual, np.ndarray) or isinstance(valor_novo, np.ndarray):
+            if valor_atual is None or valor_novo is None or not np.array_equal(valor_atual, valor_novo):
+                return True
+        elif valor_atual != valor_novo:
+            return True
+    return False
+
+
+# Expressões de distância usadas para gerar candidatos em cada modo de quantização.
+# Precisam ser idênticas às expressões dos índices para o PostgreSQL utilizá-los.
+ORDENACAO_QUANTIZADA = {
+    'halfvec': "embedding::halfvec(1024) <=> %(query)s::vector::halfvec(1024)",
+    'binario': "binary_quantize(embedding)::bit(1024) <~> binary_quantize(%(query)s::vector)",
+}
+
+
+class PgVectorStore(VectorStore):
+    """
+    Backend PostgreSQL + pgvector (tabela 'docs' do init.sql).
+
+    Com quantização, a busca é feita em dois estágios: o índice HNSW compacto (halfvec ou binário)
+    gera top_k * fator_candidatos candidatos (no máximo HNSW_EF_SEARCH_MAXIMO) e eles são reordenados pela distância de coseno
+    com o embedding de precisão total, recuperando o recall perdido na quantização.
+
+    Cada linha guarda o modelo e a dimensão do seu embedding (ver migrations/003_modelo_embedding.sql),
+    as pesquisas consideram apenas as linhas do modelo `model_id`.
+    """
+
+    def __init__(
+        self,
+        quantizacao: str = PGVECTOR_QUANTIZACAO,
+        fator_candidatos: int = PGVECTOR_FATOR_CANDIDATOS,
+        model_id: Optional[str] = None
+    ):
+        if quantizacao != 'nenhuma' and quantizacao not in ORDENACAO_QUANTIZADA:
+            raise ValueError(f"Quantização {quantizacao} não é suportada.")
+        self.quantizacao = quantizacao
+        self.fator_candidatos = fator_candidatos
+        self.model_id = model_id or get_provedor_embeddings().model_id
+
+    def _candidatos(self, top_k: int) -> int:
+        return min(HNSW_EF_SEARCH_MAXIMO, top_k * self.fator_candidatos)
+
+    @staticmethod
+    def _configurar_ef_search(cur, candidatos: int) -> None:
+        # O HNSW retorna no máximo ef_search itens (padrão 40), precisa cobrir todos os candidatos,
+        # e o pgvector rejeita valores acima de 1000.
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(min(HNSW_EF_SEARCH_MAXIMO, max(40, candidatos))),))
+
+    def pesquisar(self, query_embedding: List[float], top_k: int, retornar_embeddings: bool = False) -> List[Dict[str, Any]]:
+        colunas = f"""
+            path_origem,
+            num_pagina,
+            indice_chunk,
+            conteudo,
+            1 - (embedding <=> %(query)s::vector) as similaridade
+            {", subvector(embedding, 1, dimensao)::text" if retornar_embeddings else ""}
+        """
+        if self.quantizacao == 'nenhuma':
+            pgvector_query = f"""
+                SELECT {colunas}
+                FROM docs
+                WHERE model_id = %(model_id)s
+                ORDER BY embedding <=> %(query)s::vector
+                LIMIT %(top_k)s
+            """
+        else:
+            pgvector_query = f"""
+                SELECT {colunas}
+                FROM (
+                    SELECT *
+                    FROM docs
+                    WHERE model_id = %(model_id)s
+                    ORDER BY {ORDENACAO_QUANTIZADA[self.quantizacao]}
+                    LIMIT %(candidatos)s
+                ) candidatos
+                ORDER BY embedding <=> %(query)s::vector
+                LIMIT %(top_k)s
+            """
+        parametros = {
+            "query": completar_dimensao(query_embedding),
+            "model_id": self.model_id,
+            "top_k": top_k,
+            "candidatos": self._candidatos(top_k),
+        }
+        # Cada chamada empresta sua própria conexão do pool, consultas simultâneas não disputam um cursor global.
+        with conexao() as conn, conn.cursor() as cur:
+            if self.quantizacao != 'nenhuma':
+                self._configurar_ef_search(cur, parametros["candidatos"])
+            cur.execute(pgvector_query, parametros)
+            resultados = cur.fetchall()
+
+        return self._converter_linhas(resultados, retornar_embeddings)
+
+    def pesquisar_lote(
+        self,
+        query_embeddings: Sequence[List[float]],
+        top_k: int,
+        retornar_embeddings: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Pesquisa todas as queries em um único statement e round trip: os embeddings são expandidos com
+        unnest e cada um faz sua própria busca no HNSW através de um JOIN LATERAL.
+        """
+        if len(query_embeddings) == 0:
+            return []
+        if self.quantizacao == 'nenhuma':
+            busca = """
+                SELECT *
+                FROM docs d
+                WHERE d.model_id = %(model_id)s
+                ORDER BY d.embedding <=> q.embedding
+                LIMIT %(top_k)s
+            """
+        else:
+            # Mesma expressão do índice quantizado, agora com o embedding de cada linha do unnest.
+            ordenacao = ORDENACAO_QUANTIZADA[self.quantizacao].replace("%(query)s::vector", "q.embedding")
+            busca = f"""
+                SELECT *
+                FROM (
+                    SELECT *
+                    FROM docs
+                    WHERE model_id = %(model_id)s
+                    ORDER BY {ordenacao}
+                    LIMIT %(candidatos)s
+                ) candidatos
+                ORDER BY embedding <=> q.embedding
+                LIMIT %(top_k)s
+            """
+        pgvector_query = f"""
+            SELECT
+                q.ordem,
+                r.path_origem,
+                r.num_pagina,
+                r.indice_chunk,
+                r.conteudo,
+                1 - (r.embedding <=> q.embedding) as similaridade
+                {", subvector(r.embedding, 1, r.dimensao)::text" if retornar_embeddings else ""}
+            FROM (
+                SELECT texto::vector AS embedding, ordem
+                FROM unnest(%(queries)s::text[]) WITH ORDINALITY AS t(texto, ordem)
+            ) q
+            CROSS JOIN LATERAL ({busca}) r
+            ORDER BY q.ordem, r.embedding <=> q.embedding
+        """
+        parametros = {
+            # Texto no formato do pgvector ('[x,y,...]'), convertido para vector dentro do SQL.
+            "queries": ['[' + ','.join(map(repr, completar_dimensao(embedding))) + ']' for embedding in query_embeddings],
+            "model_id": self.model_id,
+            "top_k": top_k,
+            "candidatos": self._candidatos(top_k),
+        }
+        with conexao() as conn, conn.cursor() as cur:
+            if self.quantizacao != 'nenhuma':
+                self._configurar_ef_search(cur, parametros["candidatos"])
+            cur.execute(pgvector_query, parametros)
+            linhas = cur.fetchall()
+
+        resultados: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for linha, resultado in zip(linhas, self._converter_linhas([linha[1:] for linha in linhas], retornar_embeddings)):
+            resultados[linha[0] - 1].append(resultado) # WITH ORDINALITY começa em 1.
+        return resultados
+
+    def pesquisar_hibrida(
+        self,
+        query_embedding: List[float],
+        query_texto: str,
+        top_k: int,
+        minimo_similaridade: float,
+        retornar_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca híbrida em um único statement: candidatos do HNSW (ou do índice quantizado) e do índice GIN
+        de texto completo ('conteudo_tsv', ver migrations/002_busca_hibrida.sql) são combinados por
+        reciprocal rank fusion. Candidatos apenas vetoriais abaixo da similaridade mínima são descartados
+        no próprio SQL, candidatos do texto completo são mantidos mesmo com similaridade vetorial baixa.
+        """
+        ordenacao = ORDENACAO_QUANTIZADA.get(self.quantizacao, "embedding <=> %(query)s::vector")
+        pgvector_query = f"""
+            WITH vetorial AS (
+                SELECT id, row_number() OVER (ORDER BY distancia) AS posicao
+                FROM (
+                    SELECT id, {ordenacao} AS distancia
+                    FROM docs
+                    WHERE model_id = %(model_id)s
+                    ORDER BY {ordenacao}
+                    LIMIT %(candidatos)s
+                ) c
+            ),
+            textual AS (
+                SELECT id, row_number() OVER (ORDER BY rank DESC) AS posicao
+                FROM (
+                    SELECT id, ts_rank_cd(conteudo_tsv, consulta) AS rank
+                    FROM docs, websearch_to_tsquery('portuguese', %(texto)s) consulta
+                    WHERE conteudo_tsv @@ consulta AND model_id = %(model_id)s
+                    ORDER BY rank DESC
+                    LIMIT %(candidatos)s
+                ) c
+            ),
+            fusao AS (
+                SELECT
+                    COALESCE(v.id, t.id) AS id,
+                    t.id IS NOT NULL AS achado_texto,
+                    COALESCE(1.0 / (%(rrf_k)s + v.posicao), 0) + COALESCE(1.0 / (%(rrf_k)s + t.posicao), 0) AS score
+                FROM vetorial v
+                FULL OUTER JOIN textual t ON v.id = t.id
+            )
+            SELECT
+                d.path_origem,
+                d.num_pagina,
+                d.indice_chunk,
+                d.conteudo,
+                1 - (d.embedding <=> %(query)s::vector) as similaridade
+                {", subvector(d.embedding, 1, d.dimensao)::text" if retornar_embeddings else ""}
+            FROM fusao f
+            JOIN docs d ON d.id = f.id
+            WHERE f.achado_texto OR 1 - (d.embedding <=> %(query)s::vector) >= %(minimo)s
+            ORDER BY f.score DESC
+            LIMIT %(top_k)s
+        """
+        parametros = {
+            "query": completar_dimensao(query_embedding),
+            "model_id": self.model_id,
+            "texto": query_texto,
+            "top_k": top_k,
+            "candidatos": self._candidatos(top_k),
+            "rrf_k": RRF_K,
+            "minimo": minimo_similaridade,
+        }
+        with conexao() as conn, conn.cursor() as cur:
+            self._configurar_ef_search(cur, parametros["candidatos"])
+            cur.execute(pgvector_query, parametros)
+            resultados = cur.fetchall()
+
+        return self._converter_linhas(resultados, retornar_embeddings)
+
+    def _converter_linhas(self, resultados: List[Tuple], retornar_embeddings: bool) -> List[Dict[str, Any]]:
+        lista_resultados = []
+        for linha in resultados:
+            resultado = {
+                "path_origem": linha[0],
+                "num_pagina": linha[1],
+                "indice_chunk": linha[2],
+                "conteudo": linha[3],
+                "similaridade": linha[4]
+            }
+            if retornar_embeddings:
+                # Texto '[x,y,...]' do pgvector convertido direto para float32, sem criar uma lista de floats do Python.
+                resultado["embedding"] = np.fromstring(linha[5][1:-1], sep=',', dtype=np.float32)
+            lista_resultados.append(resultado)
+        return lista_resultados
+
+    def armazenar(self, chunks: List[Dict[str, Any]], usar_copy: bool = True, remover_orfaos: bool = True) -> None:
+        if not chunks:
+            return
+
+        with conexao() as conn, conn.cursor() as cur:
+            try:
+                if usar_copy:
+                    cur.execute(
+                        """
+                        CREATE TEMP TABLE docs_staging (
+                            path_origem TEXT,
+                            num_pagina INTEGER,
+                            indice_chunk INTEGER,
+                            conteudo TEXT,
+                            embedding VECTOR(1024),
+                            modtempo TEXT,
+                            model_id TEXT,
+                            dimensao INTEGER
+                        ) ON COMMIT DROP
+                        """
+                    )
+                    with span('copy_staging', pipeline='ingestao'):
+                        cur.copy_expert(
+                            """
+                            COPY docs_staging (path_origem,num_pagina,indice_chunk,conteudo,embedding,modtempo,model_id,dimensao)
+                            FROM STDIN WITH (FORMAT binary)
+                            """,
+                            gerar_copy_binario(chunks, self.model_id)
+                        )
+                    if remover_orfaos:
+                        with span('remover_orfaos_staging', pipeline='ingestao'):
+                            cur.execute(
+                                """
+                                DELETE FROM docs d
+                                WHERE d.path_origem IN (SELECT DISTINCT path_origem FROM docs_staging)
+                                AND NOT EXISTS (
+                                    SELECT 1
+                                    FROM docs_staging s
+                                    WHERE s.path_origem = d.path_origem
+                                    AND s.num_pagina IS NOT DISTINCT FROM d.num_pagina
+                                    AND s.indice_chunk = d.indice_chunk
+                                )
+                                """
+                            )
+                        print(f"Deletados {cur.rowcount} registros órfãos.")
+                    with span('upsert', pipeline='ingestao'):
+                        cur.execute(
+                            """
+                            INSERT INTO docs (path_origem,num_pagina,indice_chunk,conteudo,embedding,modtempo,model_id,dimensao)
+                            SELECT path_origem, num_pagina, indice_chunk, conteudo, embedding, modtempo::timestamptz, model_id, dimensao
+                            FROM docs_staging
+                            """ + SQL_CONFLITO_DOCS
+                        )
+                else:
+                    if remover_orfaos:
+                        self._remover_orfaos(cur, chunks)
+                    for chunk in chunks:
+                        cur.execute(
+                            """
+                            INSERT INTO docs (path_origem,num_pagina,indice_chunk,conteudo,embedding,modtempo,model_id,dimensao)
+                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+                            """ + SQL_CONFLITO_DOCS,
+                            (
+                                chunk['path_origem'],
+                                chunk['pag'],
+                                chunk['indice_chunk'],
+                                chunk['conteudo'],
+                                completar_dimensao(chunk['embedding']), # Aceita lista ou linha do ChunkBatch.
+                                chunk['modtempo'],
+                                self.model_id,
+                                len(chunk['embedding'])
+                            )
+                        )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Erro ao armazenar chunks no banco: {e}")
+                raise
+
+    def remover_orfaos(self, chunks: List[Dict[str, Any]]) -> int:
+        with conexao() as conn, conn.cursor() as cur:
+            try:
+                removidos = self._remover_orfaos(cur, chunks)
+                conn.commit()
+                return removidos
+            except Exception as e:
+                conn.rollback()
+                print(f"Erro ao remover registros órfãos: {e}")
+                raise
+
+    def remover_arquivos(self, paths: List[str]) -> int:
+        if not paths:
+            return 0
+        with conexao() as conn, conn.cursor() as cur:
+            try:
+                cur.execute("DELETE FROM docs WHERE path_origem = ANY(%s)", (list(paths),))
+                conn.commit()
+                print(f"Deletados {cur.rowcount} registros de {len(paths)} arquivo(s) removido(s).")
+                return cur.rowcount
+            except Exception as e:
+                conn.rollback()
+                print(f"Erro ao remover arquivos do banco: {e}")
+                raise
+
+    def _remover_orfaos(self, cur, chunks: List[Dict[str, Any]]) -> int:
+        # As chaves são enviadas como arrays (unnest), então a comparação é feita em um único DELETE.
+        cur.execute(
+            """
+            DELETE FROM docs d
+            WHERE d.path_origem = ANY(%s)
+            AND NOT EXISTS (
+                SELECT 1
+                FROM unnest(%s::text[], %s::int[], %s::int[]) AS c(path_origem, num_pagina, indice_chunk)
+                WHERE c.path_origem = d.path_origem
+                AND c.num_pagina IS NOT DISTINCT FROM d.num_pagina -- txts não possuem página (NULL).
+                AND c.indice_chunk = d.indice_chunk
+            )
+            """,
+            (
+                list({chunk['path_origem'] for chunk in chunks}),
+                [chunk['path_origem'] for chunk in chunks],
+                [chunk['pag'] for chunk in chunks],
+                [chunk['indice_chunk'] for chunk in chunks],
+            )
+        )
+        print(f"Deletados {cur.rowcount} registros órfãos.")
+        return cur.rowcount
+
+
+def completar_dimensao(vetor: Any, dimensao: int = DIMENSAO_COLUNA) -> List[float]:
+    """
+    Completa o vetor com zeros até a dimensão da coluna 'embedding', sem alterar a similaridade de coseno.
+
+    Args:
+        vetor (Any): Lista ou np.ndarray com o embedding.
+        dimensao (int): Dimensão da coluna.
+    Returns:
+        List[float]: Vetor com `dimensao` posições.
+    Raises:
+        ValueError: Quando o vetor é maior que a coluna.
+    """
+    vetor = np.asarray(vetor, dtype=float)
+    if len(vetor) > dimensao:
+        raise ValueError(f"Embedding com {len(vetor)} dimensões não cabe na coluna VECTOR({dimensao}).")
+    return np.pad(vetor, (0, dimensao - len(vetor))).tolist()
+
+
+def gerar_copy_binario(
+    chunks_tratados: Union[ChunkBatch, List[Dict[str,Any]]],
+    model_id: str,
+    dimensao_coluna: int = DIMENSAO_COLUNA
+) -> io.BytesIO:
+    """
+    Serializa os chunks no formato binário do COPY do PostgreSQL, na ordem de colunas de 'docs_staging'.
+    O embedding vai no formato binário do pgvector (dimensão e reservado em int16, seguidos dos float4),
+    gerado a partir da matriz float32 do `ChunkBatch` sem converter cada valor para um objeto do Python.
+
+    Args:
+        chunks_tratados: `ChunkBatch` ou lista com dicionários representando cada chunk e suas informações.
+        model_id (str): Modelo que gerou os embeddings, gravado em cada linha.
+        dimensao_coluna (int): Dimensão da coluna 'embedding', embeddings menores são completados com zeros.
+    Returns:
+        io.BytesIO: Buffer pronto para ser passado ao `copy_expert`.
+    """
+    lote = ChunkBatch.de_dicionarios(chunks_tratados)
+    if lote.embeddings.shape[1] > dimensao_coluna:
+        raise ValueError(f"Embedding com {lote.embeddings.shape[1]} dimensões não cabe na coluna VECTOR({dimensao_coluna}).")
+    campo_model_id = model_id.encode('utf-8')
+    campo_dimensao = struct.pack('>i', lote.embeddings.shape[1])
+    buffer = io.BytesIO()
+    buffer.write(b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)) # Assinatura, flags e extensão do header.
+
+    def escrever_campo(dados: Optional[bytes]) -> None:
+        if dados is None:
+            buffer.write(struct.pack('>i', -1)) # NULL
+        else:
+            buffer.write(struct.pack('>i', len(dados)))
+            buffer.write(dados)
+
+    colunas = zip(lote.path_origem, lote.pag, lote.indice_chunk, lote.conteudo, lote.vetores_pgvector(dimensao_coluna), lote.modtempo)
+    for path_origem, pag, indice_chunk, conteudo, embedding, modtempo in colunas:
+        buffer.write(struct.pack('>h', 8)) # Quantidade de colunas.
+        escrever_campo(path_origem.encode('utf-8'))
+        escrever_campo(None if pag is None else struct.pack('>i', pag))
+        escrever_campo(struct.pack('>i', indice_chunk))
+        escrever_campo(conteudo.encode('utf-8'))
+        escrever_campo(embedding)
+        escrever_campo(None if modtempo is None else str(modtempo).encode('utf-8'))
+        escrever_campo(campo_model_id)
+        escrever_campo(campo_dimensao)
+
+    buffer.write(struct.pack('>h', -1)) # Fim do arquivo.
+    buffer.seek(0)
+    return buffer
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Backend local, sem servidor: os embeddings ficam normalizados em um arquivo binário (float32 ou float16)
+    lido via memória mapeada, então abrir o índice não copia a matriz para a RAM. A busca exata é feita
+    com produtos matriciais em blocos e, opcionalmente, um índice IVF (k-means) restringe a busca às
+    listas mais próximas da query em corpora grandes.
+
+    Um índice guarda embeddings de um único modelo, abrir o diretório com outro modelo é um erro.
+
+    Arquivos no diretório:
+        config.json: dimensão, dtype e modelo dos vetores.
+        embeddings.bin: matriz (n, dim) apenas com append.
+        metadados.jsonl: log de operações ('add' com os dados do chunk, 'del' com o id removido).
+        ivf_centroides.npy / ivf_listas.npy: índice IVF opcional (ver `construir_ivf`).
+
+    Chunks reescritos ou removidos continuam nos arquivos até a compactação (ver `compactar`), feita ao abrir o
+    índice quando a fração de linhas removidas passa de `compactar_acima`.
+
+    Vários processos podem usar o mesmo diretório (ex: workers de fila_ingestao.py, `pre_processamento.py --watch`
+    e a interface): cada escrita segura uma trava exclusiva (flock em `.trava`) e, antes de escrever, aplica as
+    operações que outros processos adicionaram ao log. As buscas usam a trava compartilhada, esperam a escrita em
+    andamento e leem apenas o que foi adicionado ao log desde a última busca. Sem fcntl (Windows) não há trava
+    entre processos e apenas um processo deve escrever no diretório.
+    """
+
+    def __init__(
+        self,
+        diretorio: str = LOCAL_STORE_PATH,
+        dtype: str = LOCAL_STORE_DTYPE,
+        nprobe: int = LOCAL_STORE_NPROBE,
+        model_id: Optional[str] = None,
+        compactar_acima: float = LOCAL_STORE_COMPACTAR
+    ):
+        self.diretorio = diretorio
+        self.nprobe = nprobe
+        self.model_id = model_id or get_provedor_embeddings().model_id
+        os.makedirs(diretorio, exist_ok=True)
+        self._caminho_config = os.path.join(diretorio, 'config.json')
+        self._caminho_vetores = os.path.join(diretorio, 'embeddings.bin')
+        self._caminho_metadados = os.path.join(diretorio, 'metadados.jsonl')
+        self._caminho_centroides = os.path.join(diretorio, 'ivf_centroides.npy')
+        self._caminho_listas = os.path.join(diretorio, 'ivf_listas.npy')
+        self._caminho_trava = os.path.join(diretorio, '.trava')
+        self._lock = threading.RLock()
+        self._trava = None
+        self._dtype_padrao = np.dtype(dtype)
+        # (inode, bytes lidos) do log de metadados e mtime das listas do IVF já carregados.
+        self._estado_arquivos = None
+
+        with self._escrita():
+            removidas = len(self._linhas) - int(self._ativos.sum())
+            if compactar_acima > 0 and removidas > compactar_acima * len(self._linhas):
+                self.compactar()
+
+    def _carregar(self) -> None:
+        """
+        (Re)carrega o índice do disco: config, log de metadados e IVF.
+        """
+        self.dim = None
+        self.dtype = self._dtype_padrao
+        if os.path.exists(self._caminho_config):
+            with open(self._caminho_config) as f:
+                config = json.load(f)
+            self.dim = config['dim']
+            self.dtype = np.dtype(config['dtype'])
+            if config.get('model_id', self.model_id) != self.model_id:
+                raise ValueError(
+                    f"Índice local em {self.diretorio} foi criado com o modelo {config['model_id']}, "
+                    f"use outro LOCAL_STORE_PATH para {self.model_id}."
+                )
+
+        self._linhas: List[Optional[Dict[str, Any]]] = []
+        self._chaves: Dict[Tuple[str, Optional[int], int], int] = {}
+        self._ativos = np.zeros(0, dtype=bool)
+        self._memmap = None
+        inode, _, mtime_listas = self._estado_disco()
+        self._estado_arquivos = (inode, self._carregar_metadados(0), mtime_listas)
+
+        self._centroides = None
+        self._listas = None
+        if os.path.exists(self._caminho_centroides) and os.path.exists(self._caminho_listas):
+            self._centroides = np.load(self._caminho_centroides)
+            self._listas = np.load(self._caminho_listas, mmap_mode='r')
+
+    def _carregar_metadados(self, inicio: int) -> int:
+        """
+        Aplica as operações do log a partir do byte `inicio`, até a última linha completa.
+
+        Returns:
+            int: Posição no log após a última operação aplicada.
+        """
+        if not os.path.exists(self._caminho_metadados):
+            return 0
+        with open(self._caminho_metadados, 'rb') as f:
+            f.seek(inicio)
+            for linha in f:
+                if not linha.endswith(b'\n'): # Linha sendo escrita por outro processo.
+                    break
+                inicio += len(linha)
+                registro = json.loads(linha)
+                if registro['op'] == 'add':
+                    self._linhas.append(registro['chunk'])
+                    chunk = registro['chunk']
+                    self._chaves[(chunk['path_origem'], chunk['pag'], chunk['indice_chunk'])] = len(self._linhas) - 1
+                else:
+                    self._tombar(registro['id'])
+        self._ativos = np.array([linha is not None for linha in self._linhas], dtype=bool)
+        return inicio
+
+    def _mtime_listas(self) -> Optional[int]:
+        return os.stat(self._caminho_listas).st_mtime_ns if os.path.exists(self._caminho_listas) else None
+
+    def _estado_disco(self) -> Tuple[Optional[int], int, Optional[int]]:
+        if not os.path.exists(self._caminho_metadados):
+            return None, 0, self._mtime_listas()
+        estado = os.stat(self._caminho_metadados)
+        return estado.st_ino, estado.st_size, self._mtime_listas()
+
+    def _sincronizar(self) -> None:
+        """
+        Aplica as mudanças feitas por outros processos desde a última leitura: apenas as operações novas quando o
+        log só cresceu, ou recarrega tudo quando ele foi trocado (compactação) ou o IVF foi reconstruído.
+        """
+        with self._lock:
+            if self._estado_arquivos is None:
+                self._carregar()
+                return
+            inode, lidos, mtime_listas = self._estado_arquivos
+            inode_disco, tamanho, mtime_listas_disco = self._estado_disco()
+            if inode_disco != inode or tamanho < lidos or mtime_listas_disco != mtime_listas:
+                self._carregar()
+            elif tamanho > lidos:
+                if self.dim is None and os.path.exists(self._caminho_config):
+                    with open(self._caminho_config) as f:
+                        config = json.load(f)
+                    self.dim, self.dtype = config['dim'], np.dtype(config['dtype'])
+                self._estado_arquivos = (inode, self._carregar_metadados(lidos), mtime_listas)
+                self._memmap = None
+
+    @contextmanager
+    def _travar(self, exclusiva: bool):
+        """
+        Trava entre processos (flock em `.trava`), liberada ao fechar o arquivo.
+        """
+        with open(self._caminho_trava, 'a') as trava:
+            if fcntl is not None:
+                fcntl.flock(trava, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            yield trava
+
+    @contextmanager
+    def _leitura(self):
+        """
+        Trava compartilhada das buscas: espera escritas de outros processos (ex: uma compactação trocando os
+        arquivos) terminarem e aplica o que foi escrito antes de mapear a matriz.
+        """
+        with self._lock:
+            if self._trava is not None: # Busca dentro de uma escrita deste processo.
+                yield
+                return
+            with self._travar(exclusiva=False):
+                self._sincronizar()
+                yield
+
+    @contextmanager
+    def _escrita(self):
+        """
+        Trava do índice para escrita, entre threads (RLock) e entre processos (flock). Ao obter a trava conclui
+        uma compactação interrompida e aplica o que outros processos escreveram, então os ids de linha usados
+        nas novas operações correspondem ao log em disco.
+        """
+        with self._lock:
+            if self._trava is not None: # Escrita aninhada (ex: armazenar -> remover_orfaos).
+                yield
+                return
+            with self._travar(exclusiva=True) as trava:
+                self._trava = trava
+                try:
+                    if self._recuperar_compactacao():
+                        self._estado_arquivos = None
+                    self._sincronizar()
+                    # Linha incompleta no fim do log: um processo caiu no meio da escrita, descartada antes do append.
+                    lidos = self._estado_arquivos[1]
+                    if os.path.exists(self._caminho_metadados) and os.path.getsize(self._caminho_metadados) > lidos:
+                        os.truncate(self._caminho_metadados, lidos)
+                    yield
+                    # O estado em memória já inclui tudo que foi escrito, sem releitura na próxima sincronização.
+                    self._estado_arquivos = self._estado_disco()
+                except BaseException:
+                    self._estado_arquivos = None # Escrita incompleta: recarrega do disco na próxima operação.
+                    raise
+                finally:
+                    self._trava = None
+
+    def _tombar(self, id_linha: int) -> None:
+        chunk = self._linhas[id_linha]
+        if chunk is None:
+            return
+        chave = (chunk['path_origem'], chunk['pag'], chunk['indice_chunk'])
+        if self._chaves.get(chave) == id_linha:
+            del self._chaves[chave]
+        self._linhas[id_linha] = None
+        if id_linha < len(self._ativos):
+            self._ativos[id_linha] = False
+
+    def _matriz(self) -> np.ndarray:
+        n = len(self._linhas)
+        if self.dim is None or n == 0:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        if self._memmap is None or self._memmap.shape[0] != n:
+            self._memmap = np.memmap(self._caminho_vetores, dtype=self.dtype, mode='r', shape=(n, self.dim))
+        return self._memmap
+
+    def armazenar(self, chunks: List[Dict[str, Any]], usar_copy: bool = True, remover_orfaos: bool = True) -> None:
+        if not chunks:
+            return
+        with self._escrita():
+            if self.dim is not None and len(chunks[0]['embedding']) != self.dim:
+                raise ValueError(f"Embeddings com {len(chunks[0]['embedding'])} dimensões, o índice local possui {self.dim}.")
+            if remover_orfaos:
+                self.remover_orfaos(chunks)
+
+            # Vetores no formato armazenado (normalizados, no dtype do índice), para comparar com os existentes.
+            vetores = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+            vetores /= np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+            vetores = vetores.astype(self.dtype)
+            matriz_atual = self._matriz()
+
+            registros = []
+            novos = []
+            for chunk, vetor in zip(chunks, vetores):
+                chave = (chunk['path_origem'], chunk['pag'], chunk['indice_chunk'])
+                modtempo = None if chunk['modtempo'] is None else str(chunk['modtempo'])
+                existente = self._chaves.get(chave)
+                if existente is not None:
+                    atual = self._linhas[existente]
+                    # Mesmo critério do upsert do pgvector (chunk_alterado), o índice tem um único model_id.
+                    alterado = chunk_alterado(
+                        {'conteudo': atual['conteudo'], 'embedding': matriz_atual[existente], 'model_id': self.model_id},
+                        {'conteudo': chunk['conteudo'], 'embedding': vetor, 'model_id': self.model_id}
+                    )
+                    if not alterado:
+                        continue
+                    self._tombar(existente)
+                    registros.append({'op': 'del', 'id': existente})
+                novos.append(vetor)
+                dados = {
+                    'path_origem': chunk['path_origem'],
+                    'pag': chunk['pag'],
+                    'indice_chunk': chunk['indice_chunk'],
+                    'conteudo': chunk['conteudo'],
+                    'modtempo': modtempo,
+                }
+                self._linhas.append(dados)
+                self._chaves[chave] = len(self._linhas) - 1
+                registros.append({'op': 'add', 'chunk': dados})
+
+            if novos:
+                matriz = np.stack(novos)
+                if self.dim is None:
+                    self.dim = matriz.shape[1]
+                    with open(self._caminho_config, 'w') as f:
+                        json.dump({'dim': self.dim, 'dtype': self.dtype.name, 'model_id': self.model_id}, f)
+                # Vetores primeiro: uma queda entre as duas escritas deixa apenas vetores sem metadados,
+                # que são descartados aqui antes do próximo append para manter as linhas alinhadas com o log.
+                tamanho_esperado = (len(self._linhas) - len(novos)) * self.dim * self.dtype.itemsize
+                if os.path.exists(self._caminho_vetores) and os.path.getsize(self._caminho_vetores) > tamanho_esperado:
+                    os.truncate(self._caminho_vetores, tamanho_esperado)
+                with open(self._caminho_vetores, 'ab') as f:
+                    f.write(matriz.tobytes())
+            self._escrever_registros(registros)
+            self._ativos = np.concatenate([self._ativos, np.ones(len(self._linhas) - len(self._ativos), dtype=bool)])
+            self._memmap = None
+
+    def _escrever_registros(self, registros: List[Dict[str, Any]]) -> None:
+        if not registros:
+            return
+        with open(self._caminho_metadados, 'a', encoding='utf-8') as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    def remover_orfaos(self, chunks: List[Dict[str, Any]]) -> int:
+        with self._escrita():
+            paths = {chunk['path_origem'] for chunk in chunks}
+            chaves = {(chunk['path_origem'], chunk['pag'], chunk['indice_chunk']) for chunk in chunks}
+            orfaos = [
+                id_linha for chave, id_linha in self._chaves.items()
+                if chave[0] in paths and chave not in chaves
+            ]
+            for id_linha in orfaos:
+                self._tombar(id_linha)
+            self._escrever_registros([{'op': 'del', 'id': id_linha} for id_linha in orfaos])
+            print(f"Deletados {len(orfaos)} registros órfãos.")
+            return len(orfaos)
+
+    def remover_arquivos(self, paths: List[str]) -> int:
+        with self._escrita():
+            paths = set(paths)
+            ids = [id_linha for chave, id_linha in self._chaves.items() if chave[0] in paths]
+            for id_linha in ids:
+                self._tombar(id_linha)
+            self._escrever_registros([{'op': 'del', 'id': id_linha} for id_linha in ids])
+            print(f"Deletados {len(ids)} registros de {len(paths)} arquivo(s) removido(s).")
+            return len(ids)
+
+    def compactar(self) -> int:
+        """
+        Reescreve os arquivos do índice apenas com as linhas ativas, descartando as removidas e as versões
+        antigas de chunks reescritos (embeddings.bin e o log de metadados só crescem a cada reingestão).
+        Os arquivos novos são escritos ao lado dos atuais e trocados por rename, primeiro os vetores e depois
+        o log: uma queda no meio é concluída ou descartada na próxima abertura (`_recuperar_compactacao`).
+
+        Returns:
+            int: Quantidade de linhas descartadas.
+        """
+        with self._escrita():
+            ids_ativos = np.flatnonzero(self._ativos)
+            removidas = len(self._linhas) - len(ids_ativos)
+            if removidas == 0:
+                return 0
+            matriz = self._matriz()
+            linhas = [self._linhas[id_linha] for id_linha in ids_ativos]
+
+            with open(self._caminho_vetores + '.compactando', 'wb') as f:
+                for inicio in range(0, len(ids_ativos), TAMANHO_BLOCO):
+                    f.write(np.ascontiguousarray(matriz[ids_ativos[inicio:inicio + TAMANHO_BLOCO]]).tobytes())
+            listas = None
+            if self._listas is not None:
+                # Linhas sem lista (adicionadas depois do IVF) continuam no fim, depois das que têm lista.
+                listas = np.asarray(self._listas)[ids_ativos[ids_ativos < len(self._listas)]]
+                with open(self._caminho_listas + '.compactando', 'wb') as f:
+                    np.save(f, listas)
+            with open(self._caminho_metadados + '.compactando', 'w', encoding='utf-8') as f:
+                for dados in linhas:
+                    f.write(json.dumps({'op': 'add', 'chunk': dados}, ensure_ascii=False) + '\n')
+
+            self._memmap = None
+            self._listas = None
+            os.replace(self._caminho_vetores + '.compactando', self._caminho_vetores)
+            self._recuperar_compactacao()
+
+            self._linhas = linhas
+            self._chaves = {
+                (dados['path_origem'], dados['pag'], dados['indice_chunk']): id_linha
+                for id_linha, dados in enumerate(linhas)
+            }
+            self._ativos = np.ones(len(linhas), dtype=bool)
+            if listas is not None:
+                self._listas = np.load(self._caminho_listas, mmap_mode='r')
+            print(f"Indice local compactado: {removidas} linhas removidas, {len(linhas)} ativas.")
+            return removidas
+
+    def _recuperar_compactacao(self) -> bool:
+        """
+        Conclui (vetores já trocados) ou descarta (vetores ainda não trocados) uma compactação interrompida.
+
+        Returns:
+            bool: True se a compactação foi concluída, ou seja, os arquivos do índice mudaram.
+        """
+        metadados = self._caminho_metadados + '.compactando'
+        if not os.path.exists(metadados):
+            for caminho in (self._caminho_vetores, self._caminho_listas):
+                if os.path.exists(caminho + '.compactando'):
+                    os.remove(caminho + '.compactando')
+            return False
+        if os.path.exists(self._caminho_vetores + '.compactando'):
+            for caminho in (self._caminho_vetores, self._caminho_listas, self._caminho_metadados):
+                if os.path.exists(caminho + '.compactando'):
+                    os.remove(caminho + '.compactando')
+            return False
+        if os.path.exists(self._caminho_listas + '.compactando'):
+            os.replace(self._caminho_listas + '.compactando', self._caminho_listas)
+        os.replace(metadados, self._caminho_metadados)
+        return True
+
+    def pesquisar(self, query_embedding: List[float], top_k: int, retornar_embeddings: bool = False) -> List[Dict[str, Any]]:
+        with self._leitura():
+            matriz = self._matriz()
+            ativos = self._ativos.copy()
+            linhas = list(self._linhas)
+            centroides, listas = self._centroides, self._listas
+        if matriz.shape[0] == 0 or not ativos.any():
+            return []
+
+        # Cópia: normalizar in-place alteraria o array de quem chamou.
+        query = np.array(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        if centroides is not None:
+            candidatos = self._candidatos_ivf(query, centroides, listas, matriz.shape[0])
+            candidatos = candidatos[ativos[candidatos]]
+            scores = matriz[candidatos].astype(np.float32) @ query
+        else:
+            candidatos = np.flatnonzero(ativos)
+            scores = np.empty(matriz.shape[0], dtype=np.float32)
+            for inicio in range(0, matriz.shape[0], TAMANHO_BLOCO):
+                bloco = matriz[inicio:inicio + TAMANHO_BLOCO]
+                scores[inicio:inicio + len(bloco)] = bloco.astype(np.float32, copy=False) @ query
+            scores = scores[candidatos]
+
+        return self._melhores(matriz, linhas, candidatos, scores, top_k, retornar_embeddings)
+
+    def pesquisar_lote(
+        self,
+        query_embeddings: Sequence[List[float]],
+        top_k: int,
+        retornar_embeddings: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Busca exata de várias queries lendo a matriz uma única vez por grupo de QUERIES_POR_BLOCO queries:
+        cada bloco é multiplicado pela matriz de queries (um GEMM no lugar de um GEMV por query).
+        Com o índice IVF cada query tem suas próprias listas candidatas, então a busca é feita uma a uma.
+        """
+        with self._leitura():
+            matriz = self._matriz()
+            ativos = self._ativos.copy()
+            linhas = list(self._linhas)
+            centroides = self._centroides
+        if centroides is not None:
+            return super().pesquisar_lote(query_embeddings, top_k, retornar_embeddings)
+        if matriz.shape[0] == 0 or not ativos.any():
+            return [[] for _ in query_embeddings]
+
+        candidatos = np.flatnonzero(ativos)
+        resultados = []
+        for inicio_queries in range(0, len(query_embeddings), QUERIES_POR_BLOCO):
+            queries = np.array(query_embeddings[inicio_queries:inicio_queries + QUERIES_POR_BLOCO], dtype=np.float32)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            scores = np.empty((matriz.shape[0], len(queries)), dtype=np.float32)
+            for inicio in range(0, matriz.shape[0], TAMANHO_BLOCO):
+                bloco = matriz[inicio:inicio + TAMANHO_BLOCO]
+                scores[inicio:inicio + len(bloco)] = bloco.astype(np.float32, copy=False) @ queries.T
+            scores = scores[candidatos]
+            for coluna in range(len(queries)):
+                resultados.append(self._melhores(matriz, linhas, candidatos, scores[:, coluna], top_k, retornar_embeddings))
+        return resultados
+
+    def _melhores(
+        self,
+        matriz: np.ndarray,
+        linhas: List[Optional[Dict[str, Any]]],
+        candidatos: np.ndarray,
+        scores: np.ndarray,
+        top_k: int,
+        retornar_embeddings: bool
+    ) -> List[Dict[str, Any]]:
+        # `linhas` é a cópia feita junto com `matriz`/`candidatos` sob o lock, uma remoção simultânea
+        # não troca as linhas por None no meio da montagem dos resultados.
+        k = min(top_k, len(candidatos))
+        if k == 0:
+            return []
+        melhores = np.argpartition(-scores, k - 1)[:k]
+        melhores = melhores[np.argsort(-scores[melhores])]
+
+        resultados = []
+        for posicao in melhores:
+            id_linha = int(candidatos[posicao])
+            chunk = linhas[id_linha]
+            resultado = {
+                "path_origem": chunk['path_origem'],
+                "num_pagina": chunk['pag'],
+                "indice_chunk": chunk['indice_chunk'],
+                "conteudo": chunk['conteudo'],
+                "similaridade": float(scores[posicao]),
+            }
+            if retornar_embeddings:
+                resultado["embedding"] = np.asarray(matriz[id_linha], dtype=np.float32)
+            resultados.append(resultado)
+        return resultados
+
+    def _candidatos_ivf(self, query: np.ndarray, centroides: np.ndarray, listas: np.ndarray, n: int) -> np.ndarray:
+        nprobe = min(self.nprobe, len(centroides))
+        listas_proximas = np.argpartition(-(centroides @ query), nprobe - 1)[:nprobe]
+        candidatos = np.flatnonzero(np.isin(listas, listas_proximas))
+        # Linhas adicionadas depois da construção do IVF ainda não têm lista, são sempre verificadas.
+        return np.concatenate([candidatos, np.arange(len(listas), n)])
+
+    def construir_ivf(self, n_listas: Optional[int] = None, iteracoes: int = 10, tamanho_amostra: int = 100000) -> None:
+        """
+        Constrói o índice IVF: k-means esférico sobre uma amostra dos vetores ativos e atribuição de
+        cada linha ao centróide mais próximo. Recomendado apenas para corpora grandes (>100k chunks),
+        abaixo disso a busca exata já é rápida o suficiente.
+
+        Args:
+            n_listas (Optional[int]): Quantidade de listas/centróides. Default: sqrt(n).
+            iteracoes (int): Iterações do k-means.
+            tamanho_amostra (int): Máximo de vetores usados para treinar os centróides.
+        """
+        with self._escrita():
+            matriz = self._matriz()
+            ids_ativos = np.flatnonzero(self._ativos)
+            if len(ids_ativos) == 0:
+                return
+            n_listas = n_listas or max(1, int(np.sqrt(len(ids_ativos))))
+            rng = np.random.default_rng(0)
+            amostra = matriz[np.sort(rng.choice(ids_ativos, min(tamanho_amostra, len(ids_ativos)), replace=False))]
+            amostra = amostra.astype(np.float32)
+            centroides = amostra[rng.choice(len(amostra), min(n_listas, len(amostra)), replace=False)]
+
+            for _ in range(iteracoes):
+                atribuicao = np.argmax(amostra @ centroides.T, axis=1)
+                for c in range(len(centroides)):
+                    membros = amostra[atribuicao == c]
+                    if len(membros):
+                        centroides[c] = membros.mean(axis=0)
+                centroides /= np.maximum(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12)
+
+            listas = np.empty(matriz.shape[0], dtype=np.int32)
+            for inicio in range(0, matriz.shape[0], TAMANHO_BLOCO):
+                bloco = matriz[inicio:inicio + TAMANHO_BLOCO].astype(np.float32)
+                listas[inicio:inicio + len(bloco)] = np.argmax(bloco @ centroides.T, axis=1)
+
+            np.save(self._caminho_centroides, centroides)
+            np.save(self._caminho_listas, listas)
+            self._centroides, self._listas = centroides, listas
+            print(f"Indice IVF construido com {len(centroides)} listas para {matriz.shape[0]} linhas.")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """
+    Retorna o backend configurado em VECTOR_STORE, criando-o no primeiro uso.
+
+    Returns:
+        VectorStore: PgVectorStore ('pgvector') ou LocalVectorStore ('local').
+    Raises:
+        ValueError: Quando VECTOR_STORE não é um backend conhecido.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if VECTOR_STORE == 'pgvector':
+                    _store = PgVectorStore()
+                elif VECTOR_STORE == 'local':
+                    _store = LocalVectorStore()
+                else:
+                    raise ValueError(f"Vector store {VECTOR_STORE} não é suportado.")
+    return _store
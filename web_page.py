@@ -1,6 +1,7 @@
 import streamlit as st
-from pre_processamento import processar_item_unico
-from query_processing import processar_query
+from fila_ingestao import enfileirar, consultar_jobs, reprocessar_job, iniciar_workers
+from query_processing import processar_query_stream
+from metricas import registro, iniciar_servidor_metricas, exportar_prometheus
 import os 
 
 # Page configuration
@@ -10,11 +11,16 @@ st.set_page_config(
     layout="wide"
 )
 
+# Endpoint /metrics para o Prometheus (apenas se METRICAS_PORTA estiver definida)
+iniciar_servidor_metricas()
+# Threads que consomem a fila de ingestão (apenas na primeira execução do script)
+iniciar_workers()
+
 # Initialize session state
 if 'processando' not in st.session_state:
     st.session_state.processando = False
-if 'arquivos_processados' not in st.session_state:
-    st.session_state.arquivos_processados = []
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {} # nome do arquivo -> id do job na fila de ingestão
 
 # Header
 st.title("Assistente RAG")
@@ -24,13 +30,13 @@ st.divider()
 # Sidebar
 with st.sidebar:
     st.header("Status")
-    st.metric("Arquivos", len(st.session_state.arquivos_processados))
+    st.metric("Arquivos", len(st.session_state.jobs))
     
     st.divider()
     
-    if st.session_state.arquivos_processados:
+    if st.session_state.jobs:
         st.subheader("Documentos")
-        for filename in st.session_state.arquivos_processados:
+        for filename in st.session_state.jobs:
             icon = "📄" if filename.endswith('.txt') else "📕"
             st.text(f"{icon} {filename}")
     else:
@@ -60,16 +66,11 @@ with col2:
         type="primary"
     )
 
-# File processing
+# File processing: os arquivos vão para a fila de ingestão e são processados em segundo plano,
+# a interface continua respondendo às perguntas enquanto isso.
 if uploaded_file:
-    st.divider()
-    st.subheader("Processamento")
-    
-    progress_bar = st.progress(0)
-    total = len(uploaded_file)
-    
-    for idx, file in enumerate(uploaded_file):
-        if file.name in st.session_state.arquivos_processados:
+    for file in uploaded_file:
+        if file.name in st.session_state.jobs:
             continue
         
         extensao = file.name.split('.')[-1]
@@ -77,32 +78,83 @@ if uploaded_file:
         os.makedirs(save_dir, exist_ok=True)
         save_path = os.path.join(save_dir, file.name)
         
-        with st.status(f"Processando {file.name}...", expanded=True) as status:
-            try:
-                with open(save_path, 'wb') as f:
-                    f.write(file.getbuffer())
-                
-                num_chunks = processar_item_unico(save_path, extensao)
-                st.session_state.arquivos_processados.append(file.name)
-                
-                status.update(label=f"✅ {file.name} concluído!", state="complete")
-                st.success(f"{num_chunks} chunks processados")
-                
-            except Exception as e:
-                status.update(label=f"❌ Erro em {file.name}", state="error")
-                st.error(str(e))
-        
-        progress_bar.progress((idx + 1) / total)
+        try:
+            with open(save_path, 'wb') as f:
+                f.write(file.getbuffer())
+            st.session_state.jobs[file.name] = enfileirar(save_path, extensao)
+        except Exception as e:
+            st.error(f"❌ Erro ao enviar {file.name}: {e}")
+
+@st.fragment(run_every=2)
+def painel_processamento():
+    """
+    Estado dos jobs da sessão, atualizado a cada 2 segundos sem executar o restante da página.
+    """
+    try:
+        jobs = consultar_jobs(list(st.session_state.jobs.values()))
+    except Exception as e:
+        st.error(f"Erro ao consultar a fila de ingestão: {e}")
+        return
+    for job in jobs:
+        nome = os.path.basename(job['path_origem'])
+        if job['status'] == 'concluido':
+            st.success(f"✅ {nome}: {job['chunks_processados']} chunks processados")
+        elif job['status'] == 'processando':
+            st.info(f"⏳ {nome}: processando, {job['chunks_processados']} chunks gravados")
+        elif job['status'] == 'pendente':
+            tentativa = f" (tentativa {job['tentativas'] + 1})" if job['tentativas'] else ""
+            st.info(f"🕒 {nome}: aguardando na fila{tentativa}")
+        else:
+            st.error(f"❌ {nome}: {job['erro']}")
+            if st.button("Tentar novamente", key=f"reprocessar_{job['id']}"):
+                reprocessar_job(job['id'])
+
+if st.session_state.jobs:
+    st.divider()
+    st.subheader("Processamento")
+    painel_processamento()
 
 # Query processing
 if processar_btn and query:
     st.divider()
     
+    st.subheader("Resposta")
+    area_resposta = st.empty()
+    texto_resposta = ""
+    resultado = {}
+    
+    # Os trechos da resposta são exibidos conforme chegam do modelo.
     with st.spinner("Buscando resposta..."):
-        resposta, contextos, usou_web,usou_web_e_docs = processar_query(query)
+        for evento, valor in processar_query_stream(query):
+            if evento == "token":
+                texto_resposta += valor
+                area_resposta.info(texto_resposta)
+            elif evento == "reiniciar":
+                texto_resposta = ""
+                area_resposta.info("Contexto dos documentos insuficiente, complementando com a web...")
+            elif evento == "fim":
+                resultado = valor
     
-    st.subheader("Resposta")
-    st.info(resposta)
+    resposta = resultado["resposta"]
+    contextos = resultado["contextos"]
+    usou_web = resultado["usou_web"]
+    usou_web_e_docs = resultado["usou_web_e_docs"]
+    area_resposta.info(resposta)
+    if resultado["tempo_primeiro_token"] is not None:
+        st.caption(f"Primeiro token em {resultado['tempo_primeiro_token']:.2f}s")
+
+    # Divisão do tempo da query por etapa
+    with st.sidebar:
+        st.divider()
+        st.subheader("Etapas da última query")
+        for etapa, duracao in resultado["etapas"].items():
+            st.text(f"{etapa}: {duracao:.2f}s")
+        total_queries = registro.contador('queries_total')
+        if total_queries:
+            taxa_web = registro.contador('fallback_web_total') / total_queries
+            st.metric("Fallback para web", f"{taxa_web:.0%}")
+        with st.expander("Métricas (Prometheus)"):
+            st.code(exportar_prometheus(), language="text")
     
     st.divider()
     st.subheader("Fontes")